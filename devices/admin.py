@@ -1,6 +1,6 @@
 from django.contrib import admin
-from django.utils.html import format_html
-from .models import BloodAnalyzer, TestRun, TestMetric, DataSource, SyncLog
+from django.utils.html import format_html, format_html_join
+from .models import BloodAnalyzer, TestRun, TestMetric, DataSource, SyncLog, FactoryUserMapping, SyncLease
 
 @admin.register(BloodAnalyzer)
 class BloodAnalyzerAdmin(admin.ModelAdmin):
@@ -73,9 +73,9 @@ class TestMetricAdmin(admin.ModelAdmin):
 @admin.register(DataSource)
 class DataSourceAdmin(admin.ModelAdmin):
     list_display = ('name', 'source_type', 'last_sync', 'is_active', 'sync_status')
-    list_filter = ('source_type', 'is_active')
+    list_filter = ('source_type', 'is_active', 'sync_mode')
     search_fields = ('name',)
-    readonly_fields = ('last_sync',)
+    readonly_fields = ('last_sync', 'last_synced_run_pk', 'last_synced_run_at', 'sync_interval', 'next_sync_due')
     
     def sync_status(self, obj):
         if not obj.last_sync:
@@ -85,10 +85,10 @@ class DataSourceAdmin(admin.ModelAdmin):
 
 @admin.register(SyncLog)
 class SyncLogAdmin(admin.ModelAdmin):
-    list_display = ('source', 'timestamp', 'status', 'records_processed', 'error_status')
+    list_display = ('source', 'timestamp', 'status', 'records_processed', 'duration', 'rows_per_second', 'error_status')
     list_filter = ('status', 'source', 'timestamp')
     search_fields = ('source__name', 'error_message')
-    readonly_fields = ('timestamp',)
+    readonly_fields = ('timestamp', 'duration', 'stage_breakdown', 'rows_per_second', 'bytes_read', 'peak_memory')
     date_hierarchy = 'timestamp'
     ordering = ('-timestamp',)
     
@@ -100,11 +100,33 @@ class SyncLogAdmin(admin.ModelAdmin):
         return format_html('<span style="color: green;">Success</span>')
     error_status.short_description = 'Error Status'
     
+    def stage_breakdown(self, obj):
+        if not obj.stage_timings:
+            return '-'
+        return format_html_join(
+            '', '<div>{}: {}s</div>', sorted(obj.stage_timings.items(), key=lambda item: -item[1])
+        )
+    stage_breakdown.short_description = 'Stage Timings'
+    
     fieldsets = (
         ('Sync Information', {
             'fields': ('source', 'timestamp', 'status')
         }),
         ('Results', {
-            'fields': ('records_processed', 'error_message')
+            'fields': ('records_processed', 'checkpoint_run_pk', 'error_message')
+        }),
+        ('Performance', {
+            'fields': ('duration', 'stage_breakdown', 'rows_per_second', 'bytes_read', 'peak_memory')
         }),
     )
+
+@admin.register(FactoryUserMapping)
+class FactoryUserMappingAdmin(admin.ModelAdmin):
+    list_display = ('source', 'factory_user_id', 'user')
+    list_filter = ('source',)
+    search_fields = ('user__username',)
+
+@admin.register(SyncLease)
+class SyncLeaseAdmin(admin.ModelAdmin):
+    list_display = ('source', 'owner', 'sync_log', 'acquired_at', 'heartbeat_at', 'expires_at')
+    readonly_fields = ('owner', 'sync_log', 'acquired_at', 'heartbeat_at')
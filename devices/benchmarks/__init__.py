@@ -0,0 +1,9 @@
+from .base import Benchmark
+from .sync import SyncBenchmark
+from .api import ApiBenchmark
+
+__all__ = [
+    'Benchmark',
+    'SyncBenchmark',
+    'ApiBenchmark',
+]
@@ -0,0 +1,126 @@
+import io
+import random
+import statistics
+import time
+from contextlib import redirect_stdout
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from devices.models import BloodAnalyzer, TestRun
+from devices.services.sync import SyncService
+from devices.services.synthetic_data import SyntheticDataService
+from .base import Benchmark, QueryCounter
+
+class ApiBenchmark(Benchmark):
+    """
+    Latency benchmark of the REST API.
+
+    Builds a synthetic factory, syncs it into a fresh central database
+    ``sync_logs`` times (so there is sync history) and then requests every
+    endpoint ``requests`` times with a token-authenticated client, rotating
+    over a sample of devices and test runs. Reports p50/p95/p99 latency in
+    milliseconds and queries per request for each endpoint. Requests run
+    with DEBUG off, as in production.
+    """
+
+    DIRECTIONS = {
+        'p50': 'lower',
+        'p95': 'lower',
+        'p99': 'lower',
+        'queries_per_request': 'lower',
+    }
+    NOISE_FLOORS = {'p50': 5, 'p95': 10, 'p99': 20}  # milliseconds
+    ENDPOINTS = ['devices', 'test_runs', 'test_run_metrics', 'sync_logs', 'sync_status', 'sync_history']
+    SAMPLE_SIZE = 20  # Devices and runs the detail endpoints rotate over
+
+    def __init__(self, analyzers: int = 10, runs: int = 20, requests: int = 50, sync_logs: int = 20,
+                 seed: int = 42):
+        self.analyzers = analyzers
+        self.runs = runs
+        self.requests = requests
+        self.sync_logs = sync_logs
+        self.seed = seed
+
+    def config(self) -> dict:
+        return {
+            'analyzers': self.analyzers,
+            'runs': self.runs,
+            'requests': self.requests,
+            'sync_logs': self.sync_logs,
+            'seed': self.seed,
+        }
+
+    def run(self) -> dict:
+        with self.central_database() as directory:
+            self.build_dataset(directory)
+            client = self.client()
+            urls = self.urls()
+
+            setup_test_environment(debug=False)
+            try:
+                results = {endpoint: self.measure(client, urls[endpoint]) for endpoint in self.ENDPOINTS}
+            finally:
+                teardown_test_environment()
+
+        return {'config': self.config(), 'environment': self.environment(), 'results': results}
+
+    def build_dataset(self, directory: str):
+        source = self.create_factory(directory, 'benchmark_api', self.analyzers, self.runs, self.seed)
+        with redirect_stdout(io.StringIO()):
+            for n in range(self.sync_logs):
+                if n:
+                    SyntheticDataService.build_factory(
+                        source.name, self.analyzers, 1, seed=self.seed, first_run=self.runs + n - 1
+                    )
+                SyncService.sync_source(source.name)
+
+    def client(self) -> APIClient:
+        user = User.objects.db_manager('default').create_user(username='benchmark')
+        token = Token.objects.using('default').create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def urls(self) -> dict:
+        rng = random.Random(self.seed)
+        device_ids = list(BloodAnalyzer.objects.using('default').values_list('device_id', flat=True))
+        run_ids = list(TestRun.objects.using('default').values_list('id', flat=True))
+        devices = rng.sample(device_ids, min(self.SAMPLE_SIZE, len(device_ids)))
+        runs = rng.sample(run_ids, min(self.SAMPLE_SIZE, len(run_ids)))
+        return {
+            'devices': [reverse('device-list')],
+            'test_runs': [reverse('test-run-list')],
+            'test_run_metrics': [reverse('test-run-metrics', args=[pk]) for pk in runs],
+            'sync_logs': [reverse('sync-log-list')],
+            'sync_status': [reverse('device-sync-status', args=[device_id]) for device_id in devices],
+            'sync_history': [reverse('device-sync-history', args=[device_id]) for device_id in devices],
+        }
+
+    def measure(self, client: APIClient, urls: list) -> dict:
+        # One untimed request per URL warms up caches and connections
+        for url in urls:
+            client.get(url)
+
+        counter = QueryCounter()
+        latencies, status_codes, sizes = [], set(), []
+        with connections['default'].execute_wrapper(counter):
+            for n in range(self.requests):
+                started = time.perf_counter()
+                response = client.get(urls[n % len(urls)])
+                latencies.append((time.perf_counter() - started) * 1000)
+                status_codes.add(response.status_code)
+                sizes.append(len(response.content))
+
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {
+            'p50': round(percentiles[49], 3),
+            'p95': round(percentiles[94], 3),
+            'p99': round(percentiles[98], 3),
+            'mean': round(statistics.fmean(latencies), 3),
+            'queries_per_request': round(counter.count / self.requests, 2),
+            'response_bytes': round(statistics.fmean(sizes)),
+            'status_codes': sorted(status_codes),
+        }
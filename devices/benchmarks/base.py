@@ -0,0 +1,120 @@
+import json
+import os
+import platform
+import shutil
+import tempfile
+from contextlib import contextmanager
+import django
+from django.core.management import call_command
+from django.db import connections
+from devices.models import DataSource
+from devices.services.factory_registry import FactoryRegistry
+from devices.services.synthetic_data import SyntheticDataService
+
+class QueryCounter:
+    """Database execute wrapper counting the queries it sees."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+class Benchmark:
+    """
+    Base class of the benchmark harnesses.
+
+    ``run`` returns a results dict of the form
+    ``{'config': {...}, 'environment': {...}, 'results': {phase: {metric: value}}}``
+    which is written as JSON and compared with a checked-in baseline of the
+    same shape. ``DIRECTIONS`` maps the compared metrics to ``'lower'`` or
+    ``'higher'``, whichever is better. ``NOISE_FLOORS`` are absolute
+    differences below which a metric never counts as regressed, so that
+    jitter on very fast operations is not reported.
+    """
+
+    DIRECTIONS = {}
+    NOISE_FLOORS = {}
+
+    def run(self) -> dict:
+        raise NotImplementedError
+
+    @contextmanager
+    def central_database(self):
+        """
+        Swap the default connection to a fresh, migrated test database for
+        the duration of the benchmark, so no real data is touched. Yields a
+        temporary directory for factory databases; the factories created
+        in it are unregistered afterwards.
+        """
+        directory = tempfile.mkdtemp(prefix='benchmark-')
+        central = connections['default']
+        if central.vendor == 'sqlite':
+            central.settings_dict['TEST']['NAME'] = os.path.join(directory, 'central.sqlite3')
+        old_name = central.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield directory
+        finally:
+            for source_id in DataSource.objects.using('default').values_list('id', flat=True):
+                FactoryRegistry.unregister(source_id)
+            central.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    @staticmethod
+    def create_factory(directory: str, name: str, analyzers: int, runs: int, seed: int) -> DataSource:
+        """
+        Onboard a SQLite factory database in ``directory`` and fill it with
+        a synthetic dataset.
+        """
+        source = DataSource.objects.using('default').create(
+            name=name,
+            source_type=DataSource.SourceType.FACTORY,
+            database_url=f'sqlite:///{os.path.join(directory, name)}.sqlite3'
+        )
+        alias = FactoryRegistry.alias_for(source)
+        call_command('migrate', database=alias, verbosity=0)
+        SyntheticDataService.build_factory(alias, analyzers, runs, seed=seed)
+        return source
+
+    @staticmethod
+    def environment() -> dict:
+        return {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': platform.platform(),
+        }
+
+    @staticmethod
+    def load(path) -> dict:
+        with open(path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def write(path, results: dict):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    @classmethod
+    def compare(cls, results: dict, baseline: dict, threshold: float) -> list:
+        """
+        Compare results with a baseline. A metric regresses when it is more
+        than ``threshold`` (a fraction, e.g. 0.25) worse than its baseline.
+        Returns a list of regression messages, empty if there are none.
+        """
+        regressions = []
+        for phase, metrics in results['results'].items():
+            expected = baseline.get('results', {}).get(phase, {})
+            for metric, direction in cls.DIRECTIONS.items():
+                if metric not in metrics or not expected.get(metric):
+                    continue
+                value, reference = metrics[metric], expected[metric]
+                if direction == 'lower':
+                    regressed = value > reference * (1 + threshold)
+                else:
+                    regressed = value < reference * (1 - threshold)
+                if regressed and abs(value - reference) > cls.NOISE_FLOORS.get(metric, 0):
+                    change = (value - reference) / reference
+                    regressions.append(f'{phase} {metric}: {value:g} vs baseline {reference:g} ({change:+.0%})')
+        return regressions
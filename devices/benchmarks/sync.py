@@ -0,0 +1,124 @@
+import io
+import time
+import tracemalloc
+from contextlib import ExitStack, redirect_stdout
+from django.db import connections
+from devices.services.sync import SyncService
+from devices.services.synthetic_data import SyntheticDataService
+from .base import Benchmark, QueryCounter
+
+class SyncBenchmark(Benchmark):
+    """
+    End-to-end benchmark of ``SyncService.sync_source``.
+
+    Builds synthetic SQLite factory databases in a temporary directory and
+    syncs them into a fresh central database (the test database of the
+    default connection, so no real data is touched), first into an empty
+    central database (``cold``) and then after adding ``warm_fraction``
+    more runs to every analyzer (``warm``).
+
+    Peak memory is measured per phase with tracemalloc, as the most memory
+    allocated by Python during the phase's syncs. Tracing slows the syncs
+    down several times, so it runs in a second pass over an identical
+    dataset and the timings come from the untraced pass.
+    """
+
+    DIRECTIONS = {
+        'wall_time': 'lower',
+        'queries': 'lower',
+        'rows_per_second': 'higher',
+        'peak_memory': 'lower',
+    }
+    NOISE_FLOORS = {'wall_time': 0.05}  # seconds
+
+    def __init__(self, factories: int = 1, analyzers: int = 10, runs: int = 1000, seed: int = 42,
+                 warm_fraction: float = 0.01, chunk_size: int = 1000):
+        self.factories = factories
+        self.analyzers = analyzers
+        self.runs = runs
+        self.seed = seed
+        self.warm_fraction = warm_fraction
+        self.chunk_size = chunk_size
+
+    def config(self) -> dict:
+        return {
+            'factories': self.factories,
+            'analyzers': self.analyzers,
+            'runs': self.runs,
+            'seed': self.seed,
+            'warm_fraction': self.warm_fraction,
+            'chunk_size': self.chunk_size,
+        }
+
+    def run(self) -> dict:
+        results = self.run_phases(self.measure)
+        for phase, peak_memory in self.run_phases(self.measure_memory).items():
+            results[phase]['peak_memory'] = peak_memory
+        return {'config': self.config(), 'environment': self.environment(), 'results': results}
+
+    def run_phases(self, measure) -> dict:
+        """
+        Build the factories in a fresh central database and return the
+        results of ``measure(aliases)`` for the cold and warm phases.
+        """
+        with self.central_database() as directory:
+            aliases = [
+                self.create_factory(directory, f'benchmark_{n}', self.analyzers, self.runs, self.seed).name
+                for n in range(1, self.factories + 1)
+            ]
+
+            results = {'cold': measure(aliases)}
+            new_runs = max(1, round(self.runs * self.warm_fraction))
+            for alias in aliases:
+                SyntheticDataService.build_factory(
+                    alias, self.analyzers, new_runs, seed=self.seed, first_run=self.runs
+                )
+            results['warm'] = measure(aliases)
+        return results
+
+    def measure(self, aliases: list) -> dict:
+        central_queries, factory_queries = QueryCounter(), QueryCounter()
+        with ExitStack() as stack:
+            stack.enter_context(connections['default'].execute_wrapper(central_queries))
+            for alias in aliases:
+                stack.enter_context(connections[alias].execute_wrapper(factory_queries))
+
+            started = time.perf_counter()
+            sync_logs = self.sync(aliases)
+            wall_time = time.perf_counter() - started
+
+        stage_timings = {}
+        for sync_log in sync_logs:
+            for stage, seconds in sync_log.stage_timings.items():
+                stage_timings[stage] = round(stage_timings.get(stage, 0.0) + seconds, 6)
+        rows = sum(sync_log.records_processed for sync_log in sync_logs)
+
+        return {
+            'wall_time': round(wall_time, 4),
+            'queries': central_queries.count + factory_queries.count,
+            'central_queries': central_queries.count,
+            'factory_queries': factory_queries.count,
+            'rows': rows,
+            'rows_per_second': round(rows / wall_time, 1) if wall_time else None,
+            'stage_timings': stage_timings,
+        }
+
+    def measure_memory(self, aliases: list) -> int:
+        """Peak bytes allocated by Python while syncing ``aliases``."""
+        # Started per phase, so allocations of earlier phases are not traced
+        tracemalloc.start()
+        try:
+            self.sync(aliases)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def sync(self, aliases: list) -> list:
+        """Sync every factory and return the sync logs, raising if one failed."""
+        # The sync reports its progress with print
+        with redirect_stdout(io.StringIO()):
+            sync_logs = [SyncService.sync_source(alias, chunk_size=self.chunk_size) for alias in aliases]
+        for sync_log in sync_logs:
+            if sync_log is None or sync_log.status != 'success':
+                raise RuntimeError(f'Benchmark sync failed: {sync_log.error_message if sync_log else "no sync log"}')
+        return sync_logs
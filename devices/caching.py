@@ -0,0 +1,41 @@
+import hashlib
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from .services.response_cache import ResponseCacheService
+
+class CachedResponseMixin:
+    """
+    Cached GET responses with ETags for viewsets.
+
+    The data of a successful response is cached under its version and the
+    full path of the request, and the same pair is its ETag, so a client
+    sending it back in If-None-Match gets a 304 without the response being
+    built or even read from the cache.
+    """
+
+    def cached_response(self, request, version: str, build):
+        """
+        Return the cached response of the request for ``version``, or the
+        response returned by ``build()`` (cached if it is a 200).
+        """
+        digest = hashlib.md5(f'{version}|{request.get_full_path()}'.encode()).hexdigest()
+        etag = f'W/"{digest}"'
+
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if '*' in if_none_match or digest in {tag.removeprefix('W/').strip('"') for tag in if_none_match}:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = f'api:response:{digest}'
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = build()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, ResponseCacheService.timeout())
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -0,0 +1,115 @@
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+class FieldsetSerializerMixin:
+    """
+    Sparse fieldsets for model serializers.
+
+    ``fields`` limits the representation to the listed fields. ``expand``
+    lists the relations of ``expandable_fields`` that are embedded; the
+    others are rendered as primary keys. When neither is given the
+    serializer keeps its default representation, which embeds the
+    relations in ``default_expand``.
+    """
+
+    # Field name -> factory of the embedded representation
+    expandable_fields = {}
+    default_expand = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if expand is not None:
+            for name, expanded in self.expandable_fields.items():
+                if name not in self.fields:
+                    continue
+                if name in expand:
+                    self.fields[name] = expanded()
+                else:
+                    many = isinstance(self.fields[name], (serializers.ListSerializer, serializers.ManyRelatedField))
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(many=many, read_only=True)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class FieldsetViewMixin:
+    """
+    ``?fields=`` and ``?expand=`` for the list and retrieve actions of a
+    viewset whose serializer uses ``FieldsetSerializerMixin``.
+
+    Both take comma-separated field names. Either one switches to the flat
+    representation, where relations that are not expanded are primary
+    keys. The queryset only loads the columns of the requested fields (and
+    ``fieldset_columns``), joins the expanded foreign keys and prefetches
+    the expanded reverse relations, or just their IDs when not expanded.
+    """
+
+    fieldset_actions = ('list', 'retrieve')
+    fieldset_columns = ()  # Always loaded, e.g. for pagination
+
+    def get_fieldset(self):
+        """
+        Returns (fields, expand) of the request, None for the default
+        representation.
+        """
+        if self.action not in self.fieldset_actions:
+            return None, None
+        params = self.request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None, None
+
+        serializer_class = self.get_serializer_class()
+        fields = self.parse_fieldset_param('fields', serializer_class.Meta.fields)
+        expand = self.parse_fieldset_param('expand', serializer_class.expandable_fields) or []
+        return fields, expand
+
+    def parse_fieldset_param(self, param, allowed):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise serializers.ValidationError({param: f'Unknown field(s): {", ".join(unknown)}'})
+        return names
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_fieldset()
+        if expand is not None:
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in self.fieldset_actions:
+            return queryset
+        serializer_class = self.get_serializer_class()
+        fields, expand = self.get_fieldset()
+        if expand is None:
+            expand = serializer_class.default_expand
+        return self.plan_queryset(queryset, fields, expand)
+
+    def plan_queryset(self, queryset, fields, expand):
+        """
+        Select and prefetch what the representation of ``fields`` (all when
+        None) with ``expand`` reads, and defer every other column.
+        """
+        model = queryset.model
+        columns = set(self.fieldset_columns)
+        for name in self.get_serializer_class().Meta.fields if fields is None else fields:
+            field = model._meta.get_field(name)
+            if field.many_to_one:
+                columns.add(name)
+                if name in expand:
+                    queryset = queryset.select_related(name)
+            elif field.one_to_many:
+                if name in expand:
+                    queryset = queryset.prefetch_related(name)
+                else:
+                    related = field.related_model.objects.only('pk', field.field.name)
+                    queryset = queryset.prefetch_related(Prefetch(name, queryset=related))
+            else:
+                columns.add(name)
+        if fields is not None:
+            queryset = queryset.only(*columns)
+        return queryset
@@ -0,0 +1,70 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Base class of the benchmark commands: runs a Benchmark, writes its
+    results and compares them with a checked-in baseline.
+    """
+
+    benchmark_class = None
+    default_baseline = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument(
+            '--baseline',
+            default=str(self.default_baseline),
+            help=f'Baseline to compare with (default: {self.default_baseline.name})'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Allowed regression as a fraction of the baseline (default: 0.25)'
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Write the results to the baseline instead of comparing with it'
+        )
+
+    def get_benchmark(self, options):
+        raise NotImplementedError
+
+    def summarize(self, phase, metrics):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        benchmark = self.get_benchmark(options)
+        self.stdout.write(f'Running {type(benchmark).__name__} with {json.dumps(benchmark.config())}')
+        results = benchmark.run()
+
+        for phase, metrics in results['results'].items():
+            self.stdout.write(f'{phase}: {self.summarize(phase, metrics)}')
+        if options['output']:
+            benchmark.write(options['output'], results)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if options['update_baseline']:
+            benchmark.write(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f'Baseline updated: {options["baseline"]}'))
+            return
+
+        try:
+            baseline = benchmark.load(options['baseline'])
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING(f'No baseline at {options["baseline"]}, nothing to compare'))
+            return
+        if baseline['config'] != results['config']:
+            self.stdout.write(self.style.WARNING(
+                f'Baseline was recorded with {json.dumps(baseline["config"])}, not comparing'
+            ))
+            return
+
+        regressions = benchmark.compare(results, baseline, options['threshold'])
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(f'{len(regressions)} metrics regressed by more than {options["threshold"]:.0%}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions beyond {options["threshold"]:.0%} of the baseline'))
@@ -0,0 +1,37 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from devices.models import TestRun
+from devices.services.test_run import TestRunService
+
+class Command(BaseCommand):
+    help = 'Re-evaluates is_abnormal of every test run from its metrics, one UPDATE per ID range'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='databases',
+            help='Database to backfill (repeatable, default: default)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Run IDs per UPDATE (default: 10000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for db_name in options['databases'] or ['default']:
+            started = time.perf_counter()
+            max_id = TestRun.objects.using(db_name).aggregate(max_id=Max('id'))['max_id'] or 0
+            updated = 0
+            # Each range is its own short statement, so no long lock is held
+            for low in range(0, max_id, batch_size):
+                updated += TestRunService.evaluate_abnormal(
+                    TestRun.objects.using(db_name).filter(id__gt=low, id__lte=low + batch_size)
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'{db_name}: updated {updated} runs up to ID {max_id} in {time.perf_counter() - started:.1f}s'
+            ))
@@ -0,0 +1,37 @@
+from pathlib import Path
+from devices.benchmarks import ApiBenchmark
+from ._benchmark import BenchmarkCommand
+
+class Command(BenchmarkCommand):
+    help = 'Benchmarks API latency and queries per request on a synthetic dataset and compares them with a baseline'
+    default_baseline = Path(__file__).resolve().parents[2] / 'benchmarks' / 'baselines' / 'api.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyzers', type=int, default=10, help='Analyzers in the dataset (default: 10)')
+        parser.add_argument('--runs', type=int, default=20, help='Runs per analyzer (default: 20)')
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Multiplier for the number of runs per analyzer (default: 1.0)'
+        )
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint (default: 50)')
+        parser.add_argument('--sync-logs', type=int, default=20, help='Syncs run to build history (default: 20)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        super().add_arguments(parser)
+
+    def get_benchmark(self, options):
+        return ApiBenchmark(
+            analyzers=options['analyzers'],
+            runs=int(options['runs'] * options['scale']),
+            requests=options['requests'],
+            sync_logs=options['sync_logs'],
+            seed=options['seed']
+        )
+
+    def summarize(self, phase, metrics):
+        return (
+            f'p50 {metrics["p50"]:.1f}ms, p95 {metrics["p95"]:.1f}ms, p99 {metrics["p99"]:.1f}ms, '
+            f'{metrics["queries_per_request"]:g} queries/request, {metrics["response_bytes"]:,} bytes, '
+            f'status {",".join(map(str, metrics["status_codes"]))}'
+        )
@@ -0,0 +1,43 @@
+from pathlib import Path
+from devices.benchmarks import SyncBenchmark
+from ._benchmark import BenchmarkCommand
+
+class Command(BenchmarkCommand):
+    help = 'Benchmarks cold and warm syncs of synthetic factories and compares them with a baseline'
+    default_baseline = Path(__file__).resolve().parents[2] / 'benchmarks' / 'baselines' / 'sync.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factories', type=int, default=1, help='Number of factories (default: 1)')
+        parser.add_argument('--analyzers', type=int, default=10, help='Analyzers per factory (default: 10)')
+        parser.add_argument('--runs', type=int, default=1000, help='Runs per analyzer (default: 1000)')
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Multiplier for the number of runs per analyzer (default: 1.0)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument(
+            '--warm-fraction',
+            type=float,
+            default=0.01,
+            help='New runs added before the warm sync, as a fraction of --runs (default: 0.01)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Sync chunk size (default: 1000)')
+        super().add_arguments(parser)
+
+    def get_benchmark(self, options):
+        return SyncBenchmark(
+            factories=options['factories'],
+            analyzers=options['analyzers'],
+            runs=int(options['runs'] * options['scale']),
+            seed=options['seed'],
+            warm_fraction=options['warm_fraction'],
+            chunk_size=options['chunk_size']
+        )
+
+    def summarize(self, phase, metrics):
+        return (
+            f'{metrics["rows"]} rows in {metrics["wall_time"]:.2f}s ({metrics["rows_per_second"]:.0f} rows/s), '
+            f'{metrics["queries"]} queries, peak memory {metrics["peak_memory"]:,} bytes'
+        )
@@ -0,0 +1,89 @@
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from devices.models import DataSource
+from devices.services.factory_registry import FactoryRegistry
+from devices.services.synthetic_data import SyntheticDataService
+
+class Command(BaseCommand):
+    help = 'Builds a reproducible dataset of N factories x M analyzers x K runs x all metric types'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--factories',
+            type=int,
+            help='Number of factories (defaults to all factory databases). Missing ones '
+                 'are created as SQLite databases named synthetic_<n>'
+        )
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='databases',
+            help='Factory database to fill (repeatable, overrides --factories)'
+        )
+        parser.add_argument('--analyzers', type=int, default=10, help='Analyzers per factory (default: 10)')
+        parser.add_argument('--runs', type=int, default=100, help='Runs per analyzer (default: 100)')
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Multiplier for the number of runs per analyzer (default: 1.0)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument(
+            '--first-run',
+            type=int,
+            default=0,
+            help='Index of the first run to write, to grow an existing dataset (default: 0)'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Runs per transaction (default: 5000)')
+        parser.add_argument(
+            '--directory',
+            default=str(settings.BASE_DIR),
+            help='Where to create the SQLite files of new factories (default: BASE_DIR)'
+        )
+
+    def handle(self, *args, **options):
+        databases = options['databases'] or self.get_factories(options['factories'], options['directory'])
+        runs = int(options['runs'] * options['scale'])
+
+        for db_name in databases:
+            started = time.perf_counter()
+            counts = SyntheticDataService.build_factory(
+                db_name,
+                analyzers=options['analyzers'],
+                runs=runs,
+                seed=options['seed'],
+                first_run=options['first_run'],
+                batch_size=options['batch_size']
+            )
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'{db_name}: {counts["analyzers"]} analyzers, {counts["runs"]} runs and '
+                f'{counts["metrics"]} metrics in {elapsed:.1f}s ({counts["runs"] / elapsed:.0f} runs/s)'
+            ))
+
+    def get_factories(self, count, directory):
+        factories = FactoryRegistry.factory_aliases()
+        if count is None:
+            return factories
+        if count < 1:
+            raise CommandError('--factories must be at least 1')
+
+        for n in range(len(factories) + 1, count + 1):
+            name = f'synthetic_{n}'
+            path = Path(directory).resolve() / f'{name}.sqlite3'
+            source, _ = DataSource.objects.using('default').get_or_create(
+                name=name,
+                defaults={
+                    'source_type': DataSource.SourceType.FACTORY,
+                    'database_url': f'sqlite:///{path}',
+                }
+            )
+            alias = FactoryRegistry.alias_for(source)
+            call_command('migrate', database=alias, verbosity=0)
+            self.stdout.write(f'Created factory database {alias} at {path}')
+            factories.append(alias)
+        return factories[:count]
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from devices.services.factory_registry import FactoryRegistry
+
+class Command(BaseCommand):
+    help = 'Checks the connection to every registered factory database'
+
+    def handle(self, *args, **options):
+        failed = 0
+        for alias in FactoryRegistry.factory_aliases():
+            if FactoryRegistry.check_health(alias):
+                self.stdout.write(self.style.SUCCESS(f'{alias}: OK'))
+            else:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'{alias}: unreachable'))
+            FactoryRegistry.release(alias)
+
+        if failed:
+            self.stdout.write(self.style.ERROR(f'{failed} factory databases unreachable'))
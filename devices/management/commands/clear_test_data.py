@@ -1,19 +1,52 @@
-from django.core.management.base import BaseCommand
-from devices.models import BloodAnalyzer, DataSource, SyncLog, TestRun, TestMetric
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from devices.models import (
+    BloodAnalyzer, DataSource, SyncLog, TestRun, TestMetric,
+    FactoryUserMapping, SyncLease
+)
 from django.db.utils import OperationalError
-from django.db import connection, connections
+from django.db import connections, transaction
 import logging
+from devices.services.factory_registry import FactoryRegistry
+from devices.services.change_capture import ChangeCaptureService
 
 logger = logging.getLogger(__name__)
 
+# Tables emptied by --fast, in dependency order
+FACTORY_MODELS = [TestMetric, TestRun, BloodAnalyzer]
+SYSTEM_MODELS = [SyncLease, FactoryUserMapping, SyncLog]
+
 class Command(BaseCommand):
     help = 'Clears all test data from all databases'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fast',
+            action='store_true',
+            help='Truncate the tables instead of deleting row by row, reset their IDs and reclaim disk space'
+        )
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='databases',
+            help='Factory database to use (repeatable, defaults to the factories configured in settings)'
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Clearing test data from all databases...')
 
         # List of all databases to clear
-        databases = ['default', 'factory_a', 'factory_c']
+        try:
+            factory_dbs = FactoryRegistry.development_aliases(options['databases'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        databases = ['default'] + factory_dbs
+
+        if options['fast']:
+            for db in databases:
+                self.truncate_database(db)
+            self.stdout.write(self.style.SUCCESS('Successfully cleared test data from all databases'))
+            return
 
         for db in databases:
             self.stdout.write(f'\nClearing {db} database...')
@@ -32,26 +65,14 @@ class Command(BaseCommand):
 
             try:
                 # 2. TestRuns (depends on BloodAnalyzer)
-                if db in ['factory_a', 'factory_c']:
+                if db in factory_dbs:
                     # For factory databases, use raw SQL to avoid ORM issues
                     with connections[db].cursor() as cursor:
                         try:
                             # Count test runs
                             cursor.execute("SELECT COUNT(*) FROM devices_testrun")
                             runs_count = cursor.fetchone()[0]
-                            
-                            # Try to clear data_source references if column exists
-                            try:
-                                cursor.execute("SELECT data_source_id FROM devices_testrun LIMIT 1")
-                                # Delete all test runs
-                                cursor.execute("DELETE FROM devices_testrun")
-                                self.stdout.write(f'Deleted test runs from {db} database')
-                            except Exception as e:
-                                if 'no such column' in str(e):
-                                    self.stdout.write(f'No data_source column in test runs table in {db} database - skipping data_source cleanup')
-                                else:
-                                    raise
-                            
+
                             # Delete all test runs
                             cursor.execute("DELETE FROM devices_testrun")
                             self.stdout.write(f'Deleted {runs_count} test runs from {db}')
@@ -73,26 +94,14 @@ class Command(BaseCommand):
 
             try:
                 # 3. BloodAnalyzers
-                if db in ['factory_a', 'factory_c']:
+                if db in factory_dbs:
                     # For factory databases, use raw SQL to avoid ORM issues
                     with connections[db].cursor() as cursor:
                         try:
                             # Count devices
                             cursor.execute("SELECT COUNT(*) FROM devices_bloodanalyzer")
                             devices_count = cursor.fetchone()[0]
-                            
-                            # Try to clear data_source references if column exists
-                            try:
-                                cursor.execute("SELECT data_source_id FROM devices_bloodanalyzer LIMIT 1")
-                                # Delete all devices
-                                cursor.execute("DELETE FROM devices_bloodanalyzer")
-                                self.stdout.write(f'Deleted blood analyzers from {db} database')
-                            except Exception as e:
-                                if 'no such column' in str(e):
-                                    self.stdout.write(f'No data_source column in blood analyzers table in {db} database - skipping data_source cleanup')
-                                else:
-                                    raise
-                            
+
                             # Delete all devices
                             cursor.execute("DELETE FROM devices_bloodanalyzer")
                             self.stdout.write(f'Deleted {devices_count} devices from {db}')
@@ -126,9 +135,11 @@ class Command(BaseCommand):
                         raise
 
                 try:
-                    # Delete DataSources last (no dependencies)
-                    sources_count = DataSource.objects.using(db).filter(source_type='factory').count()
-                    DataSource.objects.using(db).filter(source_type='factory').delete()
+                    # Delete DataSources last (no dependencies), keeping those
+                    # that carry the connection of a factory
+                    sources = DataSource.objects.using(db).filter(source_type='factory', database_url='')
+                    sources_count = sources.count()
+                    sources.delete()
                     self.stdout.write(f'Deleted {sources_count} factory data sources from {db}')
                 except OperationalError as e:
                     if 'no such table' in str(e):
@@ -138,6 +149,44 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS('Successfully cleared test data from all databases'))
 
+    def truncate_database(self, db):
+        """
+        Empty the test data tables of a database in one transaction: TRUNCATE
+        ... RESTART IDENTITY CASCADE on PostgreSQL, DELETE plus a
+        sqlite_sequence reset on SQLite (see DatabaseOperations.sql_flush).
+        SQLite files are vacuumed afterwards to give the space back.
+        """
+        conn = connections[db]
+        existing = set(conn.introspection.table_names())
+        models = FACTORY_MODELS + (SYSTEM_MODELS if db == 'default' else [])
+        tables = [model._meta.db_table for model in models if model._meta.db_table in existing]
+        with conn.cursor() as cursor:
+            # Empty tables are skipped, which also covers factories without devices_datasource
+            tables = [table for table in tables if self.has_rows(conn, cursor, table)]
+        # Change capture triggers would log every deleted row
+        capture = ChangeCaptureService.CHANGELOG_TABLE in existing
+
+        with transaction.atomic(using=db):
+            if capture:
+                ChangeCaptureService.uninstall(db)
+            conn.ops.execute_sql_flush(
+                conn.ops.sql_flush(no_style(), tables, reset_sequences=True, allow_cascade=True)
+            )
+            if db == 'default' and 'devices_datasource' in existing:
+                DataSource.objects.using(db).filter(source_type='factory', database_url='').delete()
+            if capture:
+                ChangeCaptureService.install(db)
+        self.stdout.write(f'Truncated {", ".join(tables) or "no tables"} in {db}')
+
+        if conn.vendor == 'sqlite':
+            with conn.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write(f'Vacuumed {db}')
+
+    def has_rows(self, conn, cursor, table):
+        cursor.execute(f"SELECT 1 FROM {conn.ops.quote_name(table)} LIMIT 1")
+        return cursor.fetchone() is not None
+
     def clear_factory_data(self, factory_db):
         """Clear test data from the specified factory database"""
         with connections[factory_db].cursor() as cursor:
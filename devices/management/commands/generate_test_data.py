@@ -1,17 +1,40 @@
-from django.core.management.base import BaseCommand
-from django.db import connections
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
 import random
 import logging
+import multiprocessing
 import time
 import os
-from django.conf import settings
+from devices.services.factory_registry import FactoryRegistry
+from devices.services.test_run import TestRunService
 
 logger = logging.getLogger(__name__)
 
+TEST_RUN_SQL = """
+    INSERT INTO devices_testrun (
+        run_id, device_id, executed_by_id, timestamp, run_type,
+        is_abnormal, is_factory_data, notes, data_source_id
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+TEST_METRIC_SQL = """
+    INSERT INTO devices_testmetric (
+        test_run_id, metric_type, value, expected_min, expected_max
+    ) VALUES (%s, %s, %s, %s, %s)
+"""
+
+METRICS = [
+    ('wbc', 4.0, 11.0),    # White Blood Cells
+    ('rbc', 4.0, 6.0),     # Red Blood Cells
+    ('hgb', 12.0, 18.0),   # Hemoglobin
+    ('hct', 36.0, 54.0),   # Hematocrit
+    ('plt', 150.0, 450.0)  # Platelets
+]
+
 class Command(BaseCommand):
-    help = 'Generates test data for factory databases every 3 minutes'
+    help = 'Generates test data for factory databases every 3 minutes, or at a target rate with --load'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -20,34 +43,70 @@ class Command(BaseCommand):
             default=180,
             help='Interval in seconds between data generation (default: 180)'
         )
+        parser.add_argument(
+            '--load',
+            action='store_true',
+            help='Write runs continuously at --rate runs per second per factory instead'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=100,
+            help='Target runs per second per factory in load mode, 0 for unthrottled (default: 100)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Runs written per transaction in load mode (default: 100)'
+        )
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=1,
+            help='Parallel writer processes per factory in load mode (default: 1)'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=0,
+            help='Stop load mode after this many seconds, 0 to run until interrupted (default: 0)'
+        )
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='databases',
+            help='Factory database to use (repeatable, defaults to the factories configured in settings)'
+        )
 
     def handle(self, *args, **options):
         interval = options['interval']
         self.stdout.write(self.style.SUCCESS('Starting test data generation...'))
 
+        try:
+            factory_dbs = FactoryRegistry.development_aliases(options['databases'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
         # Initialize data source in all databases
         try:
             self.data_source_ids = {}
-            for db_name in ['default', 'factory_a', 'factory_c']:
-                db_path = settings.DATABASES[db_name]['NAME']
-                
-                # Ensure the database directory exists
-                os.makedirs(os.path.dirname(db_path), exist_ok=True)
-                
-                # Connect directly to SQLite to create the table if needed
-                with connections[db_name].cursor() as cursor:
-                    # Check if devices_datasource table exists
-                    cursor.execute("""
-                        SELECT name FROM sqlite_master 
-                        WHERE type='table' AND name='devices_datasource'
-                    """)
-                    table_exists = cursor.fetchone() is not None
+            self.user_ids = {}
+            for db_name in ['default'] + factory_dbs:
+                connection = connections[db_name]
+                if connection.vendor == 'sqlite':
+                    # Ensure the database directory exists
+                    os.makedirs(os.path.dirname(connection.settings_dict['NAME']), exist_ok=True)
 
+                # Create the table directly if needed
+                table_exists = 'devices_datasource' in connection.introspection.table_names()
+                id_column = 'INTEGER PRIMARY KEY AUTOINCREMENT' if connection.vendor == 'sqlite' else 'SERIAL PRIMARY KEY'
+                with connection.cursor() as cursor:
                     if not table_exists:
                         # Create the devices_datasource table
-                        cursor.execute("""
+                        cursor.execute(f"""
                             CREATE TABLE devices_datasource (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                id {id_column},
                                 name varchar(50) NOT NULL,
                                 source_type varchar(20) NOT NULL,
                                 last_sync datetime NULL,
@@ -70,26 +129,30 @@ class Command(BaseCommand):
                             VALUES (%s, %s, %s, %s)
                         """, [db_name, 'factory', True, now.isoformat()])
                         
-                        cursor.execute("SELECT last_insert_rowid()")
+                        cursor.execute("SELECT id FROM devices_datasource WHERE name = %s", [db_name])
                         self.data_source_ids[db_name] = cursor.fetchone()[0]
                         self.stdout.write(self.style.SUCCESS(f'Created default data source in {db_name}'))
 
+                if db_name != 'default':
+                    # Technician recorded on every generated run
+                    with connections[db_name].cursor() as cursor:
+                        cursor.execute("SELECT id FROM auth_user LIMIT 1")
+                        self.user_ids[db_name] = cursor.fetchone()[0]
+
         except Exception as e:
             logger.error(f"Error initializing data sources: {str(e)}")
             raise
 
+        if options['load']:
+            self.run_load(factory_dbs, options)
+            return
+
         while True:
             try:
-                # Get analyzers from both factory databases
-                factory_a_analyzers = self.get_factory_analyzers('factory_a')
-                factory_c_analyzers = self.get_factory_analyzers('factory_c')
-                
-                # Generate test runs and metrics for each analyzer
-                for analyzer in factory_a_analyzers:
-                    self.generate_test_run(analyzer, 'factory_a')
-                    
-                for analyzer in factory_c_analyzers:
-                    self.generate_test_run(analyzer, 'factory_c')
+                # Generate test runs and metrics for each analyzer of every factory database
+                for factory_db in factory_dbs:
+                    for analyzer in self.get_factory_analyzers(factory_db):
+                        self.generate_test_run(analyzer, factory_db)
                     
                 self.stdout.write(self.style.SUCCESS('Successfully generated test data in factory databases'))
                 
@@ -110,69 +173,112 @@ class Command(BaseCommand):
     def generate_test_run(self, analyzer, factory_db):
         """Generate a test run and metrics for an analyzer"""
         try:
-            # Create test run
-            with connections[factory_db].cursor() as cursor:
-                # Generate a unique run_id using timestamp, microseconds, and a random suffix
-                now = timezone.now()
-                random_suffix = ''.join(random.choices('0123456789ABCDEF', k=4))
-                test_run_id = f"{now.strftime('%Y%m%d%H%M%S')}_{now.microsecond:06d}_{random_suffix}_{analyzer['device_id']}"
-                
-                # Get the first user ID for executed_by_id
-                cursor.execute("SELECT id FROM auth_user LIMIT 1")
-                user_id = cursor.fetchone()[0]
-                
-                # Get the first data source ID
-                cursor.execute("SELECT id FROM devices_datasource LIMIT 1")
-                data_source_id = cursor.fetchone()[0]
-                
-                cursor.execute("""
-                    INSERT INTO devices_testrun (
-                        run_id, device_id, executed_by_id, timestamp, run_type,
-                        is_abnormal, is_factory_data, notes, data_source_id
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, [
-                    test_run_id,
-                    analyzer['id'],
-                    user_id,
-                    now.isoformat(),
-                    'production',
-                    False,
-                    True,
-                    f"Test run for analyzer {analyzer['device_id']}",
-                    data_source_id
-                ])
-                
-                # Get the ID of the inserted test run
-                cursor.execute("SELECT id FROM devices_testrun WHERE run_id = %s", [test_run_id])
-                test_run_db_id = cursor.fetchone()[0]
-                
-                # Generate test metrics
-                self.generate_test_metrics(cursor, test_run_db_id)
-                
+            # Generate a unique run_id using timestamp, microseconds, and a random suffix
+            now = timezone.now()
+            random_suffix = ''.join(random.choices('0123456789ABCDEF', k=4))
+            test_run_id = f"{now.strftime('%Y%m%d%H%M%S')}_{now.microsecond:06d}_{random_suffix}_{analyzer['device_id']}"
+
+            with transaction.atomic(using=factory_db), connections[factory_db].cursor() as cursor:
+                test_run_db_id = self.insert_test_run(cursor, analyzer, factory_db, test_run_id, now)
+                cursor.executemany(TEST_METRIC_SQL, self.test_metric_rows(test_run_db_id))
+                TestRunService.evaluate_abnormal_ids([test_run_db_id], using=factory_db)
+
         except Exception as e:
             logger.error(f"Error generating test run for analyzer {analyzer['device_id']}: {str(e)}")
             raise
 
-    def generate_test_metrics(self, cursor, test_run_id):
-        """Generate test metrics for a test run"""
-        metrics = [
-            ('wbc', 4.0, 11.0),    # White Blood Cells
-            ('rbc', 4.0, 6.0),     # Red Blood Cells
-            ('hgb', 12.0, 18.0),   # Hemoglobin
-            ('hct', 36.0, 54.0),   # Hematocrit
-            ('plt', 150.0, 450.0)  # Platelets
+    def insert_test_run(self, cursor, analyzer, factory_db, test_run_id, now):
+        """Insert a test run with the cached user and data source IDs and return its ID"""
+        cursor.execute(TEST_RUN_SQL, [
+            test_run_id,
+            analyzer['id'],
+            self.user_ids[factory_db],
+            connections[factory_db].ops.adapt_datetimefield_value(now),
+            'production',
+            False,
+            True,
+            f"Test run for analyzer {analyzer['device_id']}",
+            self.data_source_ids[factory_db]
+        ])
+        return cursor.lastrowid
+
+    def test_metric_rows(self, test_run_id):
+        """Generate the metric rows of a test run"""
+        return [
+            [test_run_id, name, random.uniform(min_val, max_val), min_val, max_val]
+            for name, min_val, max_val in METRICS
+        ]
+
+    def run_load(self, factory_dbs, options):
+        """Run the load writers, in parallel processes if there is more than one"""
+        writers = [(db_name, n) for db_name in factory_dbs for n in range(options['writers'])]
+        rate = options['rate'] / options['writers']
+        self.stdout.write(self.style.SUCCESS(
+            f"Writing {options['rate'] or 'unthrottled'} runs/s to each of {', '.join(factory_dbs)} "
+            f"with {len(writers)} writers"
+        ))
+        if len(writers) == 1:
+            self.write_load(*writers[0], rate, options['batch_size'], options['duration'])
+            return
+
+        # Children open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(
+                target=self.write_load,
+                args=(db_name, n, rate, options['batch_size'], options['duration'])
+            )
+            for db_name, n in writers
         ]
-        
-        for name, min_val, max_val in metrics:
-            value = random.uniform(min_val, max_val)
-            cursor.execute("""
-                INSERT INTO devices_testmetric (
-                    test_run_id, metric_type, value, expected_min, expected_max
-                ) VALUES (%s, %s, %s, %s, %s)
-            """, [
-                test_run_id,
-                name,
-                value,
-                min_val,
-                max_val
-            ]) 
\ No newline at end of file
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+
+    def write_load(self, factory_db, writer, rate, batch_size, duration):
+        """Write batches of runs to a factory, paced to ``rate`` runs per second"""
+        analyzers = self.get_factory_analyzers(factory_db)
+        if not analyzers:
+            self.stdout.write(self.style.WARNING(f'No analyzers in {factory_db}, nothing to write'))
+            return
+        prefix = f"L{timezone.now().strftime('%m%d%H%M%S')}{writer:02d}"
+        started = time.monotonic()
+        last_report = started
+        written = 0
+
+        try:
+            while not duration or time.monotonic() - started < duration:
+                now = timezone.now()
+                with transaction.atomic(using=factory_db), connections[factory_db].cursor() as cursor:
+                    metric_rows = []
+                    test_run_db_ids = []
+                    for n in range(written, written + batch_size):
+                        analyzer = analyzers[n % len(analyzers)]
+                        test_run_id = f"{prefix}-{n:08d}-{analyzer['device_id']}"
+                        test_run_db_ids.append(self.insert_test_run(cursor, analyzer, factory_db, test_run_id, now))
+                        metric_rows.extend(self.test_metric_rows(test_run_db_ids[-1]))
+                    cursor.executemany(TEST_METRIC_SQL, metric_rows)
+                    # The raw inserts skip TestMetric.save
+                    TestRunService.evaluate_abnormal_ids(test_run_db_ids, using=factory_db)
+                written += batch_size
+
+                if rate:
+                    delay = started + written / rate - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                if time.monotonic() - last_report >= 10:
+                    last_report = time.monotonic()
+                    self.stdout.write(
+                        f'{factory_db} writer {writer}: {written} runs ({written / (last_report - started):.0f}/s)'
+                    )
+        except KeyboardInterrupt:
+            pass
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{factory_db} writer {writer}: wrote {written} runs in {elapsed:.1f}s ({written / elapsed:.0f}/s)'
+        ))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from devices.models import DataSource
+from devices.services.change_capture import ChangeCaptureService
+from devices.services.factory_registry import FactoryRegistry
+from devices.services.sync import SyncService
+
+class Command(BaseCommand):
+    help = (
+        'Installs change capture triggers and the changelog table in factory databases '
+        'and switches their sources to changelog syncs'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='databases',
+            help='Factory database to install into (repeatable, defaults to all factory databases)'
+        )
+        parser.add_argument(
+            '--uninstall',
+            action='store_true',
+            help='Remove the triggers and changelog table instead'
+        )
+
+    def handle(self, *args, **options):
+        databases = options['databases'] or FactoryRegistry.factory_aliases()
+
+        for db in databases:
+            source = FactoryRegistry.source_for(db)
+            if options['uninstall']:
+                ChangeCaptureService.uninstall(db)
+                if source is not None:
+                    self.set_sync_mode(source, DataSource.SyncMode.HIGH_WATER)
+                self.stdout.write(self.style.SUCCESS(f'Removed change capture from {db}'))
+            else:
+                ChangeCaptureService.install(db)
+                if source is not None and source.sync_mode != DataSource.SyncMode.CHANGELOG:
+                    # Runs written before the triggers existed are not in the
+                    # changelog, so catch up with one high-water sync first
+                    sync_log = SyncService.sync_source(source.name)
+                    if sync_log is None or sync_log.status != 'success':
+                        self.stdout.write(self.style.ERROR(
+                            f'Catch-up sync of {source.name} failed, it keeps high-water syncs'
+                        ))
+                        continue
+                    self.set_sync_mode(source, DataSource.SyncMode.CHANGELOG)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Installed change capture on {", ".join(ChangeCaptureService.CAPTURED_TABLES)} in {db}'
+                ))
+
+    def set_sync_mode(self, source, sync_mode):
+        source.sync_mode = sync_mode
+        source.save(update_fields=['sync_mode'])
+        self.stdout.write(f'{source.name} now uses {sync_mode} syncs')
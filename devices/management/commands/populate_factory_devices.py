@@ -1,4 +1,4 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connections
 from devices.models import TestMetric, TestRun, BloodAnalyzer, DataSource
 from django.contrib.auth.models import User
@@ -9,16 +9,29 @@ from datetime import datetime, timedelta
 import uuid
 import logging
 import os
+from devices.services.factory_registry import FactoryRegistry
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     help = 'Populates factory databases with blood analyzer devices'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='databases',
+            help='Factory database to use (repeatable, defaults to the factories configured in settings)'
+        )
+
     def handle(self, *args, **options):
         # Initialize data sources
         self.data_source_ids = {}
-        for db_name in ['factory_a', 'factory_c']:
+        try:
+            factory_dbs = FactoryRegistry.development_aliases(options['databases'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for db_name in factory_dbs:
             # Create data source in default database if it doesn't exist
             with connections['default'].cursor() as cursor:
                 cursor.execute("""
@@ -39,7 +52,7 @@ class Command(BaseCommand):
                     self.stdout.write(f"Created data source for {db_name}")
 
         # Clear existing data
-        for db_name in ['factory_a', 'factory_c']:
+        for db_name in factory_dbs:
             with connections[db_name].cursor() as cursor:
                 # Clear test metrics
                 cursor.execute("DELETE FROM devices_testmetric")
@@ -54,12 +67,11 @@ class Command(BaseCommand):
                 self.stdout.write(f"Cleared blood analyzers from {db_name} database")
                 
                 # Add data_source_id column if it doesn't exist
-                cursor.execute("""
-                    SELECT sql FROM sqlite_master 
-                    WHERE type='table' AND name='devices_bloodanalyzer'
-                """)
-                create_sql = cursor.fetchone()[0]
-                if 'data_source_id' not in create_sql:
+                columns = {
+                    column.name for column in
+                    connections[db_name].introspection.get_table_description(cursor, 'devices_bloodanalyzer')
+                }
+                if 'data_source_id' not in columns:
                     cursor.execute("ALTER TABLE devices_bloodanalyzer ADD COLUMN data_source_id INTEGER NOT NULL DEFAULT 0")
                     self.stdout.write(f"Added data_source_id column to devices_bloodanalyzer in {db_name}")
                 
@@ -68,7 +80,7 @@ class Command(BaseCommand):
                 self.stdout.write(f"Cleared users from {db_name} database")
 
         # Create devices for each factory
-        for db_name in ['factory_a', 'factory_c']:
+        for db_name in factory_dbs:
             try:
                 with connections[db_name].cursor() as cursor:
                     # Create a technician user
@@ -0,0 +1,58 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from devices.models import DataSource
+from devices.services.reconciliation import ReconciliationService
+
+class Command(BaseCommand):
+    help = 'Compares per-device, per-day digests of factory and central data and re-syncs drifted buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            action='append',
+            dest='sources',
+            help='Data source name to reconcile (repeatable, defaults to all active factory sources)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Only check runs from the last N days'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted buckets without re-syncing them'
+        )
+
+    def handle(self, *args, **options):
+        sources = options['sources'] or list(
+            DataSource.objects.filter(
+                is_active=True, source_type=DataSource.SourceType.FACTORY
+            ).values_list('name', flat=True)
+        )
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+
+        for source_name in sources:
+            report = ReconciliationService.reconcile(source_name, since=since, repair=not options['dry_run'])
+            drifted = report['mismatched'] + report['missing']
+            for device_id, day in drifted:
+                self.stdout.write(f'  {source_name}: {device_id} {day} differs')
+            for device_id, day in report['extra']:
+                self.stdout.write(self.style.WARNING(f'  {source_name}: {device_id} {day} only exists centrally'))
+            for device_id, day in report['central_only']:
+                self.stdout.write(self.style.WARNING(f'  {source_name}: {device_id} {day} has runs only in central'))
+
+            if not drifted:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{source_name}: {report["buckets_checked"]} buckets in sync'
+                ))
+            elif options['dry_run']:
+                self.stdout.write(self.style.WARNING(
+                    f'{source_name}: {len(drifted)} of {report["buckets_checked"]} buckets drifted'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{source_name}: repaired {len(drifted)} buckets '
+                    f'({report["runs_created"]} runs created, {report["metrics_synced"]} metrics synced)'
+                ))
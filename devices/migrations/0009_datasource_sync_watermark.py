@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0008_alter_bloodanalyzer_data_source_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='last_synced_run_at',
+            field=models.DateTimeField(blank=True, help_text='Timestamp of the factory test run at the high-water mark', null=True),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='last_synced_run_pk',
+            field=models.BigIntegerField(default=0, help_text='High-water mark: highest factory test run ID copied to the central database'),
+        ),
+    ]
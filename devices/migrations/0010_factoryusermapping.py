@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0009_datasource_sync_watermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FactoryUserMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('factory_user_id', models.BigIntegerField(help_text='ID of the user in the factory database')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_mappings', to='devices.datasource')),
+                ('user', models.ForeignKey(help_text='Matching user in the central database', on_delete=django.db.models.deletion.CASCADE, related_name='factory_mappings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Factory User Mapping',
+                'verbose_name_plural': 'Factory User Mappings',
+                'constraints': [models.UniqueConstraint(fields=('source', 'factory_user_id'), name='unique_factory_user_per_source')],
+            },
+        ),
+    ]
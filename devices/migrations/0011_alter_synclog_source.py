@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0010_factoryusermapping'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='synclog',
+            name='source',
+            field=models.ForeignKey(blank=True, help_text='Synced data source, empty for the summary of a multi-source sync', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sync_logs', to='devices.datasource'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0011_alter_synclog_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synclog',
+            name='checkpoint_run_pk',
+            field=models.BigIntegerField(default=0, help_text='Last factory test run ID committed by this sync'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0012_synclog_checkpoint_run_pk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='last_change_seq',
+            field=models.BigIntegerField(default=0, help_text='Highest factory changelog sequence number applied to the central database'),
+        ),
+    ]
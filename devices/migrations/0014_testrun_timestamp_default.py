@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0013_datasource_last_change_seq'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testrun',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the test batch was executed'),
+        ),
+    ]
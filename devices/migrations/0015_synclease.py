@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0014_testrun_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.CharField(blank=True, help_text='Token of the sync holding the lease, empty when released', max_length=64)),
+                ('acquired_at', models.DateTimeField(blank=True, help_text='When the current holder acquired the lease', null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, help_text='Last heartbeat of the current holder', null=True)),
+                ('expires_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The lease is free once this time has passed')),
+                ('source', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync_lease', to='devices.datasource')),
+                ('sync_log', models.ForeignKey(blank=True, help_text='Sync log of the sync holding the lease', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='devices.synclog')),
+            ],
+            options={
+                'verbose_name': 'Sync Lease',
+                'verbose_name_plural': 'Sync Leases',
+            },
+        ),
+    ]
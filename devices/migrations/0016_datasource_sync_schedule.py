@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0015_synclease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='next_sync_due',
+            field=models.DateTimeField(blank=True, help_text='When the scheduler syncs this source next (empty means now)', null=True),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='sync_interval',
+            field=models.PositiveIntegerField(default=300, help_text='Seconds between syncs, adapted to the rate of new rows'),
+        ),
+    ]
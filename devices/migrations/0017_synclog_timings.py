@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0016_datasource_sync_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synclog',
+            name='bytes_read',
+            field=models.BigIntegerField(default=0, help_text='Estimated size of the factory rows read'),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='duration',
+            field=models.FloatField(blank=True, help_text='Wall time of the sync in seconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='peak_memory',
+            field=models.BigIntegerField(blank=True, help_text='Peak resident memory of the sync process in bytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='rows_per_second',
+            field=models.FloatField(blank=True, help_text='Factory rows read per second', null=True),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict, help_text='Wall time in seconds per sync stage'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0017_synclog_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='database_url',
+            field=models.CharField(blank=True, help_text='Connection URL (e.g. postgres://user@host:5432/factory_b), empty if the alias is configured in settings', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='db_alias',
+            field=models.CharField(blank=True, help_text='Database alias of this source, derived from the name when empty', max_length=50),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0018_datasource_connection'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='synclog',
+            index=models.Index(fields=['timestamp', 'id'], name='devices_syn_timesta_fc76e9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testrun',
+            index=models.Index(fields=['timestamp', 'id'], name='devices_tes_timesta_a7e555_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0019_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='synclog',
+            name='peak_memory',
+            field=models.BigIntegerField(blank=True, help_text='Peak resident memory sampled during the sync in bytes', null=True),
+        ),
+    ]
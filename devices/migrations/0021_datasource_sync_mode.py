@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0020_synclog_peak_memory_help'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='sync_mode',
+            field=models.CharField(choices=[('high_water', 'New test runs above the high-water mark'), ('changelog', 'Changelog of the capture triggers')], default='high_water', help_text='How syncs read the factory; set to changelog by install_change_capture', max_length=20),
+        ),
+    ]
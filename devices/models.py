@@ -99,7 +99,7 @@ class TestRun(models.Model):
         default=RunType.PRODUCTION
     )
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         help_text="When the test batch was executed"
     )
     is_abnormal = models.BooleanField(
@@ -132,6 +132,7 @@ class TestRun(models.Model):
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['device', 'timestamp']),
+            models.Index(fields=['timestamp', 'id']),  # Keyset pagination
             models.Index(fields=['is_abnormal']),
             models.Index(fields=['run_type']),
         ]
@@ -244,18 +245,56 @@ class TestMetric(models.Model):
     def __str__(self):
         return f"{self.get_metric_type_display()}: {self.value} ({self.test_run.run_id})"
     
+    @property
+    def is_out_of_range(self):
+        return self.value < self.expected_min or self.value > self.expected_max
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not {'test_run_id', 'value', 'expected_min', 'expected_max'} & instance.get_deferred_fields():
+            instance._stored_range = (instance.test_run_id, instance.is_out_of_range)
+        return instance
+
     def save(self, *args, **kwargs):
-        """Auto-flag abnormal runs when metrics are out of range"""
-        if self.value < self.expected_min or self.value > self.expected_max:
-            self.test_run.is_abnormal = True
-            self.test_run.save()
+        """
+        Keep the abnormal flag of the run, in the database and on the cached
+        run, in step with the metric. Costs a query only when the metric
+        enters or leaves its range or moves to another run.
+        """
+        adding = self._state.adding
+        # (run ID, out of range) as last stored, None if unknown
+        stored = None if adding else getattr(self, '_stored_range', None)
+        current = (self.test_run_id, self.is_out_of_range)
         super().save(*args, **kwargs)
+        self._stored_range = current
+        if current == stored or (adding and not self.is_out_of_range):
+            return
+
+        from devices.services.test_run import TestRunService
+        runs = TestRun.objects.using(self._state.db)
+        if stored is not None and stored[0] != self.test_run_id and stored[1]:
+            # The run the metric left may have no other metric out of range
+            TestRunService.evaluate_abnormal(runs.filter(pk=stored[0]))
+        if self.is_out_of_range:
+            runs.filter(pk=self.test_run_id, is_abnormal=False).update(is_abnormal=True)
+            if TestMetric.test_run.is_cached(self):
+                self.test_run.is_abnormal = True
+        elif stored is None or stored[1]:
+            # Back in range: the run stays abnormal only through its other metrics
+            TestRunService.evaluate_abnormal(runs.filter(pk=self.test_run_id))
+            if TestMetric.test_run.is_cached(self):
+                self.test_run.refresh_from_db(fields=['is_abnormal'])
 
 class DataSource(models.Model):
     class SourceType(models.TextChoices):
         FACTORY = 'factory', 'Factory Database'
         CLOUD = 'cloud', 'Cloud Central'
         LEGACY = 'legacy', 'Legacy System'
+
+    class SyncMode(models.TextChoices):
+        HIGH_WATER = 'high_water', 'New test runs above the high-water mark'
+        CHANGELOG = 'changelog', 'Changelog of the capture triggers'
     
     name = models.CharField(
         max_length=50,
@@ -275,7 +314,45 @@ class DataSource(models.Model):
         default=True,
         help_text="Enable/disable this data source"
     )
-    
+    db_alias = models.CharField(
+        max_length=50,
+        blank=True,
+        help_text="Database alias of this source, derived from the name when empty"
+    )
+    database_url = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Connection URL (e.g. postgres://user@host:5432/factory_b), empty if the alias is configured in settings"
+    )
+    last_synced_run_pk = models.BigIntegerField(
+        default=0,
+        help_text="High-water mark: highest factory test run ID copied to the central database"
+    )
+    last_synced_run_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Timestamp of the factory test run at the high-water mark"
+    )
+    last_change_seq = models.BigIntegerField(
+        default=0,
+        help_text="Highest factory changelog sequence number applied to the central database"
+    )
+    sync_mode = models.CharField(
+        max_length=20,
+        choices=SyncMode.choices,
+        default=SyncMode.HIGH_WATER,
+        help_text="How syncs read the factory; set to changelog by install_change_capture"
+    )
+    sync_interval = models.PositiveIntegerField(
+        default=300,
+        help_text="Seconds between syncs, adapted to the rate of new rows"
+    )
+    next_sync_due = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the scheduler syncs this source next (empty means now)"
+    )
+
     class Meta:
         indexes = [
             models.Index(fields=['source_type']),
@@ -296,7 +373,10 @@ class SyncLog(models.Model):
     source = models.ForeignKey(
         DataSource,
         on_delete=models.CASCADE,
-        related_name='sync_logs'
+        related_name='sync_logs',
+        null=True,
+        blank=True,
+        help_text="Synced data source, empty for the summary of a multi-source sync"
     )
     timestamp = models.DateTimeField(
         auto_now_add=True,
@@ -315,15 +395,116 @@ class SyncLog(models.Model):
         blank=True,
         help_text="Error details if sync failed"
     )
+    checkpoint_run_pk = models.BigIntegerField(
+        default=0,
+        help_text="Last factory test run ID committed by this sync"
+    )
+    duration = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Wall time of the sync in seconds"
+    )
+    stage_timings = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Wall time in seconds per sync stage"
+    )
+    rows_per_second = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Factory rows read per second"
+    )
+    bytes_read = models.BigIntegerField(
+        default=0,
+        help_text="Estimated size of the factory rows read"
+    )
+    peak_memory = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Peak resident memory sampled during the sync in bytes"
+    )
     
     class Meta:
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['source', 'timestamp']),
+            models.Index(fields=['timestamp', 'id']),  # Keyset pagination
             models.Index(fields=['status']),
         ]
         verbose_name = "Sync Log"
         verbose_name_plural = "Sync Logs"
     
     def __str__(self):
-        return f"{self.source.name} sync at {self.timestamp} ({self.get_status_display()})"
+        source_name = self.source.name if self.source else 'All sources'
+        return f"{source_name} sync at {self.timestamp} ({self.get_status_display()})"
+
+class FactoryUserMapping(models.Model):
+    source = models.ForeignKey(
+        DataSource,
+        on_delete=models.CASCADE,
+        related_name='user_mappings'
+    )
+    factory_user_id = models.BigIntegerField(
+        help_text="ID of the user in the factory database"
+    )
+    user = models.ForeignKey(
+        'auth.User',
+        on_delete=models.CASCADE,
+        related_name='factory_mappings',
+        help_text="Matching user in the central database"
+    )
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'factory_user_id'],
+                name='unique_factory_user_per_source'
+            )
+        ]
+        verbose_name = "Factory User Mapping"
+        verbose_name_plural = "Factory User Mappings"
+    
+    def __str__(self):
+        return f"{self.source.name} user {self.factory_user_id} -> {self.user.username}"
+
+class SyncLease(models.Model):
+    source = models.OneToOneField(
+        DataSource,
+        on_delete=models.CASCADE,
+        related_name='sync_lease'
+    )
+    owner = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="Token of the sync holding the lease, empty when released"
+    )
+    sync_log = models.ForeignKey(
+        SyncLog,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        null=True,
+        blank=True,
+        help_text="Sync log of the sync holding the lease"
+    )
+    acquired_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the current holder acquired the lease"
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Last heartbeat of the current holder"
+    )
+    expires_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="The lease is free once this time has passed"
+    )
+    
+    class Meta:
+        verbose_name = "Sync Lease"
+        verbose_name_plural = "Sync Leases"
+    
+    def __str__(self):
+        state = 'held' if self.owner and self.expires_at > timezone.now() else 'free'
+        return f"{self.source.name} sync lease ({state})"
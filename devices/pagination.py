@@ -0,0 +1,98 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on (timestamp, id), newest first.
+
+    The cursor holds the timestamp and ID of the last row of a page and the
+    next page is fetched with ``WHERE (timestamp, id) < (cursor)`` instead
+    of an OFFSET, so every page costs one index range scan of ``page_size``
+    rows however deep it is. Rows with equal timestamps are ordered by ID,
+    so none are skipped or repeated between pages.
+
+    The cursor only works for this one order, so ``?ordering=`` is rejected
+    with a 400 unless it asks for the same order.
+    """
+
+    ordering = ('-timestamp', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM)
+        if ordering and tuple(ordering.split(',')) not in (self.ordering, self.ordering[:1]):
+            raise ValidationError({
+                api_settings.ORDERING_PARAM: [f'Results are always ordered by {",".join(self.ordering)}.']
+            })
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+        position = self.decode_position(self.cursor.position) if self.cursor and self.cursor.position else None
+
+        if reverse:
+            # Walking back: the rows just after the cursor, oldest first
+            queryset = queryset.order_by('timestamp', 'id')
+            if position:
+                timestamp, pk = position
+                queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+        else:
+            queryset = queryset.order_by('-timestamp', '-id')
+            if position:
+                timestamp, pk = position
+                queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+
+        # One row more than a page tells whether there is another page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Walked back past the newest row: the first page follows
+            return self.encode_cursor(Cursor(offset=0, reverse=False, position=None))
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.encode_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.encode_position(self.page[0])))
+
+    def encode_cursor(self, cursor):
+        if cursor.position is None and not cursor.reverse:
+            # The first page has no cursor
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return super().encode_cursor(cursor)
+
+    @staticmethod
+    def encode_position(instance) -> str:
+        return f'{instance.timestamp.isoformat()}|{instance.pk}'
+
+    def decode_position(self, position: str):
+        try:
+            timestamp, pk = position.rsplit('|', 1)
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError(position)
+            return timestamp, int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
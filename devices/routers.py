@@ -1,4 +1,5 @@
-from django.db import models
+import threading
+from django.db import connections
 from django.core.exceptions import FieldDoesNotExist
 
 class DataSourceRouter:
@@ -6,88 +7,91 @@ class DataSourceRouter:
     A router to control all database operations on models in the devices application.
     """
     factory_models = ['bloodanalyzer', 'testrun', 'testmetric']  # Models that should exist in factory DBs
-    system_models = ['synclog', 'datasource']  # Models that should only exist in default DB
+    system_models = ['synclog', 'datasource', 'factoryusermapping', 'synclease']  # Models that should only exist in default DB
+
+    _lock = threading.Lock()
+    _source_aliases = {}  # data source ID -> database alias
     
     def db_for_read(self, model, **hints):
         """
         Attempts to read devices models go to the appropriate database.
         """
-        if model._meta.app_label == 'devices':
-            model_name = model._meta.model_name.lower()
-            
-            # System models should only be read from default database
-            if model_name in self.system_models:
-                return 'default'
-                
-            # Factory-specific models
-            if model_name in self.factory_models:
-                instance = hints.get('instance', None)
-                if instance:
-                    # Special handling for TestMetric
-                    if model_name == 'testmetric':
-                        if hasattr(instance, 'test_run') and instance.test_run:
-                            return self.db_for_read(instance.test_run.__class__, instance=instance.test_run)
-                        return 'default'
-                        
-                    # For other factory models, check data_source
-                    try:
-                        data_source_field = model._meta.get_field('data_source')
-                        if data_source_field:
-                            data_source_id = instance._state.fields_cache.get('data_source_id')
-                            if data_source_id:
-                                from devices.models import DataSource
-                                try:
-                                    data_source = DataSource.objects.using('default').get(id=data_source_id)
-                                    if data_source.name == 'Factory A':
-                                        return 'factory_a'
-                                    elif data_source.name == 'Factory C':
-                                        return 'factory_c'
-                                except DataSource.DoesNotExist:
-                                    pass
-                    except FieldDoesNotExist:
-                        pass
-        return 'default'
+        return self._db_for_model(model, hints.get('instance', None))
 
     def db_for_write(self, model, **hints):
         """
         Attempts to write devices models go to the appropriate database.
         """
+        return self._db_for_model(model, hints.get('instance', None))
+
+    @classmethod
+    def invalidate(cls, data_source_id=None):
+        """
+        Forget the cached alias of a data source, or of all data sources.
+        Called whenever a DataSource is saved or deleted.
+        """
+        with cls._lock:
+            if data_source_id is None:
+                cls._source_aliases.clear()
+            else:
+                cls._source_aliases.pop(data_source_id, None)
+
+    def _db_for_model(self, model, instance):
         if model._meta.app_label == 'devices':
             model_name = model._meta.model_name.lower()
-            
-            # System models should only be written to default database
+
+            # System models should only live in the default database
             if model_name in self.system_models:
                 return 'default'
-                
+
             # Factory-specific models
-            if model_name in self.factory_models:
-                instance = hints.get('instance', None)
-                if instance:
-                    # Special handling for TestMetric
-                    if model_name == 'testmetric':
-                        if hasattr(instance, 'test_run') and instance.test_run:
-                            return self.db_for_write(instance.test_run.__class__, instance=instance.test_run)
-                        return 'default'
-                        
-                    # For other factory models, check data_source
-                    try:
-                        data_source_field = model._meta.get_field('data_source')
-                        if data_source_field:
-                            data_source_id = instance._state.fields_cache.get('data_source_id')
-                            if data_source_id:
-                                from devices.models import DataSource
-                                try:
-                                    data_source = DataSource.objects.using('default').get(id=data_source_id)
-                                    if data_source.name == 'Factory A':
-                                        return 'factory_a'
-                                    elif data_source.name == 'Factory C':
-                                        return 'factory_c'
-                                except DataSource.DoesNotExist:
-                                    pass
-                    except FieldDoesNotExist:
-                        pass
+            if model_name in self.factory_models and instance is not None:
+                # Instances loaded from or saved to a database stay there
+                if instance._state.db:
+                    return instance._state.db
+
+                # Special handling for TestMetric
+                if model_name == 'testmetric':
+                    test_run = instance._state.fields_cache.get('test_run')
+                    if test_run is not None:
+                        return self._db_for_model(test_run.__class__, test_run)
+                    return 'default'
+
+                # For other factory models, check data_source
+                try:
+                    model._meta.get_field('data_source')
+                except FieldDoesNotExist:
+                    return 'default'
+                data_source_id = instance.__dict__.get('data_source_id')
+                if data_source_id:
+                    return self._alias_for_source(data_source_id)
         return 'default'
 
+    def _alias_for_source(self, data_source_id):
+        """
+        Return the database alias of a data source, looked up once per
+        process and then served from the cache.
+        """
+        alias = self._source_aliases.get(data_source_id)
+        if alias is not None:
+            return alias
+
+        from devices.models import DataSource
+        from devices.services.factory_registry import FactoryRegistry
+        alias = 'default'
+        try:
+            data_source = DataSource.objects.using('default').get(id=data_source_id)
+            if data_source.source_type == DataSource.SourceType.FACTORY:
+                factory_alias = FactoryRegistry.alias_for(data_source)
+                # Sources without a configured connection are kept centrally
+                if factory_alias in connections.settings:
+                    alias = factory_alias
+        except DataSource.DoesNotExist:
+            return alias
+        with self._lock:
+            self._source_aliases[data_source_id] = alias
+        return alias
+
     def allow_relation(self, obj1, obj2, **hints):
         """
         Allow relations if:
@@ -1,4 +1,6 @@
+from django.utils import timezone
 from rest_framework import serializers
+from .fieldsets import FieldsetSerializerMixin
 from .models import (
     BloodAnalyzer, DataSource, SyncLog,
     TestRun, TestMetric
@@ -14,11 +16,22 @@ class DataSourceSerializer(serializers.ModelSerializer):
     - source_type: Type of source (factory/cloud/legacy)
     - last_sync: Timestamp of last successful sync
     - is_active: Whether the source is currently active
+    - db_alias: Database alias of the source (derived from the name when empty)
+    - last_synced_run_pk: Highest factory test run ID already synced (high-water mark)
+    - last_synced_run_at: Timestamp of the run at the high-water mark
+    - sync_interval: Seconds between scheduled syncs, adapted to the new-row rate
+    - next_sync_due: When the scheduler syncs this source next
+    - sync_mode: How syncs read the factory (high_water/changelog)
     """
     class Meta:
         model = DataSource
-        fields = ['id', 'name', 'source_type', 'last_sync', 'is_active']
-        read_only_fields = ['last_sync']
+        fields = [
+            'id', 'name', 'source_type', 'last_sync', 'is_active', 'db_alias',
+            'last_synced_run_pk', 'last_synced_run_at', 'sync_interval', 'next_sync_due', 'sync_mode'
+        ]
+        read_only_fields = [
+            'last_sync', 'last_synced_run_pk', 'last_synced_run_at', 'sync_interval', 'next_sync_due', 'sync_mode'
+        ]
 
 class SyncLogSerializer(serializers.ModelSerializer):
     """
@@ -31,15 +44,29 @@ class SyncLogSerializer(serializers.ModelSerializer):
     - status: Sync status (success/failed/in_progress)
     - records_processed: Number of records processed
     - error_message: Details of any errors that occurred
+    - checkpoint_run_pk: Last factory test run ID committed by the sync
+    - duration: Wall time of the sync in seconds
+    - stage_timings: Wall time in seconds per stage (read_analyzers, resolve_users,
+      copy_runs, copy_metrics, commit)
+    - rows_per_second: Factory rows read per second
+    - bytes_read: Estimated size of the factory rows read
+    - peak_memory: Peak resident memory sampled during the sync in bytes (null where
+      it cannot be measured)
     """
     source = DataSourceSerializer(read_only=True)
     
     class Meta:
         model = SyncLog
-        fields = ['id', 'source', 'timestamp', 'status', 'records_processed', 'error_message']
-        read_only_fields = ['timestamp', 'status', 'records_processed', 'error_message']
+        fields = [
+            'id', 'source', 'timestamp', 'status', 'records_processed', 'error_message', 'checkpoint_run_pk',
+            'duration', 'stage_timings', 'rows_per_second', 'bytes_read', 'peak_memory'
+        ]
+        read_only_fields = [
+            'timestamp', 'status', 'records_processed', 'error_message', 'checkpoint_run_pk',
+            'duration', 'stage_timings', 'rows_per_second', 'bytes_read', 'peak_memory'
+        ]
 
-class BloodAnalyzerSerializer(serializers.ModelSerializer):
+class BloodAnalyzerSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for BloodAnalyzer model.
 
@@ -53,7 +80,15 @@ class BloodAnalyzerSerializer(serializers.ModelSerializer):
     - next_calibration_due: Next scheduled calibration date
     - assigned_technician: User responsible for the device
     - data_source: Source system where the device is registered
+
+    Relations are IDs; assigned_technician (username) and data_source can
+    be expanded.
     """
+    expandable_fields = {
+        'assigned_technician': lambda: serializers.StringRelatedField(),
+        'data_source': lambda: DataSourceSerializer(read_only=True),
+    }
+
     class Meta:
         model = BloodAnalyzer
         fields = [
@@ -74,6 +109,23 @@ class SyncRequestSerializer(serializers.Serializer):
     device_id = serializers.CharField()
     force = serializers.BooleanField(default=False)
 
+class TestRunExportSerializer(serializers.Serializer):
+    """
+    Serializer for the filters of a test run export.
+
+    Fields:
+    - device: Device ID of the analyzer (e.g., VA-205-0001)
+    - data_source: ID of the data source
+    - run_type: Type of run (qc/production/maintenance)
+    - since: Runs executed at or after this time
+    - until: Runs executed before this time
+    """
+    device = serializers.CharField(required=False)
+    data_source = serializers.IntegerField(required=False)
+    run_type = serializers.ChoiceField(choices=TestRun.RunType.choices, required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
 class SyncStatusSerializer(serializers.Serializer):
     """
     Serializer for sync status information.
@@ -115,9 +167,9 @@ class TestMetricSerializer(serializers.ModelSerializer):
         read_only_fields = ['is_out_of_range']
 
     def get_is_out_of_range(self, obj):
-        return obj.value < obj.expected_min or obj.value > obj.expected_max
+        return obj.is_out_of_range
 
-class TestRunSerializer(serializers.ModelSerializer):
+class TestRunSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for TestRun model.
 
@@ -133,12 +185,23 @@ class TestRunSerializer(serializers.ModelSerializer):
     - executed_by: User who performed the test
     - notes: Optional technician comments
     - metrics: Associated test metrics
+
+    All relations are embedded by default; in the flat representation
+    only the expanded ones are, the others are IDs.
     """
     device = BloodAnalyzerSerializer(read_only=True)
     data_source = DataSourceSerializer(read_only=True)
     executed_by = serializers.StringRelatedField()
     metrics = TestMetricSerializer(many=True, read_only=True)
-    
+
+    expandable_fields = {
+        'device': lambda: BloodAnalyzerSerializer(read_only=True),
+        'data_source': lambda: DataSourceSerializer(read_only=True),
+        'executed_by': lambda: serializers.StringRelatedField(),
+        'metrics': lambda: TestMetricSerializer(many=True, read_only=True),
+    }
+    default_expand = ('device', 'data_source', 'executed_by', 'metrics')
+
     class Meta:
         model = TestRun
         fields = [
@@ -146,4 +209,56 @@ class TestRunSerializer(serializers.ModelSerializer):
             'is_abnormal', 'is_factory_data', 'data_source',
             'executed_by', 'notes', 'metrics'
         ]
-        read_only_fields = ['timestamp', 'is_abnormal'] 
\ No newline at end of file
+        read_only_fields = ['timestamp', 'is_abnormal'] 
+
+class BulkTestMetricSerializer(serializers.Serializer):
+    """
+    Serializer for a metric of a bulk-ingested test run.
+
+    Fields:
+    - metric_type: Type of metric (hgb/wbc/plt/glc)
+    - value: Measured value
+    - expected_min: Minimum expected value
+    - expected_max: Maximum expected value
+    """
+    metric_type = serializers.ChoiceField(choices=TestMetric.MetricType.choices)
+    value = serializers.FloatField(min_value=0)
+    expected_min = serializers.FloatField()
+    expected_max = serializers.FloatField()
+
+    def validate(self, data):
+        if data['expected_max'] <= data['expected_min']:
+            raise serializers.ValidationError('expected_max must be greater than expected_min')
+        return data
+
+class BulkTestRunSerializer(serializers.Serializer):
+    """
+    Serializer for a test run of a bulk ingestion.
+
+    Validates each run on its own, without queries; devices, users and run
+    ID uniqueness are checked for the whole batch by TestRunIngestService.
+
+    Fields:
+    - run_id: Unique run identifier (e.g., TR-20240520-001)
+    - device: Device ID of the analyzer (e.g., VA-205-0001)
+    - run_type: Type of run (qc/production/maintenance)
+    - timestamp: When the test run was executed (defaults to now)
+    - executed_by: Username of the technician (defaults to the device's assigned technician)
+    - notes: Optional technician comments
+    - metrics: Measured metrics, at most one per metric type
+    """
+    MAX_RUNS = 10000  # Per request
+
+    run_id = serializers.CharField(max_length=50)
+    device = serializers.CharField(max_length=50)
+    run_type = serializers.ChoiceField(choices=TestRun.RunType.choices, default=TestRun.RunType.PRODUCTION)
+    timestamp = serializers.DateTimeField(default=timezone.now)
+    executed_by = serializers.CharField(max_length=150, required=False)
+    notes = serializers.CharField(allow_blank=True, default='')
+    metrics = BulkTestMetricSerializer(many=True, default=list)
+
+    def validate_metrics(self, metrics):
+        metric_types = [metric['metric_type'] for metric in metrics]
+        if len(set(metric_types)) != len(metric_types):
+            raise serializers.ValidationError('At most one metric per metric type')
+        return metrics
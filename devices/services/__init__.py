@@ -2,10 +2,16 @@ from .analyzer import AnalyzerService
 from .test_run import TestRunService
 from .test_metric import TestMetricService
 from .sync_log import SyncLogService
+from .user_map import UserIdentityMap
+from .change_capture import ChangeCaptureService
+from .reconciliation import ReconciliationService
 
 __all__ = [
     'AnalyzerService',
     'TestRunService',
     'TestMetricService',
     'SyncLogService',
+    'UserIdentityMap',
+    'ChangeCaptureService',
+    'ReconciliationService',
 ]
@@ -1,4 +1,5 @@
-from devices.models import BloodAnalyzer, TestRun
+from devices.models import BloodAnalyzer, TestRun, DataSource
+from devices.services.user_map import UserIdentityMap
 from django.utils import timezone
 
 class AnalyzerService:
@@ -10,4 +11,48 @@ class AnalyzerService:
         """
         # In a real implementation, this would fetch data from the source database
         # For now, we'll just return the latest runs
-        return list(TestRun.objects.filter(device=analyzer).order_by('-timestamp')[:10]) 
\ No newline at end of file
+        return list(TestRun.objects.filter(device=analyzer).order_by('-timestamp')[:10])
+
+    @staticmethod
+    def sync_analyzer(analyzer: BloodAnalyzer, source: DataSource, user_map: UserIdentityMap) -> BloodAnalyzer:
+        """
+        Copy a factory analyzer to the default database, or update its copy.
+        Returns the analyzer in the default database.
+        """
+        # Check if analyzer exists in default database
+        try:
+            default_analyzer = BloodAnalyzer.objects.using('default').get(device_id=analyzer.device_id)
+            
+            # Update existing analyzer
+            for field in ['device_type', 'status', 'location', 'manufacturing_date', 
+                        'last_calibration', 'next_calibration_due']:
+                setattr(default_analyzer, field, getattr(analyzer, field))
+            
+            # Handle assigned_technician
+            if analyzer.assigned_technician_id:
+                default_analyzer.assigned_technician_id = user_map.get(analyzer.assigned_technician_id)
+            
+            # Set data source to source (not default)
+            default_analyzer.data_source = source
+            
+            default_analyzer.save(using='default')
+            
+        except BloodAnalyzer.DoesNotExist:
+            # Handle assigned_technician
+            default_technician_id = user_map.get(analyzer.assigned_technician_id)
+            
+            # Create analyzer in default database
+            analyzer_data = {
+                'device_id': analyzer.device_id,
+                'device_type': analyzer.device_type,
+                'status': analyzer.status,
+                'location': analyzer.location,
+                'manufacturing_date': analyzer.manufacturing_date,
+                'last_calibration': analyzer.last_calibration,
+                'next_calibration_due': analyzer.next_calibration_due,
+                'assigned_technician_id': default_technician_id,
+                'data_source': source  # Use the source, not default
+            }
+            default_analyzer = BloodAnalyzer.objects.using('default').create(**analyzer_data)
+        
+        return default_analyzer
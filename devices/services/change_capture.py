@@ -0,0 +1,148 @@
+from django.db import connections, transaction
+
+class ChangeCaptureService:
+    """
+    Service for trigger-based change capture in factory databases.
+
+    Triggers on the captured tables append one ``devices_changelog`` row per
+    inserted, updated or deleted row: the table name, the row's primary key,
+    the operation (``I``, ``U`` or ``D``) and a monotonically increasing
+    ``seq``. ``SyncService.sync_changes`` consumes the changelog by ``seq``.
+
+    On PostgreSQL ``seq`` is assigned on insert, not on commit, so a
+    transaction holding a lower ``seq`` can become visible after a higher
+    one has been read. Reads therefore stop at a safe horizon: the highest
+    ``seq`` once every transaction that has written to the changelog has
+    finished. SQLite serializes writers, so its ``seq`` order is commit order.
+    """
+
+    CHANGELOG_TABLE = 'devices_changelog'
+    CAPTURED_TABLES = ['devices_bloodanalyzer', 'devices_testrun', 'devices_testmetric']
+    OPERATIONS = {'INSERT': 'I', 'UPDATE': 'U', 'DELETE': 'D'}
+
+    @staticmethod
+    def install(db_name: str):
+        """
+        Create the changelog table and capture triggers in a database.
+        Safe to run more than once.
+        """
+        connection = connections[db_name]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                statements = ChangeCaptureService._postgresql_install_sql()
+            elif connection.vendor == 'sqlite':
+                statements = ChangeCaptureService._sqlite_install_sql()
+            else:
+                raise Exception(f"Change capture is not supported on {connection.vendor}")
+            for statement in statements:
+                cursor.execute(statement)
+
+    @staticmethod
+    def uninstall(db_name: str):
+        """
+        Drop the capture triggers and the changelog table from a database.
+        """
+        connection = connections[db_name]
+        with connection.cursor() as cursor:
+            for table in ChangeCaptureService.CAPTURED_TABLES:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {table}_capture ON {table}")
+                else:
+                    for op in ChangeCaptureService.OPERATIONS:
+                        cursor.execute(f"DROP TRIGGER IF EXISTS {table}_capture_{op.lower()}")
+            if connection.vendor == 'postgresql':
+                cursor.execute("DROP FUNCTION IF EXISTS devices_capture_change()")
+            cursor.execute(f"DROP TABLE IF EXISTS {ChangeCaptureService.CHANGELOG_TABLE}")
+
+    @staticmethod
+    def read_changes(db_name: str, after_seq: int, limit: int) -> list:
+        """
+        Read up to ``limit`` changelog entries with ``seq > after_seq``, up
+        to the safe horizon. Returns a list of (seq, table_name, row_pk, op)
+        tuples in ``seq`` order.
+        """
+        connection = connections[db_name]
+        table = ChangeCaptureService.CHANGELOG_TABLE
+        with transaction.atomic(using=db_name), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # SHARE waits for the writers holding ROW EXCLUSIVE, so every seq
+                # up to the horizon is committed or rolled back. The lock is held
+                # only for this read.
+                cursor.execute(f"LOCK TABLE {table} IN SHARE MODE")
+            cursor.execute(
+                f"SELECT seq, table_name, row_pk, op FROM {table} "
+                "WHERE seq > %s ORDER BY seq LIMIT %s",
+                [after_seq, limit]
+            )
+            return cursor.fetchall()
+
+    @staticmethod
+    def prune(db_name: str, up_to_seq: int) -> int:
+        """
+        Delete the changelog entries with ``seq <= up_to_seq``, once they
+        are applied. Returns the number of entries deleted.
+        """
+        with connections[db_name].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {ChangeCaptureService.CHANGELOG_TABLE} WHERE seq <= %s", [up_to_seq])
+            return cursor.rowcount
+
+    @staticmethod
+    def _sqlite_install_sql() -> list:
+        statements = [f"""
+            CREATE TABLE IF NOT EXISTS {ChangeCaptureService.CHANGELOG_TABLE} (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name VARCHAR(64) NOT NULL,
+                row_pk BIGINT NOT NULL,
+                op CHAR(1) NOT NULL,
+                changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """]
+        # SQLite triggers cover a single operation each
+        for table in ChangeCaptureService.CAPTURED_TABLES:
+            for operation, op in ChangeCaptureService.OPERATIONS.items():
+                row = 'OLD' if operation == 'DELETE' else 'NEW'
+                statements.append(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_capture_{operation.lower()}
+                    AFTER {operation} ON {table}
+                    BEGIN
+                        INSERT INTO {ChangeCaptureService.CHANGELOG_TABLE} (table_name, row_pk, op)
+                        VALUES ('{table}', {row}.id, '{op}');
+                    END
+                """)
+        return statements
+
+    @staticmethod
+    def _postgresql_install_sql() -> list:
+        statements = [
+            f"""
+            CREATE TABLE IF NOT EXISTS {ChangeCaptureService.CHANGELOG_TABLE} (
+                seq BIGSERIAL PRIMARY KEY,
+                table_name VARCHAR(64) NOT NULL,
+                row_pk BIGINT NOT NULL,
+                op CHAR(1) NOT NULL,
+                changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+            )
+            """,
+            f"""
+            CREATE OR REPLACE FUNCTION devices_capture_change() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    INSERT INTO {ChangeCaptureService.CHANGELOG_TABLE} (table_name, row_pk, op)
+                    VALUES (TG_TABLE_NAME, OLD.id, 'D');
+                    RETURN OLD;
+                END IF;
+                INSERT INTO {ChangeCaptureService.CHANGELOG_TABLE} (table_name, row_pk, op)
+                VALUES (TG_TABLE_NAME, NEW.id, left(TG_OP, 1));
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+        ]
+        for table in ChangeCaptureService.CAPTURED_TABLES:
+            statements.append(f"DROP TRIGGER IF EXISTS {table}_capture ON {table}")
+            statements.append(f"""
+                CREATE TRIGGER {table}_capture
+                AFTER INSERT OR UPDATE OR DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION devices_capture_change()
+            """)
+        return statements
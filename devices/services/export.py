@@ -0,0 +1,106 @@
+import csv
+import json
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from devices.models import TestRun, TestMetric
+
+class TestRunExportService:
+    """
+    Streams test runs of the central database as CSV or NDJSON.
+
+    Runs are read oldest first from a chunked cursor, and the metrics of
+    each chunk are fetched with one query and pivoted into a column per
+    metric type, so memory stays bounded by ``chunk_size`` however many
+    runs are exported.
+    """
+
+    RUN_COLUMNS = {
+        'id': 'id',
+        'run_id': 'run_id',
+        'device_id': 'device__device_id',
+        'run_type': 'run_type',
+        'timestamp': 'timestamp',
+        'is_abnormal': 'is_abnormal',
+        'is_factory_data': 'is_factory_data',
+        'data_source_id': 'data_source_id',
+        'executed_by': 'executed_by__username',
+        'notes': 'notes',
+    }
+    METRIC_COLUMNS = [metric_type for metric_type, _ in TestMetric.MetricType.choices]
+    COLUMNS = list(RUN_COLUMNS) + METRIC_COLUMNS
+
+    @staticmethod
+    def get_queryset(device_id=None, data_source=None, run_type=None, since=None, until=None):
+        """
+        Test runs matching the export filters; ``since`` is inclusive and
+        ``until`` exclusive.
+        """
+        queryset = TestRun.objects.using('default')
+        if device_id:
+            queryset = queryset.filter(device__device_id=device_id)
+        if data_source is not None:
+            queryset = queryset.filter(data_source_id=data_source)
+        if run_type:
+            queryset = queryset.filter(run_type=run_type)
+        if since:
+            queryset = queryset.filter(timestamp__gte=since)
+        if until:
+            queryset = queryset.filter(timestamp__lt=until)
+        return queryset
+
+    @staticmethod
+    def rows(queryset, chunk_size: int = 1000):
+        """
+        Yield a dict per run with its metric values pivoted into columns
+        (None for metrics the run does not have).
+        """
+        columns = TestRunExportService.RUN_COLUMNS
+        runs = queryset.order_by('timestamp', 'id').values_list(*columns.values()).iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(runs, chunk_size))
+            if not chunk:
+                return
+
+            metrics = {}
+            for test_run_id, metric_type, value in TestMetric.objects.using(queryset.db).filter(
+                test_run_id__in=[run[0] for run in chunk]
+            ).values_list('test_run_id', 'metric_type', 'value'):
+                metrics.setdefault(test_run_id, {})[metric_type] = value
+
+            for run in chunk:
+                row = dict(zip(columns, run))
+                values = metrics.get(run[0], {})
+                for metric_type in TestRunExportService.METRIC_COLUMNS:
+                    row[metric_type] = values.get(metric_type)
+                yield row
+
+    @staticmethod
+    def to_csv(rows):
+        """Yield the CSV lines of ``rows``, header first."""
+        line = _Line()
+        writer = csv.DictWriter(line, fieldnames=TestRunExportService.COLUMNS)
+        writer.writeheader()
+        yield line.pop()
+        for row in rows:
+            row['timestamp'] = row['timestamp'].isoformat()
+            writer.writerow(row)
+            yield line.pop()
+
+    @staticmethod
+    def to_ndjson(rows):
+        """Yield a JSON object per row, one per line."""
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+class _Line:
+    """File-like buffer holding the last line written by a csv writer."""
+
+    def __init__(self):
+        self.value = ''
+
+    def write(self, value):
+        self.value += value
+
+    def pop(self):
+        value, self.value = self.value, ''
+        return value
@@ -0,0 +1,93 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from devices.models import BloodAnalyzer, TestRun, TestMetric
+from devices.services.test_run import TestRunService
+
+class IngestError(Exception):
+    """
+    Raised when a batch of test runs cannot be ingested. ``errors`` has an
+    entry per run of the batch, empty for the runs that were valid.
+    """
+
+    def __init__(self, errors):
+        super().__init__('Invalid test runs')
+        self.errors = errors
+
+class TestRunIngestService:
+    """
+    Bulk ingestion of test runs pushed by directly connected analyzers.
+
+    A batch is all or nothing: its devices, technicians and run IDs are
+    resolved with one query each, and if every run is valid the runs and
+    metrics are written with ``bulk_create`` and the abnormal runs flagged
+    set-wise, in one transaction.
+    """
+
+    BATCH_SIZE = 1000  # Rows per INSERT
+
+    @staticmethod
+    def ingest(runs: list) -> dict:
+        """
+        Ingest validated runs (dicts with run_id, device, run_type, timestamp,
+        notes, optional executed_by username and a list of metrics).
+
+        Runs are attributed to their device's data source and, without
+        executed_by, to the device's assigned technician.
+        Returns the counts of created runs and metrics.
+        Raises IngestError if any run refers to an unknown device or user or
+        reuses a run ID.
+        """
+        devices = BloodAnalyzer.objects.using('default').in_bulk(
+            {run['device'] for run in runs}, field_name='device_id'
+        )
+        users = User.objects.using('default').in_bulk(
+            {run['executed_by'] for run in runs if run.get('executed_by')}, field_name='username'
+        )
+        run_ids = [run['run_id'] for run in runs]
+        existing_run_ids = set(
+            TestRun.objects.using('default').filter(run_id__in=run_ids).values_list('run_id', flat=True)
+        )
+
+        errors = []
+        seen = set()
+        for run in runs:
+            run_errors = {}
+            if run['device'] not in devices:
+                run_errors['device'] = [f"Unknown device {run['device']}"]
+            if run.get('executed_by') and run['executed_by'] not in users:
+                run_errors['executed_by'] = [f"Unknown user {run['executed_by']}"]
+            if run['run_id'] in existing_run_ids or run['run_id'] in seen:
+                run_errors['run_id'] = [f"Test run {run['run_id']} already exists"]
+            seen.add(run['run_id'])
+            errors.append(run_errors)
+        if any(errors):
+            raise IngestError(errors)
+
+        new_runs = []
+        for run in runs:
+            device = devices[run['device']]
+            executed_by = users[run['executed_by']].id if run.get('executed_by') else device.assigned_technician_id
+            new_runs.append(TestRun(
+                run_id=run['run_id'],
+                device_id=device.id,
+                run_type=run['run_type'],
+                timestamp=run['timestamp'],
+                data_source_id=device.data_source_id,
+                executed_by_id=executed_by,
+                notes=run['notes']
+            ))
+
+        with transaction.atomic(using='default'):
+            TestRun.objects.using('default').bulk_create(new_runs, batch_size=TestRunIngestService.BATCH_SIZE)
+            new_metrics = [
+                TestMetric(test_run_id=test_run.id, **metric)
+                for test_run, run in zip(new_runs, runs)
+                for metric in run['metrics']
+            ]
+            TestMetric.objects.using('default').bulk_create(new_metrics, batch_size=TestRunIngestService.BATCH_SIZE)
+            # bulk_create skips TestMetric.save
+            TestRunService.evaluate_abnormal_ids(
+                [test_run.id for test_run in new_runs], batch_size=TestRunIngestService.BATCH_SIZE
+            )
+
+        return {'runs': len(new_runs), 'metrics': len(new_metrics)}
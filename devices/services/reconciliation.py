@@ -0,0 +1,195 @@
+import hashlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.db.models import BigIntegerField, CharField, Count, F, Sum, Value
+from django.db.models.functions import Cast, Concat, MD5, Round, StrIndex, Substr, TruncDate
+from devices.models import TestRun, TestMetric, DataSource
+from devices.services.test_run import TestRunService
+from devices.services.factory_registry import FactoryRegistry
+
+class ReconciliationService:
+    """
+    Service for detecting and repairing drift between a factory database and
+    the central (default) database.
+
+    Test runs are grouped into buckets of one device and one (UTC) day. Each
+    bucket's digest is computed by the database: the run and metric counts
+    and the sums of an MD5-based hash of every run ID and of every metric's
+    run ID, type, value and range. Sums do not depend on row order, so
+    comparing two databases reads one row per bucket. Rows are only read
+    for buckets whose digests differ, where a hash per run tells the runs
+    that drifted from the runs that only exist centrally. Only drifted
+    buckets are re-synced.
+    """
+
+    HASH_MODULUS = 2 ** 64
+    SQL_HASH_DIGITS = 10  # Hex digits of the SQL row hash; 40 bits, so bucket sums fit in a BIGINT
+    VALUE_SCALE = 10 ** 6  # Metric values are hashed as integers, which print alike on every backend
+
+    @staticmethod
+    def compute_digests(db_name: str, source: DataSource = None, since=None) -> dict:
+        """
+        Compute per-device, per-day digests of the test runs in a database
+        with two aggregate queries.
+
+        On the default database pass ``source`` to only digest the runs
+        copied from that source. ``since`` limits the digests to runs at or
+        after the given datetime.
+        Returns a dict of (device_id, day) -> tuple of aggregates.
+        """
+        runs = ReconciliationService._runs(db_name, source=source, since=since)
+        metrics = TestMetric.objects.using(db_name).filter(test_run__in=runs)
+        sql_hash = ReconciliationService._sql_hash
+
+        run_aggregates = runs.annotate(
+            day=TruncDate('timestamp', tzinfo=dt_timezone.utc)
+        ).values('device__device_id', 'day').annotate(
+            run_count=Count('id'),
+            run_hash=Sum(sql_hash(F('run_id')))
+        ).values_list('device__device_id', 'day', 'run_count', 'run_hash')
+
+        metric_aggregates = {
+            (device_id, day): (metric_count, metric_hash)
+            for device_id, day, metric_count, metric_hash in metrics.annotate(
+                day=TruncDate('test_run__timestamp', tzinfo=dt_timezone.utc)
+            ).values('test_run__device__device_id', 'day').annotate(
+                metric_count=Count('id'),
+                metric_hash=Sum(sql_hash(
+                    F('test_run__run_id'), F('metric_type'),
+                    *(ReconciliationService._scaled(field) for field in ('value', 'expected_min', 'expected_max'))
+                ))
+            ).values_list('test_run__device__device_id', 'day', 'metric_count', 'metric_hash')
+        }
+
+        return {
+            (device_id, day): (run_count, run_hash) + metric_aggregates.get((device_id, day), (0, None))
+            for device_id, day, run_count, run_hash in run_aggregates
+        }
+
+    @staticmethod
+    def compute_run_hashes(db_name: str, bucket: tuple, source: DataSource = None) -> dict:
+        """
+        Hash the runs of one bucket from their rows.
+        Returns a dict of run_id -> order-independent hash over the run ID
+        and the values of its metrics.
+        """
+        device_id, day = bucket
+        start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+        runs = ReconciliationService._runs(db_name, source=source, since=start).filter(
+            device__device_id=device_id,
+            timestamp__lt=start + timedelta(days=1)
+        )
+
+        hashes = {run_id: ReconciliationService._hash(run_id) for run_id in runs.values_list('run_id', flat=True)}
+        for run_id, metric_type, value, expected_min, expected_max in TestMetric.objects.using(db_name).filter(
+            test_run__in=runs
+        ).values_list('test_run__run_id', 'metric_type', 'value', 'expected_min', 'expected_max'):
+            hashes[run_id] = (hashes[run_id] + ReconciliationService._hash(
+                run_id, metric_type, value, expected_min, expected_max
+            )) % ReconciliationService.HASH_MODULUS
+        return hashes
+
+    @staticmethod
+    def compare(db_name: str, source: DataSource, since=None) -> dict:
+        """
+        Compare the digests of a factory database with those of its copies.
+        Returns a dict with the number of buckets checked and the sorted
+        lists of ``mismatched`` buckets (factory runs missing or different
+        centrally), ``missing`` buckets (only in the factory), ``extra``
+        buckets (only in the central database) and ``central_only``
+        buckets (shared, but with runs only in the central database).
+        """
+        factory_digests = ReconciliationService.compute_digests(db_name, since=since)
+        central_digests = ReconciliationService.compute_digests('default', source=source, since=since)
+
+        mismatched = []
+        central_only = []
+        for bucket in factory_digests.keys() & central_digests.keys():
+            if factory_digests[bucket] == central_digests[bucket]:
+                continue
+            factory_hashes = ReconciliationService.compute_run_hashes(db_name, bucket)
+            central_hashes = ReconciliationService.compute_run_hashes('default', bucket, source=source)
+            if any(central_hashes.get(run_id) != run_hash for run_id, run_hash in factory_hashes.items()):
+                mismatched.append(bucket)
+            if central_hashes.keys() - factory_hashes.keys():
+                central_only.append(bucket)
+
+        return {
+            'buckets_checked': len(factory_digests.keys() | central_digests.keys()),
+            'mismatched': sorted(mismatched),
+            'missing': sorted(factory_digests.keys() - central_digests.keys()),
+            'extra': sorted(central_digests.keys() - factory_digests.keys()),
+            'central_only': sorted(central_only),
+        }
+
+    @staticmethod
+    def reconcile(source_name: str, since=None, repair: bool = True, chunk_size: int = 1000) -> dict:
+        """
+        Find drifted buckets of a source and, if ``repair`` is set, re-sync them.
+
+        Mismatched and missing buckets are re-synced from the factory with
+        ``TestRunService.bulk_sync_runs(update_existing=True)``. Runs that
+        only exist centrally (``extra`` and ``central_only`` buckets) cannot
+        be repaired by a re-sync; they are reported but left untouched.
+        Returns the comparison from ``compare`` plus the number of
+        ``runs_created`` and ``metrics_synced`` by the repair.
+        """
+        source = DataSource.objects.using('default').get(name=source_name)
+        db_name = FactoryRegistry.alias_for(source)
+
+        report = ReconciliationService.compare(db_name, source, since=since)
+        report['runs_created'] = 0
+        report['metrics_synced'] = 0
+        print(f"Checked {report['buckets_checked']} buckets of {source_name}: "
+              f"{len(report['mismatched'])} mismatched, {len(report['missing'])} missing, "
+              f"{len(report['extra'])} extra, {len(report['central_only'])} with central-only runs")
+
+        if repair:
+            for device_id, day in report['mismatched'] + report['missing']:
+                start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+                runs = TestRun.objects.using(db_name).filter(
+                    device__device_id=device_id,
+                    timestamp__gte=start,
+                    timestamp__lt=start + timedelta(days=1)
+                )
+                new_runs_count, metrics_count = TestRunService.bulk_sync_runs(
+                    db_name, source, runs, chunk_size=chunk_size, update_existing=True
+                )
+                report['runs_created'] += new_runs_count
+                report['metrics_synced'] += metrics_count
+                print(f"Repaired bucket {device_id} {day}: {new_runs_count} runs created, {metrics_count} metrics synced")
+
+        return report
+
+    @staticmethod
+    def _runs(db_name: str, source: DataSource = None, since=None):
+        runs = TestRun.objects.using(db_name).all()
+        if source is not None:
+            runs = runs.filter(data_source=source)
+        if since is not None:
+            runs = runs.filter(timestamp__gte=since)
+        return runs
+
+    @staticmethod
+    def _sql_hash(*expressions):
+        """
+        SQL expression of a row hash: the first hex digits of the MD5 of the
+        expressions joined with ``|``, converted to an integer digit by digit
+        so it runs on every backend.
+        """
+        parts = [Value('|')] * (2 * len(expressions) - 1)
+        parts[::2] = expressions
+        digest = MD5(Concat(*parts, output_field=CharField()) if len(parts) > 1 else parts[0])
+        value = Value(0, output_field=BigIntegerField())
+        for position in range(1, ReconciliationService.SQL_HASH_DIGITS + 1):
+            digit = StrIndex(Value('0123456789abcdef'), Substr(digest, position, 1)) - 1
+            value = value * 16 + digit
+        return value
+
+    @staticmethod
+    def _scaled(field: str):
+        return Cast(Round(F(field) * ReconciliationService.VALUE_SCALE), BigIntegerField())
+
+    @staticmethod
+    def _hash(*values) -> int:
+        row = '|'.join(repr(value) for value in values)
+        return int.from_bytes(hashlib.blake2b(row.encode(), digest_size=8).digest(), 'big')
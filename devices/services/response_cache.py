@@ -0,0 +1,46 @@
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+class ResponseCacheService:
+    """
+    Generations of cached API responses.
+
+    Responses are cached under a version that includes the generation of
+    their scope: ``devices`` for the device list and ``source:<id>`` for
+    the sync status and history of a data source. Invalidating a scope
+    starts a new generation, so every response cached under the old one is
+    never read again and expires with ``API_CACHE_TIMEOUT``.
+    """
+
+    DEFAULT_TIMEOUT = 60  # Seconds, bounds staleness from expired leases
+
+    @staticmethod
+    def timeout() -> int:
+        return getattr(settings, 'API_CACHE_TIMEOUT', ResponseCacheService.DEFAULT_TIMEOUT)
+
+    @staticmethod
+    def source_scope(source_id) -> str:
+        return f'source:{source_id}'
+
+    @staticmethod
+    def generation(scope: str) -> str:
+        """Return the current generation of a scope, starting one if there is none."""
+        key = f'api:generation:{scope}'
+        generation = cache.get(key)
+        if generation is None:
+            # add() keeps the generation another process may have started first
+            cache.add(key, uuid.uuid4().hex, None)
+            generation = cache.get(key) or uuid.uuid4().hex
+        return generation
+
+    @staticmethod
+    def invalidate(*scopes: str):
+        """
+        Start new generations of scopes once the current transaction of the
+        default database commits, so no response is cached from data that
+        was about to change.
+        """
+        keys = [f'api:generation:{scope}' for scope in scopes]
+        transaction.on_commit(lambda: cache.delete_many(keys), using='default')
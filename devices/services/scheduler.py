@@ -0,0 +1,84 @@
+from datetime import timedelta
+from django.db.models import Q
+from django.utils import timezone
+from devices.models import DataSource, SyncLog
+
+class SyncScheduleService:
+    """
+    Adaptive sync schedule for data sources.
+
+    Every active DataSource has a ``next_sync_due`` time and a
+    ``sync_interval``. A short, frequent beat tick claims the sources that
+    are due and dispatches one sync each, so no worker waits between syncs.
+    After each sync the interval is adapted to the observed rate of new
+    rows: idle sources back off, busy ones are synced more often, aiming for
+    about ``TARGET_ROWS_PER_SYNC`` new rows per sync.
+    """
+
+    MIN_INTERVAL = 60  # seconds
+    MAX_INTERVAL = 3600
+    TARGET_ROWS_PER_SYNC = 5000
+    BACKOFF_FACTOR = 2
+
+    @staticmethod
+    def due_sources(now=None):
+        """
+        Return the active data sources whose next sync is due.
+        """
+        now = now or timezone.now()
+        return DataSource.objects.filter(is_active=True).filter(
+            Q(next_sync_due__isnull=True) | Q(next_sync_due__lte=now)
+        ).order_by('next_sync_due')
+
+    @staticmethod
+    def claim_due_sources(now=None) -> list:
+        """
+        Claim every due source by moving its next sync one interval ahead,
+        so overlapping ticks do not dispatch it twice.
+        Returns the IDs of the claimed sources.
+        """
+        now = now or timezone.now()
+        claimed = []
+        for source_id, next_sync_due, interval in SyncScheduleService.due_sources(now).values_list(
+            'id', 'next_sync_due', 'sync_interval'
+        ):
+            # Only the tick that still sees the old due time wins the claim
+            if DataSource.objects.filter(id=source_id, next_sync_due=next_sync_due).update(
+                next_sync_due=now + timedelta(seconds=interval)
+            ):
+                claimed.append(source_id)
+        return claimed
+
+    @staticmethod
+    def reschedule(source: DataSource, sync_log: SyncLog, previous_sync=None, now=None) -> DataSource:
+        """
+        Adapt a source's interval to the outcome of a sync and schedule its next one.
+
+        ``previous_sync`` is the source's ``last_sync`` before this sync ran;
+        the new-row rate is ``records_processed`` over the time since then.
+        Failed syncs keep the interval. Syncs that were coalesced into a
+        running one (still ``in_progress``) leave the schedule alone.
+        """
+        if sync_log is None or sync_log.status == 'in_progress':
+            return source
+        now = now or timezone.now()
+        interval = source.sync_interval
+
+        if sync_log.status != SyncLog.SyncStatus.FAILED:
+            if sync_log.records_processed == 0:
+                interval *= SyncScheduleService.BACKOFF_FACTOR
+            elif previous_sync is not None:
+                elapsed = max((now - previous_sync).total_seconds(), 1)
+                rate = sync_log.records_processed / elapsed
+                target = SyncScheduleService.TARGET_ROWS_PER_SYNC / rate
+                # Move halfway towards the target to smooth out bursts
+                interval = (interval + target) / 2
+            else:
+                interval = SyncScheduleService.MIN_INTERVAL
+
+        source.sync_interval = int(min(max(interval, SyncScheduleService.MIN_INTERVAL),
+                                       SyncScheduleService.MAX_INTERVAL))
+        source.next_sync_due = now + timedelta(seconds=source.sync_interval)
+        source.save(using='default', update_fields=['sync_interval', 'next_sync_due'])
+        print(f"Next sync of {source.name} in {source.sync_interval}s")
+        return source
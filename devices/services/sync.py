@@ -1,32 +1,63 @@
-import time
-from datetime import timedelta
 from django.utils import timezone
 from django.db import transaction
-from django.contrib.auth.models import User
 from ..models import (
     BloodAnalyzer, SyncLog, DataSource,
     TestRun, TestMetric
 )
-import random
 from devices.services.analyzer import AnalyzerService
 from devices.services.test_run import TestRunService
-from devices.services.test_metric import TestMetricService
-from devices.services.sync_log import SyncLogService
-from celery import shared_task
+from devices.services.user_map import UserIdentityMap
+from devices.services.change_capture import ChangeCaptureService
+from devices.services.sync_lease import SyncLeaseService
+from devices.services.sync_timer import SyncTimer
+from devices.services.factory_registry import FactoryRegistry
+from celery import shared_task, chord
 
 class SyncService:
     """Service for handling device synchronization."""
     
     @staticmethod
-    def sync_source(source_name: str):
+    def sync_source(source_name: str, full: bool = False, bulk: bool = True, chunk_size: int = 1000,
+                    force: bool = False):
         """
         Sync data from a source database to the default database.
+
+        Only factory test runs above the source's high-water mark
+        (``DataSource.last_synced_run_pk``) are read. The mark is advanced to
+        the highest run ID seen at the start of the sync once every analyzer
+        has synced cleanly, so runs inserted while the sync is running are
+        picked up next time. Pass ``full=True`` to ignore the mark and rescan
+        the whole history. Runs that could not be copied hold the mark below
+        the first of them, so they are read again by the next sync, and make
+        the sync ``partial``; so do failed analyzers.
+
+        Runs and metrics are copied in chunks with
+        ``TestRunService.bulk_sync_runs``; ``bulk=False`` falls back to the
+        row-by-row ``TestRunService.sync_analyzer_runs`` path. Factory rows
+        are streamed ``chunk_size`` at a time rather than loaded up front.
+
+        On the bulk path every committed chunk also commits a checkpoint: the
+        SyncLog's ``checkpoint_run_pk`` and, for incremental syncs that have
+        not skipped a run yet, the source's high-water mark. If the sync then fails it is logged as
+        ``partial`` and the next sync resumes after the last committed chunk
+        instead of starting over.
+
+        Only one sync per source runs at a time: the sync holds the source's
+        SyncLease and renews it as it makes progress. If another sync holds
+        the lease this call coalesces into it and returns its (in progress)
+        SyncLog, unless ``force=True`` takes the lease over.
+
+        Wall time per stage, rows read per second, bytes read and peak
+        memory are recorded on the SyncLog.
+
+        Sources in ``DataSource.SyncMode.CHANGELOG`` mode are synced with
+        ``sync_changes`` instead, unless ``full=True``.
+
+        Returns the SyncLog of this sync, or None if it could not be created.
         """
+        token = None
+        timer = SyncTimer()
         try:
-            # Map source name to database name
-            db_name = source_name.lower().replace(' ', '_')
-            print(f"Starting sync from {db_name} to default database")
-            
             # Get the source object for this sync
             try:
                 source = DataSource.objects.using('default').get(name=source_name)
@@ -38,148 +69,323 @@ class SyncService:
                     is_active=True
                 )
             
+            if source.sync_mode == DataSource.SyncMode.CHANGELOG and not full:
+                return SyncService.sync_changes(source_name, batch_size=chunk_size, force=force)
+
+            # Map source to database alias
+            db_name = FactoryRegistry.alias_for(source)
+            print(f"Starting sync from {db_name} to default database")
+            
+            token = SyncLeaseService.acquire(source, force=force)
+            if token is None:
+                lease = SyncLeaseService.current(source)
+                print(f"{source_name} is already being synced, coalescing into the running sync")
+                return lease.sync_log if lease else None
+            
             # Create sync log
             sync_log = SyncLog.objects.using('default').create(
                 source=source,
                 status='in_progress',
                 records_processed=0
             )
+            SyncLeaseService.attach(source, token, sync_log)
             
             records_processed = 0
+            failed_analyzers = 0
+            skipped_runs = []  # factory IDs of runs that were not copied
             
             try:
+                # Snapshot the upper bound of this sync so the high-water mark
+                # never moves past runs that were inserted after we started reading
+                low_water = 0 if full else source.last_synced_run_pk
+                high_water_run = TestRun.objects.using(db_name).order_by('-id').values('id', 'timestamp').first()
+                high_water = high_water_run['id'] if high_water_run else 0
+                print(f"Syncing runs {low_water} < id <= {high_water} from {db_name}")
+                
                 # Get all analyzers from the source database
                 analyzers = BloodAnalyzer.objects.using(db_name).all()
-                print(f"Found {analyzers.count()} analyzers in {db_name}")
                 
-                # Sync each analyzer
-                for analyzer in analyzers:
+                # Resolve every technician referenced by this source in one pass
+                user_map = UserIdentityMap(db_name, source)
+                with timer.stage('resolve_users'):
+                    user_map.resolve(analyzers.values_list('assigned_technician_id', flat=True).distinct())
+                
+                # Sync each analyzer, streaming them instead of caching the queryset
+                analyzer_count = 0
+                for analyzer in analyzers.iterator(chunk_size=chunk_size):
+                    analyzer_count += 1
+                    SyncLeaseService.heartbeat(source, token)
                     try:
-                        # Check if analyzer exists in default database
-                        try:
-                            default_analyzer = BloodAnalyzer.objects.using('default').get(device_id=analyzer.device_id)
-                            print(f"Analyzer {analyzer.device_id} already exists in default database, updating...")
-                            
-                            # Update existing analyzer
-                            for field in ['device_type', 'status', 'location', 'manufacturing_date', 
-                                        'last_calibration', 'next_calibration_due']:
-                                setattr(default_analyzer, field, getattr(analyzer, field))
-                            
-                            # Handle assigned_technician
-                            if analyzer.assigned_technician_id:
-                                try:
-                                    # Get the technician from source database
-                                    source_technician = User.objects.using(db_name).get(id=analyzer.assigned_technician_id)
-                                    
-                                    # Try to get the technician from default database
-                                    try:
-                                        default_technician = User.objects.using('default').get(username=source_technician.username)
-                                    except User.DoesNotExist:
-                                        print(f"Creating technician {source_technician.username} in default database")
-                                        # Create the technician in default database
-                                        default_technician = User.objects.using('default').create(
-                                            username=source_technician.username,
-                                            email=source_technician.email,
-                                            first_name=source_technician.first_name,
-                                            last_name=source_technician.last_name,
-                                            is_staff=source_technician.is_staff,
-                                            is_active=source_technician.is_active
-                                        )
-                                    
-                                    default_analyzer.assigned_technician = default_technician
-                                except User.DoesNotExist:
-                                    print(f"Warning: Technician with ID {analyzer.assigned_technician_id} not found in {db_name}")
-                                    default_analyzer.assigned_technician = None
-                            
-                            # Set data source to source (not default)
-                            default_analyzer.data_source = source
-                            
-                            default_analyzer.save(using='default')
-                            
-                        except BloodAnalyzer.DoesNotExist:
-                            print(f"Creating analyzer {analyzer.device_id} in default database")
-                            
-                            # Handle assigned_technician
-                            default_technician = None
-                            if analyzer.assigned_technician_id:
-                                try:
-                                    # Get the technician from source database
-                                    source_technician = User.objects.using(db_name).get(id=analyzer.assigned_technician_id)
-                                    
-                                    # Try to get the technician from default database
-                                    try:
-                                        default_technician = User.objects.using('default').get(username=source_technician.username)
-                                    except User.DoesNotExist:
-                                        print(f"Creating technician {source_technician.username} in default database")
-                                        # Create the technician in default database
-                                        default_technician = User.objects.using('default').create(
-                                            username=source_technician.username,
-                                            email=source_technician.email,
-                                            first_name=source_technician.first_name,
-                                            last_name=source_technician.last_name,
-                                            is_staff=source_technician.is_staff,
-                                            is_active=source_technician.is_active
-                                        )
-                                except User.DoesNotExist:
-                                    print(f"Warning: Technician with ID {analyzer.assigned_technician_id} not found in {db_name}")
-                            
-                            # Create analyzer in default database
-                            analyzer_data = {
-                                'device_id': analyzer.device_id,
-                                'device_type': analyzer.device_type,
-                                'status': analyzer.status,
-                                'location': analyzer.location,
-                                'manufacturing_date': analyzer.manufacturing_date,
-                                'last_calibration': analyzer.last_calibration,
-                                'next_calibration_due': analyzer.next_calibration_due,
-                                'assigned_technician': default_technician,
-                                'data_source': source  # Use the source, not default
-                            }
-                            default_analyzer = BloodAnalyzer.objects.using('default').create(**analyzer_data)
+                        with timer.stage('read_analyzers'):
+                            AnalyzerService.sync_analyzer(analyzer, source, user_map)
                         
-                        # Sync runs for this analyzer
-                        runs = TestRun.objects.using(db_name).filter(device=analyzer)
-                        print(f"Found {runs.count()} runs for analyzer {analyzer.device_id}")
+                        if bulk:
+                            continue
+                        
+                        # Sync runs for this analyzer that are past the high-water mark
+                        runs = TestRun.objects.using(db_name).filter(
+                            device=analyzer,
+                            id__gt=low_water,
+                            id__lte=high_water
+                        )
                         
                         # Sync runs and get count of new metrics
-                        new_runs_count, new_metrics_count = TestRunService.sync_analyzer_runs(analyzer, runs)
+                        with timer.stage('copy_runs'):
+                            new_runs_count, new_metrics_count = TestRunService.sync_analyzer_runs(
+                                analyzer, runs, user_map, chunk_size=chunk_size, skipped=skipped_runs
+                            )
                         records_processed += new_metrics_count  # Only count new metrics
                         
                     except Exception as e:
                         print(f"Error syncing analyzer {analyzer.device_id}: {str(e)}")
+                        failed_analyzers += 1
                         continue
                 
-                # Update sync log with success
-                sync_log.status = 'success'
+                print(f"Synced {analyzer_count} analyzers from {db_name}")
+                
+                if bulk:
+                    # Runs of failed analyzers are skipped, so the high-water mark
+                    # may only follow the checkpoints when every analyzer synced
+                    advance_high_water = failed_analyzers == 0 and not full
+                    synced_before = records_processed
+                    
+                    def checkpoint(last_run, new_runs_count, new_metrics_count):
+                        SyncLeaseService.heartbeat(source, token)
+                        sync_log.checkpoint_run_pk = last_run.id
+                        sync_log.records_processed = synced_before + new_metrics_count
+                        sync_log.save(using='default', update_fields=['checkpoint_run_pk', 'records_processed'])
+                        # A skipped run must be read again, so stop at the chunk before it
+                        if advance_high_water and not skipped_runs and last_run.id > source.last_synced_run_pk:
+                            source.last_synced_run_pk = last_run.id
+                            source.last_synced_run_at = last_run.timestamp
+                            source.save(using='default', update_fields=['last_synced_run_pk', 'last_synced_run_at'])
+                    
+                    # Copy all new runs of this source in one chunked pass
+                    runs = TestRun.objects.using(db_name).filter(id__gt=low_water, id__lte=high_water)
+                    new_runs_count, new_metrics_count = TestRunService.bulk_sync_runs(
+                        db_name, source, runs, chunk_size=chunk_size, user_map=user_map,
+                        checkpoint=checkpoint, timer=timer, skipped=skipped_runs
+                    )
+                    records_processed += new_metrics_count  # Only count new metrics
+                    print(f"Bulk sync created {new_runs_count} runs and {new_metrics_count} metrics")
+                
+                # Only advance the high-water mark when every analyzer synced,
+                # and never past a skipped run, otherwise the runs that were
+                # left behind would never be read again
+                mark_run = high_water_run
+                if skipped_runs:
+                    mark_run = TestRun.objects.using(db_name).filter(
+                        id__lt=min(skipped_runs)
+                    ).order_by('-id').values('id', 'timestamp').first()
+                if failed_analyzers == 0 and mark_run and mark_run['id'] > source.last_synced_run_pk:
+                    source.last_synced_run_pk = mark_run['id']
+                    source.last_synced_run_at = mark_run['timestamp']
+                
+                # Update sync log with the result
+                errors = []
+                if failed_analyzers:
+                    errors.append(f"{failed_analyzers} analyzers failed")
+                if skipped_runs:
+                    errors.append(f"{len(skipped_runs)} runs skipped")
+                if errors:
+                    sync_log.status = SyncLog.SyncStatus.PARTIAL
+                    sync_log.error_message = (
+                        f"{', '.join(errors)}, keeping high-water mark at run ID {source.last_synced_run_pk}"
+                    )
+                    print(sync_log.error_message)
+                else:
+                    sync_log.status = 'success'
                 sync_log.records_processed = records_processed
+                timer.record(sync_log)
                 sync_log.save(using='default')
                 
                 # Update last_sync in DataSource
                 source.last_sync = timezone.now()
-                source.save(using='default')
+                source.save(using='default', update_fields=['last_sync', 'last_synced_run_pk', 'last_synced_run_at'])
                 
-                print(f"Sync completed successfully. Processed {records_processed} records.")
-                return True
+                print(f"Sync completed with status {sync_log.status}. Processed {records_processed} records.")
+                return sync_log
                 
             except Exception as e:
                 print(f"Error during sync: {str(e)}")
-                # Update sync log with error
-                sync_log.status = 'failed'
-                sync_log.records_processed = records_processed
+                # Update sync log with error. If some chunks were committed the
+                # sync was interrupted rather than failed, and the next one resumes
+                if sync_log.checkpoint_run_pk:
+                    sync_log.status = SyncLog.SyncStatus.PARTIAL
+                    print(f"Sync interrupted after run ID {sync_log.checkpoint_run_pk}")
+                else:
+                    sync_log.status = SyncLog.SyncStatus.FAILED
+                    sync_log.records_processed = records_processed
                 sync_log.error_message = str(e)
+                timer.record(sync_log)
                 sync_log.save(using='default')
-                return False
+                return sync_log
+            finally:
+                SyncLeaseService.release(source, token)
+                FactoryRegistry.release(db_name)
                 
         except Exception as e:
             print(f"Error creating sync log: {str(e)}")
-            return False
+            if token:
+                SyncLeaseService.release(source, token)
+            return None
+
+    @staticmethod
+    def sync_changes(source_name: str, batch_size: int = 1000, force: bool = False):
+        """
+        Sync a source by consuming its changelog instead of scanning its tables.
+
+        Requires the capture triggers installed by ``install_change_capture``.
+        Changelog entries after ``DataSource.last_change_seq`` are read
+        ``batch_size`` at a time: changed analyzers are copied or updated,
+        and changed runs, plus the runs of changed metrics, are upserted with
+        ``TestRunService.bulk_sync_runs(update_existing=True)``, so metric
+        value updates and analyzer edits reach the central database too.
+        Deletes are not propagated; the central database keeps the rows.
+        The sequence number is advanced after each applied batch, and the
+        applied entries are then deleted from the changelog. Holds the
+        source's SyncLease like ``sync_source``.
+
+        Returns the SyncLog of this sync, or None if it could not be created.
+        """
+        token = None
+        try:
+            source, _ = DataSource.objects.using('default').get_or_create(
+                name=source_name,
+                defaults={'source_type': 'factory', 'is_active': True}
+            )
+            # Map source to database alias
+            db_name = FactoryRegistry.alias_for(source)
+            print(f"Starting changelog sync from {db_name} to default database")
+            token = SyncLeaseService.acquire(source, force=force)
+            if token is None:
+                lease = SyncLeaseService.current(source)
+                print(f"{source_name} is already being synced, coalescing into the running sync")
+                return lease.sync_log if lease else None
+            sync_log = SyncLog.objects.using('default').create(
+                source=source,
+                status='in_progress',
+                records_processed=0
+            )
+            SyncLeaseService.attach(source, token, sync_log)
+        except Exception as e:
+            print(f"Error creating sync log: {str(e)}")
+            if token:
+                SyncLeaseService.release(source, token)
+            return None
+
+        records_processed = 0
+        timer = SyncTimer()
+        try:
+            user_map = UserIdentityMap(db_name, source)
+            while True:
+                changes = ChangeCaptureService.read_changes(db_name, source.last_change_seq, batch_size)
+                if not changes:
+                    break
+                SyncLeaseService.heartbeat(source, token)
+
+                changed = {table: set() for table in ChangeCaptureService.CAPTURED_TABLES}
+                for seq, table_name, row_pk, op in changes:
+                    if op != 'D' and table_name in changed:
+                        changed[table_name].add(row_pk)
+
+                run_ids = changed['devices_testrun'] | set(
+                    TestMetric.objects.using(db_name).filter(
+                        id__in=changed['devices_testmetric']
+                    ).values_list('test_run_id', flat=True)
+                )
+                runs = TestRun.objects.using(db_name).filter(id__in=run_ids)
+
+                # bulk_sync_runs skips runs of analyzers missing centrally, so
+                # also copy the unchanged analyzers the changed runs refer to
+                referenced = dict(
+                    BloodAnalyzer.objects.using(db_name).filter(
+                        id__in=runs.values('device_id')
+                    ).values_list('device_id', 'id')
+                )
+                synced = BloodAnalyzer.objects.using('default').filter(
+                    device_id__in=list(referenced)
+                ).values_list('device_id', flat=True)
+                missing_ids = {referenced[device_id] for device_id in set(referenced) - set(synced)}
+                analyzers = BloodAnalyzer.objects.using(db_name).filter(
+                    id__in=changed['devices_bloodanalyzer'] | missing_ids
+                )
+                with timer.stage('resolve_users'):
+                    user_map.resolve(analyzers.values_list('assigned_technician_id', flat=True))
+                with timer.stage('read_analyzers'):
+                    for analyzer in analyzers:
+                        AnalyzerService.sync_analyzer(analyzer, source, user_map)
+
+                new_runs_count, metrics_count = TestRunService.bulk_sync_runs(
+                    db_name, source, runs, chunk_size=batch_size, user_map=user_map,
+                    update_existing=True, timer=timer
+                )
+                records_processed += len(changes)
+
+                source.last_change_seq = changes[-1][0]
+                source.save(using='default', update_fields=['last_change_seq'])
+                # Once the new sequence number is committed the batch is never read again
+                transaction.on_commit(
+                    lambda seq=source.last_change_seq: ChangeCaptureService.prune(db_name, seq), using='default'
+                )
+                sync_log.records_processed = records_processed
+                sync_log.save(using='default', update_fields=['records_processed'])
+                print(f"Applied changes up to seq {source.last_change_seq}: "
+                      f"{len(analyzers)} analyzers, {len(run_ids)} runs, {metrics_count} metrics")
+
+            sync_log.status = 'success'
+            timer.record(sync_log)
+            sync_log.save(using='default')
+            source.last_sync = timezone.now()
+            source.save(using='default', update_fields=['last_sync'])
+            print(f"Changelog sync completed successfully. Processed {records_processed} changes.")
+        except Exception as e:
+            print(f"Error during changelog sync: {str(e)}")
+            sync_log.status = SyncLog.SyncStatus.PARTIAL if records_processed else SyncLog.SyncStatus.FAILED
+            sync_log.error_message = str(e)
+            timer.record(sync_log)
+            sync_log.save(using='default')
+        finally:
+            SyncLeaseService.release(source, token)
+            FactoryRegistry.release(db_name)
+        return sync_log
+
+    @staticmethod
+    def sync_device(device_id: str, force: bool = False):
+        """
+        Sync the data source a device belongs to.
+
+        Factory data is synced per source, so this syncs every device of the
+        source and coalesces with any sync of it that is already running.
+        Returns the SyncLog of the sync.
+        """
+        try:
+            device = BloodAnalyzer.objects.using('default').select_related('data_source').get(device_id=device_id)
+        except BloodAnalyzer.DoesNotExist:
+            raise Exception(f"Device {device_id} not found")
+        if device.data_source is None:
+            raise Exception(f"Device {device_id} has no data source to sync from")
+        return SyncService.sync_source(device.data_source.name, force=force)
 
     @staticmethod
-    def sync_all_sources() -> list[SyncLog]:
+    def sync_all_sources(fan_out: bool = False):
         """
         Sync data from all sources.
+
+        By default the sources are synced one after another and their SyncLogs
+        are returned. With ``fan_out=True`` one ``sync_source_task`` per active
+        source is dispatched as a Celery chord instead, so total wall time is
+        bounded by the slowest source; ``record_sync_summary_task`` writes an
+        aggregated SyncLog once they have all finished. The chord's
+        AsyncResult is returned.
         """
         sources = DataSource.objects.filter(is_active=True)
+        if fan_out:
+            from devices.tasks import sync_source_task, record_sync_summary_task
+            return chord(
+                sync_source_task.s(source.id) for source in sources
+            )(record_sync_summary_task.s())
+        
         logs = []
         
         for source in sources:
@@ -192,36 +398,6 @@ class SyncService:
             
         return logs
 
-@shared_task
-def periodic_sync():
-    """
-    Celery task to periodically sync all sources.
-    """
-    while True:
-        try:
-            # Get all active data sources
-            active_sources = DataSource.objects.filter(is_active=True)
-            
-            for source in active_sources:
-                try:
-                    # Check if source needs syncing
-                    last_sync = SyncLog.objects.filter(
-                        source=source,
-                        status='completed'
-                    ).order_by('-timestamp').first()
-                    
-                    # If never synced or last sync was more than 2 minutes ago
-                    if not last_sync or (timezone.now() - last_sync.timestamp).total_seconds() > 120:
-                        SyncService.sync_source(source.name)
-                except Exception as e:
-                    print(f"Error syncing source {source.name}: {str(e)}")
-                    continue
-                    
-            time.sleep(60)  # Sleep for 1 minute
-        except Exception as e:
-            print(f"Error in periodic sync: {str(e)}")
-            time.sleep(30)  # Sleep for 30 seconds on error
-    
     @staticmethod
     def get_sync_status(source_id):
         """
@@ -246,11 +422,7 @@ def periodic_sync():
                 'last_sync_time': last_sync.timestamp if last_sync else None,
                 'last_sync_status': last_sync.status if last_sync else None,
                 'last_error': last_sync.error_message if last_sync else None,
-                'is_syncing': SyncLog.objects.filter(
-                    source=source,
-                    status='in_progress',
-                    timestamp__gte=timezone.now() - timedelta(minutes=5)
-                ).exists()
+                'is_syncing': SyncLeaseService.current(source) is not None
             }
         except DataSource.DoesNotExist:
             raise Exception(f"Data source with ID {source_id} not found")
@@ -270,8 +442,19 @@ def periodic_sync():
         try:
             source = DataSource.objects.get(id=source_id)
             
-            return SyncLog.objects.filter(
-                source=source
-            ).order_by('-timestamp')[:limit]
+            # Through the related manager every log shares the source
+            # instance instead of fetching it again when serialized
+            return source.sync_logs.order_by('-timestamp')[:limit]
         except DataSource.DoesNotExist:
-            raise Exception(f"Data source with ID {source_id} not found") 
\ No newline at end of file
+            raise Exception(f"Data source with ID {source_id} not found")
+
+@shared_task
+def periodic_sync():
+    """
+    Celery task to periodically sync all sources.
+
+    Kept for beat schedules that still reference it: runs one scheduler
+    tick and returns, see devices.tasks.sync_scheduler_tick.
+    """
+    from devices.tasks import sync_scheduler_tick
+    return sync_scheduler_tick()
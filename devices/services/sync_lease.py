@@ -0,0 +1,99 @@
+import uuid
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from devices.models import SyncLease, DataSource, SyncLog
+from devices.services.response_cache import ResponseCacheService
+
+class SyncLeaseLost(Exception):
+    """Raised when a sync finds that its lease expired or was taken over."""
+
+class SyncLeaseService:
+    """
+    Single-flight leases for syncing a data source.
+
+    Each DataSource has at most one SyncLease row in the default database.
+    A sync acquires it with a conditional UPDATE that only succeeds if the
+    lease is released or expired, renews it with ``heartbeat`` while it makes
+    progress, and releases it when done. A sync that dies without releasing
+    its lease blocks the source for at most ``TTL``.
+    """
+
+    TTL = timedelta(minutes=5)
+
+    @staticmethod
+    def acquire(source: DataSource, force: bool = False, ttl: timedelta = None):
+        """
+        Try to acquire the lease of a source.
+
+        With ``force=True`` the lease is taken over even if another sync holds
+        it; that sync loses it at its next heartbeat.
+        Returns the owner token, or None if the lease is held by another sync.
+        """
+        ttl = ttl or SyncLeaseService.TTL
+        now = timezone.now()
+        token = uuid.uuid4().hex
+
+        if not SyncLease.objects.filter(source=source).exists():
+            try:
+                with transaction.atomic(using='default'):
+                    SyncLease.objects.create(source=source, expires_at=now)
+            except IntegrityError:
+                pass  # Created concurrently by another sync
+
+        leases = SyncLease.objects.filter(source=source)
+        if not force:
+            leases = leases.filter(Q(owner='') | Q(expires_at__lte=now))
+        acquired = leases.update(
+            owner=token,
+            sync_log=None,
+            acquired_at=now,
+            heartbeat_at=now,
+            expires_at=now + ttl
+        )
+        return token if acquired else None
+
+    @staticmethod
+    def attach(source: DataSource, token: str, sync_log: SyncLog):
+        """
+        Record the SyncLog of the sync holding the lease, so triggers that
+        coalesce into it can report on it.
+        """
+        SyncLease.objects.filter(source=source, owner=token).update(sync_log=sync_log)
+
+    @staticmethod
+    def heartbeat(source: DataSource, token: str, ttl: timedelta = None):
+        """
+        Extend the lease held by ``token``.
+        Raises SyncLeaseLost if the lease expired or was taken over.
+        """
+        ttl = ttl or SyncLeaseService.TTL
+        now = timezone.now()
+        renewed = SyncLease.objects.filter(
+            source=source, owner=token, expires_at__gt=now
+        ).update(heartbeat_at=now, expires_at=now + ttl)
+        if not renewed:
+            raise SyncLeaseLost(f"Sync lease of {source.name} was lost")
+
+    @staticmethod
+    def release(source: DataSource, token: str):
+        """
+        Release the lease held by ``token``. Does nothing if it was taken over.
+
+        The sync is over, so the cached device list and sync status of the
+        source are dropped.
+        """
+        SyncLease.objects.filter(source=source, owner=token).update(
+            owner='', expires_at=timezone.now()
+        )
+        ResponseCacheService.invalidate('devices', ResponseCacheService.source_scope(source.id))
+
+    @staticmethod
+    def current(source: DataSource):
+        """
+        Return the source's lease if a sync currently holds it, else None.
+        """
+        return SyncLease.objects.select_related('sync_log').filter(
+            source=source, expires_at__gt=timezone.now()
+        ).exclude(owner='').first()
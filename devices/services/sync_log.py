@@ -38,4 +38,33 @@ class SyncLogService:
         # Then update the data source's last sync time if successful
         if log.status == 'success':  # Use the mapped status here too
             log.source.last_sync = timezone.now()
-            log.source.save() 
\ No newline at end of file
+            log.source.save()
+
+    @staticmethod
+    def create_summary(results: list[dict]) -> SyncLog:
+        """
+        Create a summary sync log for a multi-source sync.
+
+        ``results`` holds one dict per synced source with ``source_name``,
+        ``status``, ``records_processed`` and ``error_message`` keys. The
+        summary succeeds if every source succeeded, fails if none did and is
+        partial otherwise.
+        """
+        statuses = [result['status'] for result in results]
+        if all(status == 'success' for status in statuses):
+            status = 'success'
+        elif any(status in ('success', 'partial') for status in statuses):
+            status = 'partial'
+        else:
+            status = 'failed'
+        
+        errors = [
+            f"{result['source_name']}: {result['error_message']}"
+            for result in results if result['status'] != 'success'
+        ]
+        return SyncLog.objects.create(
+            source=None,
+            status=status,
+            records_processed=sum(result['records_processed'] for result in results),
+            error_message='\n'.join(errors)
+        )
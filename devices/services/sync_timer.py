@@ -0,0 +1,89 @@
+import os
+import time
+from contextlib import contextmanager
+
+class SyncTimer:
+    """
+    Collects per-stage wall time and throughput of one sync.
+
+    Stages nest: time spent in an inner stage is not counted towards the
+    stage around it, so the stage timings add up to the instrumented time.
+    ``record`` writes the totals onto a SyncLog.
+
+    Peak memory is the highest resident memory sampled during the sync, at
+    every stage boundary and batch of rows read, so it is not inflated by
+    syncs that ran earlier in the same process.
+    """
+
+    STAGES = ['read_analyzers', 'resolve_users', 'copy_runs', 'copy_metrics', 'commit']
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = dict.fromkeys(self.STAGES, 0.0)
+        self.rows_read = 0
+        self.bytes_read = 0
+        self._stack = []  # [stage name, start time] of the open stages
+        self.peak_rss = self.resident_memory()
+
+    @contextmanager
+    def stage(self, name: str):
+        self.sample_memory()
+        now = time.perf_counter()
+        if self._stack:
+            # Pause the enclosing stage
+            outer = self._stack[-1]
+            self.timings[outer[0]] = self.timings.get(outer[0], 0.0) + now - outer[1]
+        self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _, start = self._stack.pop()
+            self.timings[name] = self.timings.get(name, 0.0) + now - start
+            if self._stack:
+                # Resume the enclosing stage
+                self._stack[-1][1] = now
+            self.sample_memory()
+
+    def add_rows(self, rows):
+        """
+        Count rows read from a factory database and estimate their size:
+        the length of string values plus 8 bytes for any other value.
+        """
+        for row in rows:
+            self.rows_read += 1
+            self.bytes_read += sum(len(value) if isinstance(value, str) else 8 for value in row)
+        # The rows of a batch are all in memory at this point
+        self.sample_memory()
+
+    def sample_memory(self):
+        """
+        Raise ``peak_rss`` to the current resident memory if it is higher.
+        """
+        rss = self.resident_memory()
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def record(self, sync_log):
+        """
+        Set the timing fields of a SyncLog. The caller saves it.
+        """
+        sync_log.duration = time.perf_counter() - self.started
+        sync_log.stage_timings = {name: round(seconds, 6) for name, seconds in self.timings.items()}
+        sync_log.rows_per_second = self.rows_read / sync_log.duration if sync_log.duration else None
+        sync_log.bytes_read = self.bytes_read
+        self.sample_memory()
+        sync_log.peak_memory = self.peak_rss
+
+    @staticmethod
+    def resident_memory():
+        """
+        Current resident memory of this process in bytes, or None where
+        /proc is not available.
+        """
+        try:
+            with open('/proc/self/statm') as statm:
+                pages = int(statm.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        return pages * os.sysconf('SC_PAGE_SIZE')
@@ -0,0 +1,182 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from devices.models import BloodAnalyzer, TestRun, TestMetric, DataSource
+from devices.services.factory_registry import FactoryRegistry
+
+class SyntheticDataService:
+    """
+    Service for building large, reproducible factory datasets.
+
+    Every factory gets ``analyzers`` analyzers with ``runs`` test runs each
+    and one metric of every ``TestMetric.MetricType`` per run. All values
+    are drawn from a random generator seeded with the seed, the factory's
+    alias and the analyzer and run index, and timestamps count up from a
+    fixed start, so the same arguments always produce the same rows. Rows are written with ``executemany`` in
+    one transaction per batch, without building model instances.
+    """
+
+    METRIC_RANGES = {
+        TestMetric.MetricType.HEMOGLOBIN: (12.0, 18.0),
+        TestMetric.MetricType.WBC: (4.0, 11.0),
+        TestMetric.MetricType.PLATELETS: (150.0, 450.0),
+        TestMetric.MetricType.GLUCOSE: (70.0, 140.0),
+    }
+    START = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    RUN_SPACING = timedelta(minutes=15)  # Between two runs of one analyzer
+    TECHNICIAN = 'synthetic_tech'
+
+    @staticmethod
+    def device_prefix(db_name: str) -> str:
+        return f'SYN-{db_name.upper()}'
+
+    @staticmethod
+    def prepare_factory(db_name: str) -> DataSource:
+        """
+        Make sure a factory database has a DataSource (in default and in its
+        own devices_datasource table) and a technician to run the tests.
+        An existing source mapping to the alias is reused.
+        """
+        # The source of an existing factory may have any name, e.g. "Factory A"
+        source = FactoryRegistry.source_for(db_name)
+        if source is None:
+            source = DataSource.objects.using('default').create(
+                name=db_name, source_type=DataSource.SourceType.FACTORY, is_active=True
+            )
+        with connections[db_name].cursor() as cursor:
+            # Factory databases carry their own devices_datasource table
+            # (see generate_test_data), the router only migrates it to default
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS devices_datasource (
+                    id INTEGER PRIMARY KEY,
+                    name varchar(50) NOT NULL,
+                    source_type varchar(20) NOT NULL,
+                    last_sync datetime NULL,
+                    is_active bool NOT NULL
+                )
+            """)
+            cursor.execute("SELECT id FROM devices_datasource WHERE id = %s", [source.id])
+            if cursor.fetchone() is None:
+                cursor.execute(
+                    "INSERT INTO devices_datasource (id, name, source_type, is_active) VALUES (%s, %s, %s, %s)",
+                    [source.id, source.name, DataSource.SourceType.FACTORY, True]
+                )
+        User.objects.using(db_name).get_or_create(
+            username=SyntheticDataService.TECHNICIAN,
+            defaults={'first_name': 'Synthetic', 'last_name': 'Technician'}
+        )
+        return source
+
+    @staticmethod
+    def build_factory(db_name: str, analyzers: int, runs: int, seed: int = 0, first_run: int = 0,
+                      batch_size: int = 5000) -> dict:
+        """
+        Generate analyzers, runs and metrics in a factory database.
+
+        ``first_run`` continues an existing dataset: runs ``first_run`` to
+        ``first_run + runs - 1`` of every analyzer are written, so building
+        0..K and then K..K+L gives the same rows as building 0..K+L at once.
+        Returns a dict with the number of ``analyzers``, ``runs`` and
+        ``metrics`` written.
+        """
+        source = SyntheticDataService.prepare_factory(db_name)
+        connection = connections[db_name]
+        ops = connection.ops
+        prefix = SyntheticDataService.device_prefix(db_name)
+        technician_id = User.objects.using(db_name).get(username=SyntheticDataService.TECHNICIAN).id
+        counts = {'analyzers': 0, 'runs': 0, 'metrics': 0}
+
+        # Analyzers, created once and reused when a dataset is continued
+        device_ids = [f'{prefix}-BA-{i:05d}' for i in range(analyzers)]
+        existing = dict(BloodAnalyzer.objects.using(db_name).filter(
+            device_id__in=device_ids
+        ).values_list('device_id', 'id'))
+        new_devices = []
+        for i, device_id in enumerate(device_ids):
+            manufactured = SyntheticDataService.START - timedelta(days=365 + i % 365)
+            calibrated = SyntheticDataService.START - timedelta(days=i % 30)
+            if device_id not in existing:
+                new_devices.append([
+                    device_id,
+                    BloodAnalyzer.DeviceType.PRODUCTION,
+                    BloodAnalyzer.Status.ACTIVE,
+                    ops.adapt_datetimefield_value(calibrated),
+                    ops.adapt_datetimefield_value(calibrated + timedelta(days=30)),
+                    f'{db_name} Line {i % 10 + 1}',
+                    ops.adapt_datefield_value(manufactured.date()),
+                    technician_id,
+                    source.id,
+                ])
+        with transaction.atomic(using=db_name), connection.cursor() as cursor:
+            cursor.executemany("""
+                INSERT INTO devices_bloodanalyzer (
+                    device_id, device_type, status, last_calibration, next_calibration_due,
+                    location, manufacturing_date, assigned_technician_id, data_source_id
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, new_devices)
+        counts['analyzers'] = len(new_devices)
+        analyzer_ids = dict(BloodAnalyzer.objects.using(db_name).filter(
+            device_id__in=device_ids
+        ).values_list('device_id', 'id'))
+        analyzer_ids = [analyzer_ids[device_id] for device_id in device_ids]
+
+        # Runs get explicit IDs so their metrics can be written without
+        # reading the IDs back. Runs are written in timestamp order across
+        # analyzers, like a live factory would.
+        next_id = (TestRun.objects.using(db_name).order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        run_rows, metric_rows = [], []
+        for run_index in range(first_run, first_run + runs):
+            for analyzer_index, analyzer_id in enumerate(analyzer_ids):
+                # Seeded per run, so a run is the same however the dataset was built up
+                rng = random.Random(f'{seed}:{db_name}:{analyzer_index}:{run_index}')
+                timestamp = SyntheticDataService.START + run_index * SyntheticDataService.RUN_SPACING + timedelta(
+                    seconds=rng.randrange(int(SyntheticDataService.RUN_SPACING.total_seconds()))
+                )
+                is_abnormal = False
+                for metric_type, (expected_min, expected_max) in SyntheticDataService.METRIC_RANGES.items():
+                    value = round(rng.uniform(expected_min * 0.9, expected_max * 1.1), 2)
+                    is_abnormal = is_abnormal or not expected_min <= value <= expected_max
+                    metric_rows.append([next_id, metric_type.value, value, expected_min, expected_max])
+                run_rows.append([
+                    next_id,
+                    f'{prefix}-{analyzer_index:05d}-{run_index:08d}',
+                    analyzer_id,
+                    technician_id,
+                    ops.adapt_datetimefield_value(timestamp),
+                    TestRun.RunType.QC if run_index % 20 == 0 else TestRun.RunType.PRODUCTION,
+                    is_abnormal,
+                    True,
+                    '',
+                    source.id,
+                ])
+                next_id += 1
+                if len(run_rows) >= batch_size:
+                    SyntheticDataService._write_batch(db_name, run_rows, metric_rows, counts)
+                    run_rows, metric_rows = [], []
+        if run_rows:
+            SyntheticDataService._write_batch(db_name, run_rows, metric_rows, counts)
+
+        # Keep sequences (PostgreSQL) in step with the explicit run IDs
+        with connection.cursor() as cursor:
+            for sql in ops.sequence_reset_sql(no_style(), [TestRun]):
+                cursor.execute(sql)
+        return counts
+
+    @staticmethod
+    def _write_batch(db_name: str, run_rows: list, metric_rows: list, counts: dict):
+        with transaction.atomic(using=db_name), connections[db_name].cursor() as cursor:
+            cursor.executemany("""
+                INSERT INTO devices_testrun (
+                    id, run_id, device_id, executed_by_id, timestamp, run_type,
+                    is_abnormal, is_factory_data, notes, data_source_id
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, run_rows)
+            cursor.executemany("""
+                INSERT INTO devices_testmetric (
+                    test_run_id, metric_type, value, expected_min, expected_max
+                ) VALUES (%s, %s, %s, %s, %s)
+            """, metric_rows)
+        counts['runs'] += len(run_rows)
+        counts['metrics'] += len(metric_rows)
@@ -1,30 +1,37 @@
+from itertools import islice
 from devices.models import TestRun, TestMetric, BloodAnalyzer
 from django.utils import timezone
 from django.db import transaction
-from django.contrib.auth.models import User
+from django.db.models import Exists, F, OuterRef, Q
+from devices.services.user_map import UserIdentityMap
+from devices.services.sync_timer import SyncTimer
 
 class TestRunService:
     """Service for handling test run operations."""
     
     @staticmethod
-    def sync_analyzer_runs(analyzer: BloodAnalyzer, runs=None):
+    def sync_analyzer_runs(analyzer: BloodAnalyzer, runs=None, user_map: UserIdentityMap = None,
+                           chunk_size: int = 1000, skipped: list = None):
         """
         Sync test runs for a specific analyzer.
+        The factory IDs of runs that failed to sync are appended to ``skipped``
+        if given.
         Returns a tuple of (new_runs_count, new_metrics_count)
         """
-        # Map source name to database name
-        db_name = analyzer.data_source.name.lower().replace(' ', '_')
+        # The analyzer was read from the factory database its runs live in
+        db_name = analyzer._state.db
         print(f"Syncing runs from {db_name} to default database")
         
         if runs is None:
             runs = TestRun.objects.using(db_name).filter(device=analyzer)
+        if user_map is None:
+            user_map = UserIdentityMap(db_name, analyzer.data_source)
         
         new_runs_count = 0
         new_metrics_count = 0
         
-        for run in runs:
+        for run in runs.iterator(chunk_size=chunk_size):
             try:
-                print(f"Processing run {run.run_id} from {db_name}")
                 
                 # First, ensure the analyzer exists in the default database
                 try:
@@ -40,40 +47,17 @@ class TestRunService:
                         'manufacturing_date': analyzer.manufacturing_date,
                         'last_calibration': analyzer.last_calibration,
                         'next_calibration_due': analyzer.next_calibration_due,
-                        'assigned_technician': analyzer.assigned_technician,
+                        'assigned_technician_id': user_map.get(analyzer.assigned_technician_id),
                         'data_source': analyzer.data_source
                     }
                     default_analyzer = BloodAnalyzer.objects.using('default').create(**analyzer_data)
                 
                 # Handle executed_by user before starting transaction
-                default_executed_by = None
-                if run.executed_by_id:  # Check if there's a user assigned
-                    try:
-                        # Get the user from the source database
-                        source_user = User.objects.using(db_name).get(id=run.executed_by_id)
-                        
-                        # Try to get the user from default database
-                        try:
-                            default_executed_by = User.objects.using('default').get(username=source_user.username)
-                        except User.DoesNotExist:
-                            print(f"Creating user {source_user.username} in default database")
-                            # Create the user in default database
-                            user_data = {
-                                'username': source_user.username,
-                                'email': source_user.email,
-                                'first_name': source_user.first_name,
-                                'last_name': source_user.last_name,
-                                'is_staff': source_user.is_staff,
-                                'is_active': source_user.is_active
-                            }
-                            default_executed_by = User.objects.using('default').create(**user_data)
-                    except User.DoesNotExist:
-                        print(f"Warning: User with ID {run.executed_by_id} not found in {db_name}")
+                default_executed_by_id = user_map.get(run.executed_by_id)
                 
                 # Check if run already exists in default database
                 try:
                     existing_run = TestRun.objects.using('default').get(run_id=run.run_id)
-                    print(f"Run {run.run_id} already exists in default database, checking metrics")
                     synced_run = existing_run
                 except TestRun.DoesNotExist:
                     # Get all fields from the source run
@@ -86,28 +70,25 @@ class TestRunService:
                         'notes': run.notes,
                         'data_source': analyzer.data_source,
                         'device': default_analyzer,  # Use the analyzer from default database
-                        'executed_by': default_executed_by  # Use the user from default database
+                        'executed_by_id': default_executed_by_id  # Use the user from default database
                     }
                     
                     # Create the run in the default database
                     with transaction.atomic(using='default'):
-                        print(f"Creating new run {run.run_id} in default database")
                         synced_run = TestRun.objects.using('default').create(**run_data)
                         new_runs_count += 1
                 
                 # Now sync the metrics for this run
                 try:
                     metrics = TestMetric.objects.using(db_name).filter(test_run=run)
-                    print(f"Found {metrics.count()} metrics for run {run.run_id}")
                     
-                    for metric in metrics:
+                    for metric in metrics.iterator():
                         try:
                             # Check if metric exists using exact match
                             existing_metric = TestMetric.objects.using('default').get(
                                 test_run=synced_run,
                                 metric_type=metric.metric_type
                             )
-                            print(f"Metric {metric.metric_type} for run {run.run_id} already exists in default database, skipping")
                             continue
                         except TestMetric.DoesNotExist:
                             try:
@@ -120,7 +101,6 @@ class TestRunService:
                                     expected_max=metric.expected_max
                                 )
                                 new_metrics_count += 1
-                                print(f"Created new metric {metric.metric_type} for run {run.run_id}")
                             except Exception as e:
                                 print(f"Error creating metric {metric.metric_type} for run {run.run_id}: {str(e)}")
                                 raise  # Re-raise to trigger transaction rollback
@@ -130,7 +110,222 @@ class TestRunService:
                     
             except Exception as e:
                 print(f"Error syncing run {run.run_id}: {str(e)}")
+                if skipped is not None:
+                    skipped.append(run.id)
                 continue
         
         print(f"Sync completed. New runs: {new_runs_count}, New metrics: {new_metrics_count}")
-        return new_runs_count, new_metrics_count 
\ No newline at end of file
+        return new_runs_count, new_metrics_count
+
+    @staticmethod
+    def bulk_sync_runs(db_name: str, source, runs=None, chunk_size: int = 1000,
+                       user_map: UserIdentityMap = None, checkpoint=None,
+                       update_existing: bool = False, timer: SyncTimer = None, skipped: list = None):
+        """
+        Set-based sync of test runs and their metrics from a factory database.
+
+        Runs are streamed from ``db_name`` in primary key order as lightweight
+        ``values_list`` rows through ``iterator(chunk_size=...)`` (a server-side
+        cursor where the backend supports it) and processed ``chunk_size`` at a
+        time, so memory use does not grow with the size of the factory
+        database. Each chunk resolves its analyzers and technicians, then writes the
+        runs and metrics with ``bulk_create`` inside a single transaction on the
+        default database. Rows that already exist (same ``run_id``, or same
+        ``test_run``/``metric_type`` pair) are left untouched, unless
+        ``update_existing`` is set: then existing runs get the factory's
+        run type, timestamp, notes and technician, metric values and ranges are upserted,
+        and ``is_abnormal`` is re-evaluated for every run in the chunk.
+
+        If given, ``checkpoint(last_run, new_runs_count, new_metrics_count)`` is
+        called inside each chunk's transaction with the chunk's last factory
+        row and the running totals, so progress is committed together with
+        the data it describes. Time per stage and the rows read are added
+        to ``timer`` if one is passed. New runs whose analyzer or technician
+        is missing in the default database are not copied; their factory IDs
+        are appended to ``skipped`` if given, before the chunk's checkpoint.
+        Returns a tuple of (new_runs_count, new_metrics_count)
+        """
+        if runs is None:
+            runs = TestRun.objects.using(db_name).all()
+        if user_map is None:
+            user_map = UserIdentityMap(db_name, source)
+        timer = timer or SyncTimer()
+        rows = runs.order_by('id').values_list(
+            'id', 'run_id', 'device_id', 'run_type', 'timestamp',
+            'is_abnormal', 'notes', 'executed_by_id',
+            named=True
+        ).iterator(chunk_size=chunk_size)
+
+        new_runs_count = 0
+        new_metrics_count = 0
+        analyzer_map = {}  # factory analyzer ID -> default analyzer ID
+
+        def read_chunk():
+            with timer.stage('copy_runs'):
+                return list(islice(rows, chunk_size))
+
+        for chunk in iter(read_chunk, []):
+            last_run = chunk[-1]
+            timer.add_rows(chunk)
+
+            with timer.stage('read_analyzers'):
+                TestRunService._resolve_analyzers(db_name, {run.device_id for run in chunk}, analyzer_map)
+            with timer.stage('resolve_users'):
+                user_ids = user_map.resolve(run.executed_by_id for run in chunk)
+
+            with timer.stage('copy_runs'):
+                run_ids = [run.run_id for run in chunk]
+                existing_run_ids = set(
+                    TestRun.objects.using('default').filter(run_id__in=run_ids).values_list('run_id', flat=True)
+                )
+                new_runs = []
+                updated_runs = []
+                for run in chunk:
+                    if run.run_id in existing_run_ids:
+                        if update_existing and user_ids.get(run.executed_by_id) is not None:
+                            updated_runs.append(run)
+                        continue
+                    if run.device_id not in analyzer_map or user_ids.get(run.executed_by_id) is None:
+                        print(f"Skipping run {run.run_id}: analyzer or user missing in default database")
+                        if skipped is not None:
+                            skipped.append(run.id)
+                        continue
+                    new_runs.append(TestRun(
+                        run_id=run.run_id,
+                        device_id=analyzer_map[run.device_id],
+                        run_type=run.run_type,
+                        timestamp=run.timestamp,
+                        is_abnormal=run.is_abnormal,
+                        is_factory_data=True,
+                        notes=run.notes,
+                        data_source=source,
+                        executed_by_id=user_ids[run.executed_by_id]
+                    ))
+
+            with timer.stage('copy_metrics'):
+                factory_metrics = list(TestMetric.objects.using(db_name).filter(
+                    test_run_id__in=[run.id for run in chunk]
+                ).values_list('test_run_id', 'metric_type', 'value', 'expected_min', 'expected_max'))
+                timer.add_rows(factory_metrics)
+
+            # Time left in this stage is spent beginning and committing the transaction
+            with timer.stage('commit'), transaction.atomic(using='default'):
+                with timer.stage('copy_runs'):
+                    # ignore_conflicts skips runs another sync inserted meanwhile without
+                    # telling which, so count the central rows that did not exist before
+                    existing_pks = set(
+                        TestRun.objects.using('default').filter(run_id__in=run_ids).values_list('id', flat=True)
+                    )
+                    TestRun.objects.using('default').bulk_create(new_runs, ignore_conflicts=True)
+
+                    # Map factory run IDs to the IDs of their copies in the default database
+                    default_run_ids = dict(
+                        TestRun.objects.using('default').filter(run_id__in=run_ids).values_list('run_id', 'id')
+                    )
+                    run_map = {
+                        run.id: default_run_ids[run.run_id]
+                        for run in chunk if run.run_id in default_run_ids
+                    }
+                    inserted_runs = len(set(default_run_ids.values()) - existing_pks)
+                    new_runs_count += inserted_runs
+                    if updated_runs:
+                        TestRun.objects.using('default').bulk_update([
+                            TestRun(
+                                id=default_run_ids[run.run_id],
+                                run_type=run.run_type,
+                                timestamp=run.timestamp,
+                                notes=run.notes,
+                                executed_by_id=user_ids[run.executed_by_id]
+                            )
+                            for run in updated_runs
+                        ], ['run_type', 'timestamp', 'notes', 'executed_by_id'])
+                with timer.stage('copy_metrics'):
+                    existing_metrics = set()
+                    if not update_existing:
+                        existing_metrics = set(
+                            TestMetric.objects.using('default').filter(
+                                test_run_id__in=run_map.values()
+                            ).values_list('test_run_id', 'metric_type')
+                        )
+                    new_metrics = [
+                        TestMetric(
+                            test_run_id=run_map[test_run_id],
+                            metric_type=metric_type,
+                            value=value,
+                            expected_min=expected_min,
+                            expected_max=expected_max
+                        )
+                        for test_run_id, metric_type, value, expected_min, expected_max in factory_metrics
+                        if test_run_id in run_map and (run_map[test_run_id], metric_type) not in existing_metrics
+                    ]
+                    if update_existing:
+                        TestMetric.objects.using('default').bulk_create(
+                            new_metrics,
+                            update_conflicts=True,
+                            unique_fields=['test_run', 'metric_type'],
+                            update_fields=['value', 'expected_min', 'expected_max']
+                        )
+                    else:
+                        TestMetric.objects.using('default').bulk_create(new_metrics, ignore_conflicts=True)
+                    new_metrics_count += len(new_metrics)
+
+                    # bulk_create skips TestMetric.save, and updated values may
+                    # bring a run back into range, so re-evaluate the whole chunk
+                    TestRunService.evaluate_abnormal(
+                        TestRun.objects.using('default').filter(id__in=run_map.values())
+                    )
+
+                if checkpoint:
+                    checkpoint(last_run, new_runs_count, new_metrics_count)
+
+            if update_existing:
+                print(f"Synced chunk ending at run ID {last_run.id}: {inserted_runs} new runs, {len(updated_runs)} updated runs, {len(new_metrics)} metrics upserted")
+            else:
+                print(f"Synced chunk ending at run ID {last_run.id}: {inserted_runs} new runs, {len(new_metrics)} new metrics")
+
+        return new_runs_count, new_metrics_count
+
+    @staticmethod
+    def evaluate_abnormal(runs) -> int:
+        """
+        Set ``is_abnormal`` of a queryset of test runs from their stored
+        metrics, in a single ``UPDATE ... SET is_abnormal = EXISTS (...)``
+        on the queryset's database. Only runs whose flag changes are
+        written, both ways.
+        Returns the number of runs updated.
+        """
+        abnormal = Exists(TestMetric.objects.filter(
+            Q(value__lt=F('expected_min')) | Q(value__gt=F('expected_max')),
+            test_run=OuterRef('pk')
+        ))
+        return runs.exclude(is_abnormal=abnormal).update(is_abnormal=abnormal)
+
+    @staticmethod
+    def evaluate_abnormal_ids(run_ids, using: str = 'default', batch_size: int = 1000) -> int:
+        """
+        ``evaluate_abnormal`` for a list of test run IDs, ``batch_size`` IDs
+        per UPDATE. Returns the number of runs updated.
+        """
+        run_ids = list(run_ids)
+        updated = 0
+        for start in range(0, len(run_ids), batch_size):
+            updated += TestRunService.evaluate_abnormal(
+                TestRun.objects.using(using).filter(id__in=run_ids[start:start + batch_size])
+            )
+        return updated
+
+    @staticmethod
+    def _resolve_analyzers(db_name: str, factory_ids, analyzer_map: dict):
+        """
+        Add the default database IDs of the given factory analyzers to ``analyzer_map``.
+        """
+        missing = set(factory_ids) - set(analyzer_map)
+        if not missing:
+            return
+        device_ids = dict(
+            BloodAnalyzer.objects.using(db_name).filter(id__in=missing).values_list('device_id', 'id')
+        )
+        for device_id, default_id in BloodAnalyzer.objects.using('default').filter(
+            device_id__in=device_ids
+        ).values_list('device_id', 'id'):
+            analyzer_map[device_ids[device_id]] = default_id
@@ -0,0 +1,97 @@
+from devices.models import FactoryUserMapping
+from django.contrib.auth.models import User
+
+class UserIdentityMap:
+    """
+    Per-sync cache from factory user IDs to central (default database) user IDs.
+
+    IDs are resolved in sets: persisted ``FactoryUserMapping`` rows are used
+    first, the remaining users are read from the factory database and matched
+    to central users by username in one query each, and any central users
+    that are still missing are bulk-created. New matches are persisted so
+    later syncs skip the lookups entirely.
+    """
+
+    def __init__(self, db_name: str, source):
+        self.db_name = db_name
+        self.source = source
+        self._user_ids = {}  # factory user ID -> default user ID (None if unknown)
+
+    def resolve(self, factory_user_ids) -> dict:
+        """
+        Resolve a batch of factory user IDs.
+        Returns a dict of factory user ID -> default user ID (None if the
+        user does not exist in the factory database).
+        """
+        factory_user_ids = {user_id for user_id in factory_user_ids if user_id is not None}
+        missing = factory_user_ids - set(self._user_ids)
+        if missing:
+            self._load(missing)
+        return {user_id: self._user_ids[user_id] for user_id in factory_user_ids}
+
+    def get(self, factory_user_id):
+        """
+        Return the default user ID for a single factory user ID, or None.
+        """
+        if factory_user_id is None:
+            return None
+        return self.resolve([factory_user_id])[factory_user_id]
+
+    def _load(self, factory_user_ids: set):
+        # Mappings persisted by earlier syncs
+        mapped = dict(
+            FactoryUserMapping.objects.using('default').filter(
+                source=self.source,
+                factory_user_id__in=factory_user_ids
+            ).values_list('factory_user_id', 'user_id')
+        )
+        self._user_ids.update(mapped)
+        unmapped = factory_user_ids - set(mapped)
+        if not unmapped:
+            return
+
+        # Factory users, then their central counterparts by username
+        source_users = {
+            user['id']: user for user in User.objects.using(self.db_name).filter(id__in=unmapped).values(
+                'id', 'username', 'email', 'first_name', 'last_name', 'is_staff', 'is_active'
+            )
+        }
+        usernames = {user['username'] for user in source_users.values()}
+        default_ids = dict(
+            User.objects.using('default').filter(username__in=usernames).values_list('username', 'id')
+        )
+
+        new_users = [
+            User(
+                username=user['username'],
+                email=user['email'],
+                first_name=user['first_name'],
+                last_name=user['last_name'],
+                is_staff=user['is_staff'],
+                is_active=user['is_active']
+            )
+            for user in source_users.values() if user['username'] not in default_ids
+        ]
+        if new_users:
+            print(f"Creating {len(new_users)} users from {self.db_name} in default database")
+            User.objects.using('default').bulk_create(new_users, ignore_conflicts=True)
+            default_ids.update(
+                User.objects.using('default').filter(
+                    username__in=[user.username for user in new_users]
+                ).values_list('username', 'id')
+            )
+
+        mappings = []
+        for user_id in unmapped:
+            user = source_users.get(user_id)
+            if user is None:
+                print(f"Warning: User with ID {user_id} not found in {self.db_name}")
+                self._user_ids[user_id] = None
+                continue
+            self._user_ids[user_id] = default_ids[user['username']]
+            mappings.append(FactoryUserMapping(
+                source=self.source,
+                factory_user_id=user_id,
+                user_id=default_ids[user['username']]
+            ))
+        FactoryUserMapping.objects.using('default').bulk_create(mappings, ignore_conflicts=True)
@@ -0,0 +1,47 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from devices.models import BloodAnalyzer, DataSource, SyncLog
+from devices.routers import DataSourceRouter
+from devices.services.factory_registry import FactoryRegistry
+from devices.services.response_cache import ResponseCacheService
+
+# Written by syncs and the scheduler. Saves that only touch these change
+# neither the route nor the connection, and embedded copies in cached device
+# lists may lag behind by up to API_CACHE_TIMEOUT
+SYNC_BOOKKEEPING_FIELDS = frozenset({
+    'last_sync', 'last_synced_run_pk', 'last_synced_run_at',
+    'last_change_seq', 'sync_interval', 'next_sync_due',
+})
+
+@receiver(post_save, sender=DataSource)
+def refresh_factory_connection(sender, instance, update_fields=None, **kwargs):
+    """Drop the cached route, responses and (if it changed) runtime connection of an edited data source."""
+    if update_fields and update_fields <= SYNC_BOOKKEEPING_FIELDS:
+        return
+    FactoryRegistry.refresh(instance)
+    DataSourceRouter.invalidate(instance.id)
+    if kwargs['using'] == 'default':
+        # The device list can embed the source (?expand=data_source)
+        ResponseCacheService.invalidate(ResponseCacheService.source_scope(instance.id), 'devices')
+
+@receiver(post_delete, sender=DataSource)
+def reset_factory_connection(sender, instance, **kwargs):
+    """Drop the runtime connection, cached route and cached responses of a deleted data source."""
+    FactoryRegistry.unregister(instance.id)
+    DataSourceRouter.invalidate(instance.id)
+    if kwargs['using'] == 'default':
+        ResponseCacheService.invalidate(ResponseCacheService.source_scope(instance.id), 'devices')
+
+@receiver(post_save, sender=BloodAnalyzer)
+@receiver(post_delete, sender=BloodAnalyzer)
+def invalidate_device_responses(sender, instance, using, **kwargs):
+    """Drop the cached device list when a central analyzer changes."""
+    if using == 'default':
+        ResponseCacheService.invalidate('devices')
+
+@receiver(post_save, sender=SyncLog)
+@receiver(post_delete, sender=SyncLog)
+def invalidate_sync_responses(sender, instance, using, **kwargs):
+    """Drop the cached sync status and history of the source of a sync log."""
+    if using == 'default' and instance.source_id:
+        ResponseCacheService.invalidate(ResponseCacheService.source_scope(instance.source_id))
@@ -1,24 +1,77 @@
-from celery import shared_task
+from celery import shared_task, chord
 from django.utils import timezone
 from .services.sync import SyncService
+from .services.sync_log import SyncLogService
+from .services.scheduler import SyncScheduleService
 from .models import BloodAnalyzer, DataSource
-import time
 
 @shared_task
-def sync_device_task(device_id):
+def sync_device_task(device_id, force=False):
     """
     Celery task to sync a device's data in the background.
     
     Args:
         device_id (str): The ID of the device to sync
+        force (bool): Take over the source's sync lease instead of
+            coalescing into a sync that is already running
+        
+    Returns:
+        int: The ID of the SyncLog of the sync
     """
     try:
-        return SyncService.sync_device(device_id)
+        sync_log = SyncService.sync_device(device_id, force=force)
+        return sync_log.id if sync_log else None
     except Exception as e:
         # Log the error and re-raise
         print(f"Error syncing device {device_id}: {str(e)}")
         raise
 
+@shared_task
+def sync_source_task(source_id, force=False):
+    """
+    Celery task to sync a single data source.
+    
+    Args:
+        source_id (int): The ID of the data source to sync
+        force (bool): Take over the source's sync lease instead of
+            coalescing into a sync that is already running
+        
+    Returns:
+        dict: The outcome of the sync, used by record_sync_summary_task
+    """
+    source = DataSource.objects.get(id=source_id)
+    previous_sync = source.last_sync
+    try:
+        sync_log = SyncService.sync_source(source.name, force=force)
+    except Exception as e:
+        print(f"Error syncing source {source.name}: {str(e)}")
+        sync_log = None
+        error_message = str(e)
+    else:
+        error_message = sync_log.error_message if sync_log else 'Sync log could not be created'
+        SyncScheduleService.reschedule(source, sync_log, previous_sync)
+    
+    return {
+        'source_id': source.id,
+        'source_name': source.name,
+        'sync_log_id': sync_log.id if sync_log else None,
+        'status': sync_log.status if sync_log else 'failed',
+        'records_processed': sync_log.records_processed if sync_log else 0,
+        'error_message': error_message
+    }
+
+@shared_task
+def record_sync_summary_task(results):
+    """
+    Celery chord callback that records one summary sync log for a fan-out sync.
+    
+    Args:
+        results (list): The return values of the sync_source_task calls
+    """
+    summary = SyncLogService.create_summary(results)
+    print(f"Synced {len(results)} sources: {summary.status}, {summary.records_processed} records")
+    return summary.id
+
 @shared_task
 def sync_all_devices_task():
     """
@@ -78,51 +131,58 @@ def periodic_sync_task():
             continue
 
 @shared_task
-def sync_all_sources():
+def sync_scheduler_tick():
     """
-    Single task that checks all active data sources for new data.
-    If no new data is found, sleeps for 10 minutes before checking again.
+    Celery beat task that dispatches a sync for every data source that is due.
+    
+    Runs every few seconds and returns immediately; the adaptive schedule in
+    SyncScheduleService decides when each source is synced next.
+    
+    Returns:
+        list: The IDs of the sources whose sync was dispatched
+    """
+    source_ids = SyncScheduleService.claim_due_sources()
+    for source_id in source_ids:
+        sync_source_task.delay(source_id)
+    if source_ids:
+        print(f"Dispatched sync for {len(source_ids)} due sources")
+    return source_ids
+
+@shared_task
+def sync_all_sources(fan_out=False):
+    """
+    Single task that syncs every active data source that is due.
+    
+    The sources are synced one after another and rescheduled; the task does
+    not wait for new data or re-enqueue itself, sync_scheduler_tick drives
+    the periodic syncs.
+    
+    With fan_out=True the due sources are dispatched as one
+    sync_source_task each in a chord, followed by record_sync_summary_task,
+    and this task returns immediately.
     """
     print("Starting sync_all_sources task...")
-    active_sources = DataSource.objects.filter(is_active=True)
-    print(f"Found {active_sources.count()} active sources")
-    new_data_found = False
+    due_sources = list(SyncScheduleService.due_sources())
+    print(f"Found {len(due_sources)} due sources")
+    
+    if fan_out:
+        print(f"Dispatching sync for {len(due_sources)} sources")
+        return chord(
+            sync_source_task.s(source.id) for source in due_sources
+        )(record_sync_summary_task.s()).id
     
-    for source in active_sources:
+    records_processed = 0
+    for source in due_sources:
+        previous_sync = source.last_sync
         try:
             print(f"Processing source: {source.name}")
-            # Check if source needs syncing
-            status = SyncService.get_sync_status(source.id)
-            print(f"Source {source.name} status: {status}")
-            
-            # If source hasn't synced in the last hour or never synced
-            if status['last_sync_time'] is None or \
-               (timezone.now() - status['last_sync_time']).total_seconds() > 3600:
-                
-                print(f"Source {source.name} needs syncing")
-                # Try to sync the source
-                try:
-                    sync_result = SyncService.sync_source(source)
-                    if sync_result.records_processed > 0:
-                        new_data_found = True
-                        print(f"Synced {sync_result.records_processed} records from {source.name}")
-                    else:
-                        print(f"No records processed for {source.name}")
-                except Exception as e:
-                    print(f"Error syncing source {source.name}: {str(e)}")
-                    continue
-            else:
-                print(f"Source {source.name} doesn't need syncing yet")
-                    
+            sync_result = SyncService.sync_source(source.name)
         except Exception as e:
-            print(f"Error checking sync status for source {source.name}: {str(e)}")
+            print(f"Error syncing source {source.name}: {str(e)}")
             continue
+        SyncScheduleService.reschedule(source, sync_result, previous_sync)
+        if sync_result:
+            records_processed += sync_result.records_processed
+            print(f"Synced {sync_result.records_processed} records from {source.name}")
     
-    # If no new data was found, sleep for 10 minutes
-    if not new_data_found:
-        print("No new data found. Sleeping for 10 minutes...")
-        time.sleep(600)  # Sleep for 10 minutes
-    
-    # Schedule next check
-    print("Scheduling next sync check...")
-    sync_all_sources.delay() 
\ No newline at end of file
+    return records_processed
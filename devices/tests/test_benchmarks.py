@@ -0,0 +1,41 @@
+from unittest import mock
+from django.test import SimpleTestCase
+from ..benchmarks import SyncBenchmark
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+    baseline = {'results': {'cold': {'wall_time': 2.0, 'queries': 100, 'rows_per_second': 1000.0}}}
+
+    def results(self, **metrics):
+        return {'results': {'cold': {**self.baseline['results']['cold'], **metrics}}}
+
+    def test_within_threshold_passes(self):
+        """Test that changes within the threshold are not regressions"""
+        results = self.results(wall_time=2.4, queries=110, rows_per_second=800.0)
+        self.assertEqual(SyncBenchmark.compare(results, self.baseline, 0.25), [])
+
+    def test_regressions_in_either_direction(self):
+        """Test that slower, chattier or lower-throughput syncs are reported"""
+        results = self.results(wall_time=3.0, queries=200, rows_per_second=500.0)
+        regressions = SyncBenchmark.compare(results, self.baseline, 0.25)
+
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(regressions[0].startswith('cold wall_time: 3 vs baseline 2'))
+
+    def test_improvements_are_not_regressions(self):
+        """Test that faster syncs pass"""
+        results = self.results(wall_time=0.5, queries=10, rows_per_second=5000.0)
+        self.assertEqual(SyncBenchmark.compare(results, self.baseline, 0.25), [])
+
+
+class BenchmarkMemoryTests(SimpleTestCase):
+    def test_peak_memory_is_measured_per_phase(self):
+        """Test that a phase does not report the peak of the phase before it"""
+        benchmark = SyncBenchmark()
+        with mock.patch.object(benchmark, 'sync', lambda aliases: len(bytearray(10 ** 7))):
+            cold = benchmark.measure_memory([])
+        with mock.patch.object(benchmark, 'sync', lambda aliases: []):
+            warm = benchmark.measure_memory([])
+
+        self.assertGreater(cold, 10 ** 7)
+        self.assertLess(warm, 10 ** 6)
@@ -0,0 +1,58 @@
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase
+from ..models import BloodAnalyzer, DataSource, SyncLog, TestRun, TestMetric
+from ..services.change_capture import ChangeCaptureService
+from ..services.sync import SyncService
+from ..services.synthetic_data import SyntheticDataService
+
+
+class ClearTestDataTests(TransactionTestCase):
+    # VACUUM cannot run inside the transaction of a TestCase
+    databases = {'default', 'factory_a', 'factory_c'}
+
+    def setUp(self):
+        SyntheticDataService.build_factory('factory_a', analyzers=2, runs=3, seed=7)
+        SyncService.sync_source('factory_a')
+        SyntheticDataService.prepare_factory('factory_c')
+        ChangeCaptureService.install('factory_a')
+        DataSource.objects.create(name='Test Cloud', source_type=DataSource.SourceType.CLOUD)
+
+    def tearDown(self):
+        ChangeCaptureService.uninstall('factory_a')
+        super().tearDown()
+
+    def test_fast_mode_truncates_every_database(self):
+        """Test that --fast empties the test data tables and resets their IDs"""
+        call_command('clear_test_data', fast=True, stdout=StringIO())
+
+        for db in ['default', 'factory_a', 'factory_c']:
+            self.assertFalse(TestMetric.objects.using(db).exists())
+            self.assertFalse(TestRun.objects.using(db).exists())
+            self.assertFalse(BloodAnalyzer.objects.using(db).exists())
+        self.assertFalse(SyncLog.objects.exists())
+        self.assertEqual(list(DataSource.objects.values_list('name', flat=True)), ['Test Cloud'])
+
+        # IDs start over and change capture keeps working without logging the truncate
+        SyntheticDataService.build_factory('factory_a', analyzers=1, runs=1, seed=7)
+        self.assertEqual(BloodAnalyzer.objects.using('factory_a').get().id, 1)
+        changes = ChangeCaptureService.read_changes('factory_a', after_seq=0, limit=100)
+        self.assertEqual(changes[0][0], 1)
+        self.assertNotIn('D', {op for *_, op in changes})
+
+    def test_factories_with_connections_are_kept(self):
+        """Test that sources carrying a factory connection are neither cleared nor deleted"""
+        DataSource.objects.create(
+            name='Factory Z', source_type=DataSource.SourceType.FACTORY, database_url='sqlite:////nonexistent/z.sqlite3'
+        )
+
+        call_command('clear_test_data', stdout=StringIO())
+
+        self.assertEqual(set(DataSource.objects.values_list('name', flat=True)), {'Test Cloud', 'Factory Z'})
+        self.assertFalse(TestRun.objects.using('factory_a').exists())
+
+    def test_unknown_database_is_rejected(self):
+        """Test that --database only accepts factory aliases"""
+        with self.assertRaises(CommandError):
+            call_command('clear_test_data', databases=['factory_x'], stdout=StringIO())
@@ -142,3 +142,50 @@ class ModelTests(TestCase):
         
         # Test metric type choices
         self.assertIn(test_metric.metric_type, [choice[0] for choice in TestMetric.MetricType.choices])
+
+    def test_test_metric_flags_abnormal_run(self):
+        """Test that saving metrics keeps the run's abnormal flag in step with them"""
+        test_run = TestRun.objects.create(run_id='TR-20240315-001', device=self.device, executed_by=self.technician)
+        # A new metric in range cannot change the flag, so it costs no UPDATE of the run
+        with self.assertNumQueries(1):
+            TestMetric.objects.create(test_run=test_run, metric_type='hgb', value=15.0, expected_min=12.0, expected_max=18.0)
+
+        metric = TestMetric.objects.create(
+            test_run=test_run, metric_type='glc', value=150.0, expected_min=70.0, expected_max=100.0
+        )
+        self.assertTrue(test_run.is_abnormal)
+        test_run.refresh_from_db()
+        self.assertTrue(test_run.is_abnormal)
+
+        metric.value = 90.0
+        metric.save()
+        test_run.refresh_from_db()
+        self.assertFalse(test_run.is_abnormal)
+
+    def test_test_metric_updates_cached_run_flag(self):
+        """Test that the run cached on a metric follows the flag both ways"""
+        test_run = TestRun.objects.create(run_id='TR-20240315-001', device=self.device, executed_by=self.technician)
+        metric = TestMetric.objects.create(
+            test_run=test_run, metric_type='glc', value=150.0, expected_min=70.0, expected_max=100.0
+        )
+
+        metric.value = 90.0
+        metric.save()
+        self.assertFalse(test_run.is_abnormal)
+        # Saving the run must not write a stale flag back
+        test_run.save()
+        self.assertFalse(TestRun.objects.get(pk=test_run.pk).is_abnormal)
+
+        metric.value = 150.0
+        metric.save()
+        self.assertTrue(test_run.is_abnormal)
+
+    def test_test_metric_update_within_range_costs_no_query(self):
+        """Test that an update keeping the metric on the same side of its range only saves it"""
+        test_run = TestRun.objects.create(run_id='TR-20240315-001', device=self.device, executed_by=self.technician)
+        TestMetric.objects.create(test_run=test_run, metric_type='hgb', value=15.0, expected_min=12.0, expected_max=18.0)
+        metric = TestMetric.objects.get(test_run=test_run)
+
+        metric.value = 16.0
+        with self.assertNumQueries(1):
+            metric.save()
@@ -0,0 +1,63 @@
+from django.test import TestCase
+from django.utils import timezone
+from ..models import DataSource, BloodAnalyzer, TestRun
+from ..routers import DataSourceRouter
+
+
+class DataSourceRouterCacheTests(TestCase):
+    def setUp(self):
+        self.router = DataSourceRouter()
+        DataSourceRouter.invalidate()
+        self.factory_source = DataSource.objects.create(
+            name='factory_a',
+            source_type=DataSource.SourceType.FACTORY
+        )
+        self.cloud_source = DataSource.objects.create(
+            name='Test Cloud',
+            source_type=DataSource.SourceType.CLOUD
+        )
+
+    def tearDown(self):
+        DataSourceRouter.invalidate()
+        super().tearDown()
+
+    def new_run(self, source):
+        return TestRun(run_id='RUN-1', data_source_id=source.id, timestamp=timezone.now())
+
+    def test_routes_unsaved_instances_by_data_source(self):
+        self.assertEqual(self.router.db_for_write(TestRun, instance=self.new_run(self.factory_source)), 'factory_a')
+        self.assertEqual(self.router.db_for_write(TestRun, instance=self.new_run(self.cloud_source)), 'default')
+
+    def test_unconfigured_factory_routes_to_default(self):
+        source = DataSource.objects.create(name='Factory Z', source_type=DataSource.SourceType.FACTORY)
+        self.assertEqual(self.router.db_for_write(TestRun, instance=self.new_run(source)), 'default')
+
+    def test_bound_instances_stay_on_their_database(self):
+        analyzer = BloodAnalyzer(device_id='BA-001', data_source=self.factory_source)
+        analyzer._state.db = 'default'
+        self.assertEqual(self.router.db_for_read(BloodAnalyzer, instance=analyzer), 'default')
+
+    def test_routing_adds_no_queries_after_warm_up(self):
+        run = self.new_run(self.factory_source)
+        self.router.db_for_read(TestRun, instance=run)
+
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.assertEqual(self.router.db_for_read(TestRun, instance=run), 'factory_a')
+                self.assertEqual(self.router.db_for_write(TestRun, instance=run), 'factory_a')
+
+    def test_saving_data_source_invalidates_cache(self):
+        run = self.new_run(self.factory_source)
+        self.assertEqual(self.router.db_for_write(TestRun, instance=run), 'factory_a')
+
+        self.factory_source.source_type = DataSource.SourceType.CLOUD
+        self.factory_source.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.router.db_for_write(TestRun, instance=run), 'default')
+
+    def test_deleting_data_source_invalidates_cache(self):
+        run = self.new_run(self.factory_source)
+        self.router.db_for_write(TestRun, instance=run)
+
+        self.factory_source.delete()
+        self.assertEqual(self.router.db_for_write(TestRun, instance=run), 'default')
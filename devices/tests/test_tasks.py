@@ -0,0 +1,101 @@
+from django.test import TestCase
+from django.utils import timezone
+from vital_tools.celery import app as celery_app
+from ..models import DataSource, SyncLog, TestRun
+from ..services.sync import SyncService
+from ..tasks import sync_all_sources, sync_source_task, sync_device_task, sync_scheduler_tick
+from .test_services import FactorySyncTestMixin
+
+
+class EagerCeleryMixin:
+    """
+    Run Celery tasks, groups and chords inline in the test process.
+    """
+    def setUp(self):
+        super().setUp()
+        self._always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+
+    def tearDown(self):
+        celery_app.conf.task_always_eager = self._always_eager
+        super().tearDown()
+
+
+class FanOutSyncTests(EagerCeleryMixin, FactorySyncTestMixin, TestCase):
+    databases = {'default', 'factory_a', 'factory_c'}
+
+    def setUp(self):
+        super().setUp()
+        self.source_c = self.create_factory_source('factory_c')
+        self.analyzer_c = self.create_factory_analyzer('FC-BA-001', db_name='factory_c')
+
+    def test_sync_source_task_reports_outcome(self):
+        """Test that the per-source task returns a JSON-serialisable result"""
+        self.create_factory_run()
+
+        result = sync_source_task.delay(self.source.id).get()
+
+        self.assertEqual(result['source_id'], self.source.id)
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['records_processed'], 4)
+        self.assertEqual(SyncLog.objects.get(id=result['sync_log_id']).source, self.source)
+
+    def test_fan_out_syncs_every_source_and_writes_summary(self):
+        """Test that a fan-out sync copies all factories and records one summary log"""
+        self.create_factory_run()
+        self.create_factory_run(analyzer=self.analyzer_c)
+        self.create_factory_run(analyzer=self.analyzer_c, metrics=('hgb',))
+
+        SyncService.sync_all_sources(fan_out=True)
+
+        self.assertEqual(TestRun.objects.filter(data_source=self.source).count(), 1)
+        self.assertEqual(TestRun.objects.filter(data_source=self.source_c).count(), 2)
+        self.assertEqual(SyncLog.objects.filter(source__isnull=False, status='success').count(), 2)
+        summary = SyncLog.objects.get(source__isnull=True)
+        self.assertEqual(summary.status, 'success')
+        self.assertEqual(summary.records_processed, 9)
+
+    def test_fan_out_summary_is_partial_when_a_source_fails(self):
+        """Test that a failing source makes the summary partial"""
+        DataSource.objects.create(name='factory_missing', source_type='factory', is_active=True)
+        self.create_factory_run()
+
+        sync_all_sources.delay(fan_out=True)
+
+        summary = SyncLog.objects.get(source__isnull=True)
+        self.assertEqual(summary.status, 'partial')
+        self.assertIn('factory_missing', summary.error_message)
+        self.assertEqual(summary.records_processed, 4)
+
+
+class DeviceSyncTaskTests(EagerCeleryMixin, FactorySyncTestMixin, TestCase):
+    def test_sync_device_task_syncs_device_source(self):
+        """Test that syncing a device syncs the data source it belongs to"""
+        SyncService.sync_source(self.source.name)
+        self.create_factory_run()
+
+        sync_log_id = sync_device_task.delay('FA-BA-001').get()
+
+        sync_log = SyncLog.objects.get(id=sync_log_id)
+        self.assertEqual(sync_log.source, self.source)
+        self.assertEqual(sync_log.records_processed, 4)
+
+
+class SchedulerTickTests(EagerCeleryMixin, FactorySyncTestMixin, TestCase):
+    def test_tick_syncs_due_sources_and_reschedules(self):
+        """Test that a tick syncs due sources and the next tick waits for the new due time"""
+        self.create_factory_run()
+
+        self.assertEqual(sync_scheduler_tick.delay().get(), [self.source.id])
+
+        self.source.refresh_from_db()
+        self.assertEqual(TestRun.objects.using('default').count(), 1)
+        self.assertGreater(self.source.next_sync_due, timezone.now())
+        self.assertEqual(sync_scheduler_tick.delay().get(), [])
+
+    def test_sync_all_sources_returns_without_waiting(self):
+        """Test that the non fan-out sync syncs due sources once and returns"""
+        self.create_factory_run()
+
+        self.assertEqual(sync_all_sources.delay().get(), 4)
+        self.assertEqual(sync_all_sources.delay().get(), 0)
@@ -0,0 +1,504 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from ..models import BloodAnalyzer, DataSource, SyncLog, TestMetric, TestRun
+from ..services.sync_lease import SyncLeaseService
+
+
+class ApiTestMixin:
+    """
+    Token-authenticated API client and a device of a factory source.
+    """
+    def setUp(self):
+        super().setUp()
+        # Cached responses outlive the rolled back rows of earlier tests
+        cache.clear()
+        self.user = User.objects.create_user(username='api_user')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.source = DataSource.objects.create(name='Test Factory', source_type=DataSource.SourceType.FACTORY)
+        self.device = BloodAnalyzer.objects.create(
+            device_id='VA-205-0001',
+            location='Factory Lab',
+            manufacturing_date=timezone.now().date(),
+            last_calibration=timezone.now(),
+            assigned_technician=self.user,
+            data_source=self.source
+        )
+
+
+class DeviceSyncViewTests(ApiTestMixin, APITestCase):
+    def test_sync_status_of_device_source(self):
+        """Test that sync_status reports the sync status of the device's source"""
+        SyncLog.objects.create(source=self.source, status=SyncLog.SyncStatus.SUCCESS, records_processed=5)
+
+        response = self.client.get(reverse('device-sync-status', args=[self.device.device_id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['source_id'], self.source.id)
+        self.assertEqual(response.data['last_sync_status'], 'success')
+        self.assertFalse(response.data['is_syncing'])
+
+    def test_sync_history_of_device_source(self):
+        """Test that sync_history lists the sync logs of the device's source"""
+        for _ in range(3):
+            SyncLog.objects.create(source=self.source, status=SyncLog.SyncStatus.SUCCESS)
+
+        response = self.client.get(reverse('device-sync-history', args=[self.device.device_id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+    def test_sync_status_of_unknown_device(self):
+        """Test that sync_status of an unknown device is a 404"""
+        response = self.client.get(reverse('device-sync-status', args=['VA-999-9999']))
+        self.assertEqual(response.status_code, 404)
+
+
+class KeysetPaginationTests(ApiTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        # Pairs of runs share a timestamp, so pages have to break ties by ID
+        now = timezone.now()
+        self.runs = [
+            TestRun.objects.create(
+                run_id=f'TR-{i:03d}',
+                device=self.device,
+                executed_by=self.user,
+                timestamp=now - timedelta(minutes=i // 2)
+            )
+            for i in range(25)
+        ]
+
+    def walk(self, url):
+        run_ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            run_ids += [run['run_id'] for run in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return run_ids, pages
+
+    def test_pages_cover_every_run_once_newest_first(self):
+        """Test that walking the next links returns every run once, newest first"""
+        run_ids, pages = self.walk(reverse('test-run-list') + '?page_size=4')
+
+        expected = TestRun.objects.order_by('-timestamp', '-id').values_list('run_id', flat=True)
+        self.assertEqual(run_ids, list(expected))
+        self.assertEqual(pages, 7)
+
+    def test_previous_link_returns_previous_page(self):
+        """Test that the previous link of the second page returns the first page"""
+        first = self.client.get(reverse('test-run-list') + '?page_size=4')
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+
+        previous = self.client.get(second.data['previous'])
+
+        self.assertEqual(
+            [run['run_id'] for run in previous.data['results']],
+            [run['run_id'] for run in first.data['results']]
+        )
+        self.assertIsNotNone(previous.data['next'])
+
+    def test_deep_pages_cost_the_same_queries(self):
+        """Test that a deep page runs the same queries as the first page"""
+        url = reverse('sync-log-list') + '?page_size=5'
+        for _ in range(30):
+            SyncLog.objects.create(source=self.source, status=SyncLog.SyncStatus.SUCCESS)
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.client.get(url)
+        for _ in range(4):
+            response = self.client.get(response.data['next'])
+        with CaptureQueriesContext(connection) as deep_page:
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(len(deep_page), len(first_page))
+        self.assertNotIn('OFFSET', ' '.join(query['sql'] for query in deep_page.captured_queries))
+
+    def test_other_orderings_are_rejected(self):
+        """Test that ?ordering= is a 400 unless it asks for the order of the cursor"""
+        response = self.client.get(reverse('test-run-list') + '?ordering=run_id')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+        self.assertEqual(self.client.get(reverse('sync-log-list') + '?ordering=records_processed').status_code, 400)
+
+        response = self.client.get(reverse('test-run-list') + '?ordering=-timestamp')
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is a 404"""
+        response = self.client.get(reverse('test-run-list') + '?cursor=bm9wZQ')
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryCountTests(ApiTestMixin, APITestCase):
+    """
+    Every list endpoint runs a fixed number of queries however many rows it
+    returns. The counts include the token lookup of the authentication.
+    """
+    ROWS = 5
+
+    def setUp(self):
+        super().setUp()
+        for i in range(self.ROWS):
+            device = BloodAnalyzer.objects.create(
+                device_id=f'VA-205-{i + 2:04d}',
+                location='Factory Lab',
+                manufacturing_date=timezone.now().date(),
+                last_calibration=timezone.now(),
+                assigned_technician=User.objects.create_user(username=f'technician_{i}'),
+                data_source=self.source
+            )
+            test_run = TestRun.objects.create(
+                run_id=f'TR-{i:03d}',
+                device=device,
+                data_source=self.source,
+                executed_by=device.assigned_technician
+            )
+            for metric_type in ['hgb', 'wbc', 'plt', 'glc']:
+                TestMetric.objects.create(
+                    test_run=test_run, metric_type=metric_type, value=1, expected_min=0, expected_max=2
+                )
+            SyncLog.objects.create(source=self.source, status=SyncLog.SyncStatus.SUCCESS)
+        self.test_run = test_run
+
+    def assertQueries(self, url, expected):
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_device_list(self):
+        response = self.assertQueries(reverse('device-list'), 2)
+        self.assertEqual(len(response.data), self.ROWS + 1)
+
+    def test_test_run_list(self):
+        response = self.assertQueries(reverse('test-run-list'), 3)
+        self.assertEqual(len(response.data['results']), self.ROWS)
+        self.assertEqual(len(response.data['results'][0]['metrics']), 4)
+
+    def test_test_run_detail(self):
+        self.assertQueries(reverse('test-run-detail', args=[self.test_run.pk]), 3)
+
+    def test_test_run_metrics(self):
+        response = self.assertQueries(reverse('test-run-metrics', args=[self.test_run.pk]), 3)
+        self.assertEqual(len(response.data), 4)
+
+    def test_sync_log_list(self):
+        response = self.assertQueries(reverse('sync-log-list'), 2)
+        self.assertEqual(len(response.data['results']), self.ROWS)
+
+    def test_sync_history(self):
+        response = self.assertQueries(reverse('device-sync-history', args=[self.device.device_id]), 4)
+        self.assertEqual(len(response.data), self.ROWS)
+
+
+class FieldsetTests(ApiTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_run = TestRun.objects.create(
+            run_id='TR-001', device=self.device, data_source=self.source, executed_by=self.user, notes='Long notes'
+        )
+        self.metric = TestMetric.objects.create(
+            test_run=self.test_run, metric_type='hgb', value=14, expected_min=12, expected_max=16
+        )
+
+    def test_default_representation_embeds_relations(self):
+        """Test that without fieldset parameters test runs embed their relations"""
+        response = self.client.get(reverse('test-run-detail', args=[self.test_run.pk]))
+
+        self.assertEqual(response.data['device']['device_id'], 'VA-205-0001')
+        self.assertEqual(response.data['executed_by'], 'api_user')
+        self.assertEqual(response.data['metrics'][0]['metric_type'], 'hgb')
+
+    def test_sparse_fields_are_flat(self):
+        """Test that ?fields= returns only the listed fields with relations as IDs"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('test-run-list') + '?fields=run_id,timestamp,is_abnormal,device')
+
+        self.assertEqual(response.status_code, 200)
+        run = response.data['results'][0]
+        self.assertEqual(set(run), {'run_id', 'timestamp', 'is_abnormal', 'device'})
+        self.assertEqual(run['device'], self.device.pk)
+        # Neither the notes nor the device columns are loaded
+        page_query = queries.captured_queries[-1]['sql']
+        self.assertNotIn('notes', page_query)
+        self.assertNotIn('devices_bloodanalyzer', page_query)
+
+    def test_expand(self):
+        """Test that ?expand= embeds the listed relations only"""
+        response = self.client.get(
+            reverse('test-run-detail', args=[self.test_run.pk]) + '?fields=id,device,metrics,executed_by&expand=metrics'
+        )
+
+        self.assertEqual(response.data['device'], self.device.pk)
+        self.assertEqual(response.data['executed_by'], self.user.pk)
+        self.assertEqual(response.data['metrics'][0]['value'], 14)
+
+    def test_flat_metrics_are_ids(self):
+        """Test that metrics that are not expanded are their IDs"""
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('test-run-list') + '?expand=')
+
+        self.assertEqual(response.data['results'][0]['metrics'], [self.metric.pk])
+        self.assertEqual(response.data['results'][0]['data_source'], self.source.pk)
+
+    def test_device_expand(self):
+        """Test that devices can embed their data source"""
+        response = self.client.get(reverse('device-list') + '?fields=device_id,data_source&expand=data_source')
+
+        self.assertEqual(set(response.data[0]), {'device_id', 'data_source'})
+        self.assertEqual(response.data[0]['data_source']['name'], 'Test Factory')
+
+    def test_unknown_field(self):
+        """Test that an unknown field is a 400"""
+        response = self.client.get(reverse('test-run-list') + '?fields=run_id,secret')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', str(response.data['fields']))
+
+
+class ExportTests(ApiTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.runs = []
+        for i, run_type in enumerate(['qc', 'production', 'production']):
+            test_run = TestRun.objects.create(
+                run_id=f'TR-{i:03d}',
+                device=self.device,
+                run_type=run_type,
+                data_source=self.source,
+                executed_by=self.user,
+                timestamp=now - timedelta(days=3 - i)
+            )
+            TestMetric.objects.create(test_run=test_run, metric_type='hgb', value=14 + i, expected_min=12, expected_max=18)
+            self.runs.append(test_run)
+        TestMetric.objects.create(test_run=self.runs[0], metric_type='glc', value=90, expected_min=70, expected_max=100)
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_pivots_metrics(self):
+        """Test that the CSV export has a row per run, oldest first, with a column per metric type"""
+        rows = list(csv.DictReader(io.StringIO(self.export(reverse('test-run-export-csv')))))
+
+        self.assertEqual([row['run_id'] for row in rows], ['TR-000', 'TR-001', 'TR-002'])
+        self.assertEqual(rows[0]['device_id'], 'VA-205-0001')
+        self.assertEqual(rows[0]['executed_by'], 'api_user')
+        self.assertEqual((rows[0]['hgb'], rows[0]['glc'], rows[0]['plt']), ('14.0', '90.0', ''))
+        self.assertEqual(rows[2]['hgb'], '16.0')
+
+    def test_ndjson(self):
+        """Test that the NDJSON export has a JSON object per line"""
+        content = self.export(reverse('test-run-export-ndjson'))
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['glc'], 90)
+        self.assertIsNone(rows[1]['glc'])
+
+    def test_filters(self):
+        """Test that the export is filtered by run type and time range"""
+        since = (self.runs[1].timestamp - timedelta(seconds=1)).isoformat()
+        until = self.runs[2].timestamp.isoformat()
+        url = reverse('test-run-export-ndjson')
+
+        content = self.client.get(url, {'run_type': 'production', 'since': since, 'until': until})
+        rows = [json.loads(line) for line in b''.join(content.streaming_content).decode().splitlines()]
+        self.assertEqual([row['run_id'] for row in rows], ['TR-001'])
+        self.assertEqual(self.export(url + '?device=VA-999-9999'), '')
+
+    def test_invalid_filter(self):
+        """Test that an invalid filter is a 400"""
+        response = self.client.get(reverse('test-run-export-csv'), {'run_type': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('run_type', response.data)
+
+
+class ResponseCacheTests(ApiTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        SyncLog.objects.create(source=self.source, status=SyncLog.SyncStatus.SUCCESS, records_processed=5)
+        self.status_url = reverse('device-sync-status', args=[self.device.device_id])
+        self.history_url = reverse('device-sync-history', args=[self.device.device_id])
+
+    def test_repeated_poll_is_cached(self):
+        """Test that a repeated poll is served from the cache with the token and device lookups only"""
+        first = self.client.get(self.history_url)
+        with self.assertNumQueries(2):
+            second = self.client.get(self.history_url)
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match(self):
+        """Test that sending the ETag back returns a 304 until the data changes"""
+        etag = self.client.get(self.status_url)['ETag']
+
+        response = self.client.get(self.status_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SyncLog.objects.create(source=self.source, status=SyncLog.SyncStatus.FAILED)
+        response = self.client.get(self.status_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['last_sync_status'], 'failed')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_sync_versions_responses(self):
+        """Test that a new last_sync of the source bypasses the cached responses"""
+        self.client.get(self.history_url)
+        # update() sends no signals, only the version changes
+        SyncLog.objects.update(records_processed=7)
+        DataSource.objects.filter(pk=self.source.pk).update(last_sync=timezone.now())
+
+        response = self.client.get(self.history_url)
+        self.assertEqual(response.data[0]['records_processed'], 7)
+
+    def test_sync_completion_invalidates(self):
+        """Test that releasing the sync lease drops the cached sync status"""
+        token = SyncLeaseService.acquire(self.source)
+        with self.captureOnCommitCallbacks(execute=True):
+            SyncLog.objects.create(source=self.source, status=SyncLog.SyncStatus.SUCCESS)
+        self.assertTrue(self.client.get(self.status_url).data['is_syncing'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SyncLeaseService.release(self.source, token)
+        self.assertFalse(self.client.get(self.status_url).data['is_syncing'])
+
+    def test_device_list_invalidated_by_device_changes(self):
+        """Test that adding a device drops the cached device list"""
+        self.assertEqual(len(self.client.get(reverse('device-list')).data), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BloodAnalyzer.objects.create(
+                device_id='VA-205-0002',
+                location='Factory Lab',
+                manufacturing_date=timezone.now().date(),
+                last_calibration=timezone.now(),
+                assigned_technician=self.user
+            )
+        self.assertEqual(len(self.client.get(reverse('device-list')).data), 2)
+
+    def test_device_list_invalidated_by_source_changes(self):
+        """Test that editing a data source drops cached device lists embedding it"""
+        url = reverse('device-list') + '?expand=data_source'
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.source.name = 'Renamed Source'
+            self.source.save()
+        self.assertEqual(self.client.get(url).data[0]['data_source']['name'], 'Renamed Source')
+
+    def test_device_list_kept_by_sync_bookkeeping(self):
+        """Test that checkpoint and scheduler saves of a data source keep the cached device list"""
+        url = reverse('device-list') + '?expand=data_source'
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.source.last_synced_run_pk = 10
+            self.source.save(update_fields=['last_synced_run_pk', 'last_synced_run_at'])
+            self.source.next_sync_due = timezone.now()
+            self.source.save(update_fields=['sync_interval', 'next_sync_due'])
+        self.assertEqual(self.client.get(url).data[0]['data_source']['last_synced_run_pk'], 0)
+
+    def test_errors_are_not_cached(self):
+        """Test that an error response is rebuilt on every request"""
+        self.device.data_source = None
+        self.device.save()
+
+        self.assertEqual(self.client.get(self.status_url).status_code, 404)
+        self.assertNotIn('ETag', self.client.get(self.status_url))
+
+
+class BulkIngestTests(ApiTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('test-run-bulk')
+        User.objects.create_user(username='night_shift')
+
+    def payload(self, count, **overrides):
+        return [
+            {
+                'run_id': f'TR-{i:04d}',
+                'device': 'VA-205-0001',
+                'run_type': 'qc',
+                'metrics': [
+                    {'metric_type': 'hgb', 'value': 14, 'expected_min': 12, 'expected_max': 16},
+                    {'metric_type': 'glc', 'value': 150 if i % 2 else 90, 'expected_min': 70, 'expected_max': 100},
+                ],
+                **overrides
+            }
+            for i in range(count)
+        ]
+
+    def test_creates_runs_and_metrics(self):
+        """Test that a batch creates every run and metric and flags abnormal runs"""
+        response = self.client.post(self.url, self.payload(20), format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'runs': 20, 'metrics': 40})
+        self.assertEqual(TestMetric.objects.count(), 40)
+        self.assertEqual(TestRun.objects.filter(is_abnormal=True).count(), 10)
+        test_run = TestRun.objects.get(run_id='TR-0001')
+        self.assertTrue(test_run.is_abnormal)
+        self.assertEqual(test_run.executed_by, self.user)
+        self.assertEqual(test_run.data_source, self.source)
+
+    def test_lookups_do_not_grow_with_batch(self):
+        """Test that a batch resolves devices, users and run IDs with the same queries however big it is"""
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, self.payload(2, executed_by='night_shift'), format='json')
+        TestRun.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(self.url, self.payload(200, executed_by='night_shift'), format='json')
+
+        # Only the INSERTs are split, by the backend's limit of query parameters
+        def lookups(queries):
+            return [query['sql'] for query in queries.captured_queries if not query['sql'].startswith('INSERT')]
+        self.assertEqual(len(lookups(large)), len(lookups(small)))
+        self.assertEqual(TestRun.objects.filter(executed_by__username='night_shift').count(), 200)
+
+    def test_invalid_batch_creates_nothing(self):
+        """Test that unknown devices and duplicate run IDs reject the whole batch"""
+        TestRun.objects.create(run_id='TR-0002', device=self.device, executed_by=self.user)
+        runs = self.payload(3)
+        runs[0]['device'] = 'VA-999-9999'
+
+        response = self.client.post(self.url, runs, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('device', response.data[0])
+        self.assertEqual(response.data[1], {})
+        self.assertIn('run_id', response.data[2])
+        self.assertEqual(TestRun.objects.count(), 1)
+
+    def test_metric_validation(self):
+        """Test that metric ranges and duplicate metric types are validated per run"""
+        runs = self.payload(2)
+        runs[0]['metrics'][0]['expected_max'] = 10
+        runs[1]['metrics'][1]['metric_type'] = 'hgb'
+
+        response = self.client.post(self.url, runs, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('metrics', response.data[0])
+        self.assertIn('metrics', response.data[1])
+        self.assertFalse(TestRun.objects.exists())
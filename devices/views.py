@@ -1,3 +1,4 @@
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from django.views.generic import TemplateView
 from rest_framework import viewsets, status
@@ -12,9 +13,18 @@ from .serializers import (
     SyncStatusSerializer,
     SyncRequestSerializer,
     TestRunSerializer,
+    TestRunExportSerializer,
+    BulkTestRunSerializer,
     TestMetricSerializer
 )
+from .caching import CachedResponseMixin
+from .fieldsets import FieldsetViewMixin
+from .pagination import KeysetPagination
+from .services.export import TestRunExportService
+from .services.ingest import IngestError, TestRunIngestService
+from .services.response_cache import ResponseCacheService
 from .services.sync import SyncService
+from .services.sync_lease import SyncLeaseService
 from .tasks import sync_device_task
 
 # Create your views here.
@@ -27,15 +37,17 @@ class HomeView(TemplateView):
         context['title'] = 'Vital Tools - Device Performance & Sync System'
         return context
 
-class BloodAnalyzerViewSet(viewsets.ModelViewSet):
+class BloodAnalyzerViewSet(CachedResponseMixin, FieldsetViewMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing blood analyzer devices.
 
     list:
-    Return a list of all blood analyzers.
+    Return a list of all blood analyzers. ?fields= limits the response to
+    the listed fields and ?expand= embeds the data source or the username
+    of the assigned technician instead of their IDs.
 
     retrieve:
-    Return a specific blood analyzer by device_id.
+    Return a specific blood analyzer by device_id (same parameters).
 
     create:
     Create a new blood analyzer.
@@ -57,26 +69,61 @@ class BloodAnalyzerViewSet(viewsets.ModelViewSet):
 
     sync_history:
     Get the sync history for a device.
+
+    list, sync_status and sync_history are cached until the next sync of
+    the source (or device edit) and send an ETag; clients that send it back
+    in If-None-Match get a 304 while nothing changed.
     """
     queryset = BloodAnalyzer.objects.all()
     serializer_class = BloodAnalyzerSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'device_id'
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('sync_status', 'sync_history'):
+            # The data source's last_sync is part of the cache version
+            queryset = queryset.select_related('data_source')
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        version = f'devices:{ResponseCacheService.generation("devices")}'
+        build = super().list
+        return self.cached_response(request, version, lambda: build(request, *args, **kwargs))
+
+    def source_version(self, device):
+        """Cache version of the sync status and history of a device's source."""
+        source = device.data_source
+        last_sync = source.last_sync.isoformat() if source and source.last_sync else ''
+        scope = ResponseCacheService.source_scope(device.data_source_id)
+        return f'{scope}:{last_sync}:{ResponseCacheService.generation(scope)}'
+
     @action(detail=True, methods=['post'])
     def sync(self, request, device_id=None):
         """
         Trigger a sync operation for a specific device.
 
         This endpoint starts a background task to synchronize data for the specified device.
-        Returns a task ID that can be used to track the sync progress.
+        Returns a task ID that can be used to track the sync progress. If the device's
+        source is already being synced, the ID of the running sync's log is returned
+        instead, unless force is set.
         """
         serializer = SyncRequestSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+        device = self.get_object()
+        force = serializer.validated_data['force']
         try:
-            task = sync_device_task.delay(device_id)
+            # Coalesce into a sync of the device's source that is already running
+            lease = SyncLeaseService.current(device.data_source) if device.data_source else None
+            if lease and not force:
+                return Response({
+                    'message': 'Sync already in progress',
+                    'sync_log_id': lease.sync_log_id
+                }, status=status.HTTP_200_OK)
+            
+            task = sync_device_task.delay(device_id, force=force)
             return Response({
                 'message': 'Sync started',
                 'task_id': task.id
@@ -98,9 +145,13 @@ class BloodAnalyzerViewSet(viewsets.ModelViewSet):
         - Number of records processed
         - Any error messages
         """
+        device = self.get_object()
+        return self.cached_response(request, self.source_version(device), lambda: self.get_sync_status(device))
+
+    def get_sync_status(self, device):
         try:
-            status = SyncService.get_sync_status(device_id)
-            serializer = SyncStatusSerializer(status)
+            sync_status = SyncService.get_sync_status(device.data_source_id)
+            serializer = SyncStatusSerializer(sync_status)
             return Response(serializer.data)
         except Exception as e:
             return Response(
@@ -116,8 +167,12 @@ class BloodAnalyzerViewSet(viewsets.ModelViewSet):
         Returns a list of all sync operations performed for the device,
         including timestamps, status, and number of records processed.
         """
+        device = self.get_object()
+        return self.cached_response(request, self.source_version(device), lambda: self.get_sync_history(device))
+
+    def get_sync_history(self, device):
         try:
-            history = SyncService.get_sync_history(device_id)
+            history = SyncService.get_sync_history(device.data_source_id)
             serializer = SyncLogSerializer(history, many=True)
             return Response(serializer.data)
         except Exception as e:
@@ -131,10 +186,13 @@ class SyncLogViewSet(viewsets.ReadOnlyModelViewSet):
     API endpoint for viewing sync logs.
 
     list:
-    Return a list of all sync logs, with optional filtering by:
+    Return a page of sync logs, newest first, with optional filtering by:
     - device_id: Filter logs for a specific device
     - status: Filter by sync status (success/failed/in_progress)
-    - timestamp: Sort by timestamp (use ordering=-timestamp for descending)
+    - timestamp: Filter by timestamp
+    Pages are fetched with the cursor of the next or previous link; use
+    page_size to change the page size (max 500). Other orderings are not
+    supported.
 
     retrieve:
     Return a specific sync log by ID.
@@ -142,12 +200,11 @@ class SyncLogViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = SyncLog.objects.all()
     serializer_class = SyncLogSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filterset_fields = ['source', 'status', 'timestamp']
-    ordering_fields = ['timestamp', 'records_processed']
-    ordering = ['-timestamp']
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('source')
         device_id = self.request.query_params.get('device_id', None)
         if device_id:
             try:
@@ -158,19 +215,25 @@ class SyncLogViewSet(viewsets.ReadOnlyModelViewSet):
                 return SyncLog.objects.none()
         return queryset
 
-class TestRunViewSet(viewsets.ModelViewSet):
+class TestRunViewSet(FieldsetViewMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing test runs.
 
     list:
-    Return a list of all test runs, with optional filtering by:
+    Return a page of test runs, newest first, with optional filtering by:
     - device_id: Filter runs for a specific device
     - run_type: Filter by run type (qc/production/maintenance)
     - is_abnormal: Filter by abnormal status
-    - timestamp: Sort by timestamp
+    - timestamp: Filter by timestamp
+    Pages are fetched with the cursor of the next or previous link; use
+    page_size to change the page size (max 500). Other orderings are not
+    supported.
+    ?fields= and ?expand= return the flat representation: only the listed
+    fields, with device, data_source, executed_by and metrics as IDs
+    unless expanded (e.g. ?fields=run_id,timestamp,is_abnormal,device).
 
     retrieve:
-    Return a specific test run by ID.
+    Return a specific test run by ID (same fieldset parameters).
 
     create:
     Create a new test run.
@@ -186,15 +249,23 @@ class TestRunViewSet(viewsets.ModelViewSet):
 
     metrics:
     Get all metrics for a specific test run.
+
+    bulk:
+    Create many test runs with their metrics in one request.
+
+    export_csv, export_ndjson:
+    Stream all test runs matching the filters, oldest first, with their
+    metrics as columns.
     """
     queryset = TestRun.objects.all()
     serializer_class = TestRunSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filterset_fields = ['device', 'run_type', 'is_abnormal', 'is_factory_data', 'timestamp']
-    ordering_fields = ['timestamp', 'run_id']
-    ordering = ['-timestamp']
+    fieldset_columns = ['id', 'timestamp']  # The pagination cursor
 
     def get_queryset(self):
+        # FieldsetViewMixin joins and prefetches what the serializer embeds
         queryset = super().get_queryset()
         device_id = self.request.query_params.get('device_id', None)
         if device_id:
@@ -213,3 +284,61 @@ class TestRunViewSet(viewsets.ModelViewSet):
         metrics = test_run.metrics.all()
         serializer = TestMetricSerializer(metrics, many=True)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create many test runs with their metrics in one request.
+
+        Takes a list of test runs (run_id, device, run_type, timestamp,
+        executed_by, notes and a list of metrics) and creates all of them,
+        or none if any is invalid; the errors are then returned per run.
+        is_abnormal is set from the metrics.
+        """
+        serializer = BulkTestRunSerializer(data=request.data, many=True, max_length=BulkTestRunSerializer.MAX_RUNS)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            created = TestRunIngestService.ingest(serializer.validated_data)
+        except IngestError as e:
+            return Response(e.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(created, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], url_path='export/csv', url_name='export-csv')
+    def export_csv(self, request):
+        """
+        Export test runs as CSV.
+
+        Streams one row per test run, oldest first, with a column per
+        metric type. Filters: device, data_source, run_type, since, until.
+        """
+        return self.export(request, TestRunExportService.to_csv, 'text/csv', 'csv')
+
+    @action(detail=False, methods=['get'], url_path='export/ndjson', url_name='export-ndjson')
+    def export_ndjson(self, request):
+        """
+        Export test runs as newline-delimited JSON.
+
+        Streams one JSON object per test run, oldest first, with a key per
+        metric type. Filters: device, data_source, run_type, since, until.
+        """
+        return self.export(request, TestRunExportService.to_ndjson, 'application/x-ndjson', 'ndjson')
+
+    def export(self, request, encode, content_type, extension):
+        serializer = TestRunExportSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        filters = serializer.validated_data
+        queryset = TestRunExportService.get_queryset(
+            device_id=filters.get('device'),
+            data_source=filters.get('data_source'),
+            run_type=filters.get('run_type'),
+            since=filters.get('since'),
+            until=filters.get('until')
+        )
+        # Rows are read and encoded as the response is sent, not up front
+        response = StreamingHttpResponse(encode(TestRunExportService.rows(queryset)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="test_runs.{extension}"'
+        return response
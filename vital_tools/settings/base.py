@@ -129,6 +129,14 @@ SWAGGER_SETTINGS = {
     'VALIDATOR_URL': None,
 }
 
+# Cache of API responses that only change when a sync commits
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+API_CACHE_TIMEOUT = 60  # Seconds
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -137,8 +145,8 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULE = {
-    'sync-all-sources': {
-        'task': 'devices.tasks.sync_all_sources',
-        'schedule': 60.0,  # Run every minute (task will handle its own sleep)
+    'sync-scheduler-tick': {
+        'task': 'devices.tasks.sync_scheduler_tick',
+        'schedule': 15.0,  # Short tick, sources are synced when they are due
     },
 }
@@ -59,9 +59,9 @@ CELERY_TIMEZONE = 'UTC'
 
 # Celery Beat Configuration
 CELERY_BEAT_SCHEDULE = {
-    'periodic-sync': {
-        'task': 'devices.services.sync.periodic_sync',
-        'schedule': 120.0,  # Run every 2 minutes
+    'sync-scheduler-tick': {
+        'task': 'devices.tasks.sync_scheduler_tick',
+        'schedule': 15.0,  # Short tick, sources are synced when they are due
     },
 }
 